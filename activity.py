@@ -0,0 +1,139 @@
+import json
+import time
+import logging
+import threading
+from datetime import date
+import bot_config
+import timestamps
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Counters kept per CST day and per week (Monday to Sunday), updated as messages are processed
+COUNTERS = ('messages', 'interested_clients', 'escalations', 'zoom_bookings')
+_INDEX = {name: index for index, name in enumerate(COUNTERS)}
+
+# {day ordinal: [count per COUNTERS]} and {ordinal of the week's Monday: [...]}
+_days = {}
+_weeks = {}
+_lock = threading.Lock()
+_dirty = False
+
+# A client is counted once per day and once per week in interested_clients. The lead keeps
+# [day, interested] in activity_day and [week, interested] in activity_week, so a later
+# message that changes no_interest moves the client in or out of the count.
+
+def week_of(day):
+    """Return the ordinal of the Monday that starts the week of a day ordinal."""
+    return day - date.fromordinal(day).weekday()
+
+def _periods(now):
+    day = timestamps.day_number(time.time() if now is None else now)
+    return day, week_of(day)
+
+def _prune(day):
+    for old in [key for key in _days if key <= day - bot_config.ACTIVITY_RETENTION_DAYS]:
+        del _days[old]
+    for old in [key for key in _weeks if key <= week_of(day) - 7 * bot_config.ACTIVITY_RETENTION_WEEKS]:
+        del _weeks[old]
+
+def _bump(buckets, key, counter, amount):
+    buckets.setdefault(key, [0] * len(COUNTERS))[_INDEX[counter]] += amount
+
+def _add(counter, day, week, amount=1):
+    """Add amount to a counter of a day and/or a week; call with _lock held."""
+    global _dirty
+    if day is not None:
+        if day not in _days:
+            _prune(day)
+        _bump(_days, day, counter, amount)
+    if week is not None:
+        _bump(_weeks, week, counter, amount)
+    _dirty = True
+
+def record(counter, now=None):
+    """Add one to a counter (messages, escalations or zoom_bookings) for today and this week."""
+    day, week = _periods(now)
+    with _lock:
+        _add(counter, day, week)
+
+def _interest_change(state, field, period, interested):
+    mark = state.get(field)
+    state[field] = [period, interested]
+    if not mark or mark[0] != period:
+        return 1 if interested else 0
+    if bool(mark[1]) != interested:
+        return 1 if interested else -1
+    return 0
+
+def update_client(state, now=None):
+    """Count the client as contacted today and this week, as interested unless no_interest is set."""
+    day, week = _periods(now)
+    interested = not state.get('no_interest', False)
+    with _lock:
+        day_change = _interest_change(state, 'activity_day', day, interested)
+        week_change = _interest_change(state, 'activity_week', week, interested)
+        if day_change:
+            _add('interested_clients', day, None, day_change)
+        if week_change:
+            _add('interested_clients', None, week, week_change)
+
+def record_message(state, now=None):
+    """Count a message received from a client."""
+    record('messages', now)
+    update_client(state, now)
+
+def _counts(buckets, key):
+    with _lock:
+        values = buckets.get(key) or [0] * len(COUNTERS)
+        return dict(zip(COUNTERS, values))
+
+def day_counts(now=None):
+    """Return {counter: value} for the CST day of now (default: today)."""
+    return _counts(_days, _periods(now)[0])
+
+def week_counts(now=None):
+    """Return {counter: value} for the week of now (default: this week)."""
+    return _counts(_weeks, _periods(now)[1])
+
+# Persistence: one small JSON object with the retained days and weeks
+
+def is_dirty():
+    return _dirty
+
+def dumps():
+    """Serialize the counters and mark them as saved."""
+    global _dirty
+    with _lock:
+        data = {'counters': COUNTERS, 'days': _days, 'weeks': _weeks}
+        payload = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        _dirty = False
+    return payload
+
+def loads(payload):
+    """Replace the counters with ones written by dumps()."""
+    global _dirty
+    data = json.loads(payload)
+    names = data.get('counters', COUNTERS)
+
+    def convert(buckets):
+        converted = {}
+        for key, values in buckets.items():
+            by_name = dict(zip(names, values))
+            converted[int(key)] = [by_name.get(name, 0) for name in COUNTERS]
+        return converted
+
+    days, weeks = convert(data.get('days', {})), convert(data.get('weeks', {}))
+    with _lock:
+        _days.clear()
+        _days.update(days)
+        _weeks.clear()
+        _weeks.update(weeks)
+        _dirty = False
+
+def clear():
+    global _dirty
+    with _lock:
+        _days.clear()
+        _weeks.clear()
+        _dirty = False
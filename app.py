@@ -1,27 +1,24 @@
 import os
 import logging
 import sys
+import pytz
 from flask import Flask
 import bot_config
 import utils
+import message_handler
+import client_handler
+import recontact_handler
+import scheduler
+import bootstrap
+import faq_store
+import log_pipeline
+import prompt_builder
 from routes import init_routes
+from conversation_store import ConversationState
 
 # Configure logging
+log_pipeline.configure_logging(level=os.getenv('LOG_LEVEL', bot_config.LOG_LEVEL))
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-console_handler.setFormatter(formatter)
-
-file_handler = logging.FileHandler('giselle_activity.log')
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(formatter)
-
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
 
 logger.info("Script app.py iniciado")
 
@@ -32,6 +29,7 @@ TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 GCS_BUCKET_NAME = bot_config.GCS_BUCKET_NAME
 GCS_CONVERSATIONS_PATH = bot_config.GCS_CONVERSATIONS_PATH
+GCS_BASE_PATH = bot_config.GCS_BASE_PATH
 DEFAULT_PORT = 8080
 
 logger.debug("Variables de configuración cargadas")
@@ -40,11 +38,18 @@ logger.debug("Variables de configuración cargadas")
 app = Flask(__name__)
 
 # Initialize global conversation state
-conversation_state = {}
+conversation_state = ConversationState()
 logger.debug("Conversation state inicializado")
 
 # Initialize routes
-init_routes(app, conversation_state)
+twilio_client = init_routes(app, conversation_state)
+
+def sync_scheduler_jobs(acquired):
+    """Reschedule per-lead jobs from the shared state when it changed or this instance just became leader."""
+    reloaded = utils.refresh_conversation_state(conversation_state, GCS_BUCKET_NAME, GCS_CONVERSATIONS_PATH)
+    if acquired or reloaded:
+        recontact_handler.schedule_all_jobs(conversation_state, twilio_client, utils)
+        client_handler.schedule_pending_responses(conversation_state, twilio_client, message_handler, utils)
 
 if __name__ == '__main__':
     try:
@@ -52,21 +57,20 @@ if __name__ == '__main__':
         utils.load_conversation_state(conversation_state, GCS_BUCKET_NAME, GCS_CONVERSATIONS_PATH)
         logger.info("Conversation state loaded")
 
-        logger.debug("Step 2: Downloading projects from storage")
-        utils.download_projects_from_storage(GCS_BUCKET_NAME, GCS_BASE_PATH)
-        logger.info("Projects downloaded from storage")
-
-        logger.debug("Step 3: Loading projects from folder")
-        utils.load_projects_from_folder(GCS_BASE_PATH)
-        logger.info("Projects loaded from folder")
-
-        logger.debug("Step 4: Loading gerente responses")
-        utils.load_gerente_respuestas(GCS_BASE_PATH)
-        logger.info("Gerente responses loaded")
-
-        logger.debug("Step 5: Loading FAQ files")
-        utils.load_faq_files(GCS_BASE_PATH)
-        logger.info("FAQ files loaded")
+        logger.debug("Step 2: Loading projects, gerente responses and FAQ files from storage")
+        bootstrap.load_knowledge_base(GCS_BUCKET_NAME, GCS_BASE_PATH)
+        logger.info("Knowledge base loaded")
+        prompt_builder.init_tokenizer()
+        if bot_config.KB_RELOAD_ENABLED:
+            bootstrap.start_reloader(GCS_BUCKET_NAME, GCS_BASE_PATH)
+            logger.info("Knowledge base reloader started")
+
+        if bot_config.SCHEDULER_ENABLED:
+            logger.debug("Step 3: Starting background scheduler")
+            scheduler.set_sync(sync_scheduler_jobs)
+            faq_store.schedule_compaction()
+            scheduler.start_scheduler()
+            logger.info("Background scheduler started")
 
         port = int(os.getenv("PORT", DEFAULT_PORT))
         service_url = os.getenv("SERVICE_URL", f"https://giselle-bot-250207106980.us-central1.run.app")
@@ -0,0 +1,249 @@
+"""Micro-benchmarks for the pure-Python work done per incoming message.
+
+Usage:
+    python -m benchmarks.hot_path                       # run and print
+    python -m benchmarks.hot_path --save baseline       # record benchmarks/results/baseline.json
+    python -m benchmarks.hot_path --compare baseline    # show the change against a recorded run
+    python -m benchmarks.hot_path --sizes 1000 --only faq
+
+Lead-dependent benchmarks run at every size in --sizes. GCS and Twilio calls
+are served by the zero-latency fakes in loadtest.fakes, so only local CPU
+time is measured.
+"""
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import logging
+import argparse
+import platform
+from datetime import datetime, timedelta
+import pytz
+import bot_config
+import utils
+import message_handler
+import client_handler
+import recontact_handler
+from conversation_store import ConversationState
+from loadtest.fakes import Fakes, installed
+
+CST_TIMEZONE = pytz.timezone("America/Mexico_City")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_SIZES = (1000, 10000, 100000)
+PROJECT_COUNT = 40
+FAQ_ENTRIES_PER_PROJECT = 2000
+STAGES = ['Prospección', 'Calificación', 'Negociación', 'Cierre']
+
+def make_projects(count=PROJECT_COUNT, seed=1):
+    """Return count synthetic projects shaped like the JSON files in the bucket."""
+    rng = random.Random(seed)
+    projects = {}
+    for index in range(count):
+        name = f"PROYECTO{index:02d}"
+        projects[name] = {
+            'description': f"Desarrollo {index} con vista al mar, amenidades completas y esquema de renta vacacional.",
+            'type': rng.choice(["Departamentos", "Residencias", "Lotes", "Condohotel"]),
+            'location': rng.choice(["Tulum", "Holbox", "Playa del Carmen", "Pesquería", "Mérida"]),
+            'prices': {f"Unidad {unit}": rng.randrange(1_500_000, 12_000_000, 10_000) for unit in "ABCDEF"},
+            'amenities': rng.sample(["Alberca", "Gimnasio", "Spa", "Rooftop", "Coworking", "Club de playa", "Seguridad 24/7", "Asadores"], 5),
+        }
+    return projects
+
+def make_faq(projects, entries=FAQ_ENTRIES_PER_PROJECT):
+    """Return FAQ data in utils.faq_data form with entries questions per project."""
+    faq = {}
+    for project in list(projects) + ['general']:
+        faq[project.lower()] = {
+            f"¿pregunta frecuente número {index} sobre {project.lower()}?": f"Respuesta {index} para {project}."
+            for index in range(entries)
+        }
+    return faq
+
+def make_leads(count, seed=2):
+    """Return a ConversationState with count clients (plus two gerentes) and realistic fields."""
+    rng = random.Random(seed)
+    now = datetime.now(CST_TIMEZONE)
+    data = {
+        "whatsapp:+5218110665094": {'history': [], 'is_gerente': True, 'last_contact': now.timestamp()},
+        "whatsapp:+5218110665095": {'history': [], 'is_gerente': True, 'last_contact': now.timestamp()},
+    }
+    for index in range(count):
+        last_contact = now - timedelta(hours=rng.randrange(0, 24 * 14))
+        data[f"whatsapp:+52199{index:08d}"] = {
+            'history': [
+                "Cliente: Hola, me interesa información",
+                "Giselle: ¡Hola! ¿Me podrías decir tu nombre?",
+                f"Cliente: Me llamo Cliente{index}",
+                "Giselle: ¿Buscas algo para invertir o para vivir?",
+                "Cliente: Para invertir en Tulum",
+                "Giselle: ¿Cuál sería tu presupuesto aproximado?",
+            ],
+            'client_name': f"Cliente{index}",
+            'client_budget': f"{rng.randrange(1, 10)},000,000 MXN",
+            'needs': "inversión",
+            'stage': rng.choice(STAGES),
+            'priority': rng.random() < 0.05,
+            'no_interest': rng.random() < 0.1,
+            'last_mentioned_project': f"PROYECTO{rng.randrange(PROJECT_COUNT):02d}",
+            'last_contact': last_contact.timestamp(),
+            'last_response_time': last_contact.timestamp(),
+            'intention_history': ["greeting", "needs", "budget", "question"],
+            'recontact_attempts': rng.randrange(0, 3),
+            'pending_question': None,
+        }
+    return ConversationState(data)
+
+def measure(func, min_time=0.2, repeat=3):
+    """Return the best mean seconds per call of func over repeat timing runs."""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+# Benchmarks: name -> (uses_leads, setup(size) -> callable)
+
+def bench_typo_correction(projects, size):
+    names = list(projects)
+    message = "hola quiero info de proyecto07 y de proyeto12 en tulum, cuanto cuesta la unidad a?"
+    return lambda: message_handler.correct_project_typos(message, names)
+
+def bench_project_detection(projects, size):
+    history = "\n".join(make_leads(1)["whatsapp:+5219900000000"]['history'])
+    message = "me gustaria saber mas sobre los departamentos en holbox"
+    def run():
+        message_handler.detect_mentioned_project("cuanto cuesta la unidad mas barata?")
+        message_handler.detect_mentioned_project(message)
+        message_handler.detect_project_in_history(history)
+    return run
+
+def bench_project_info(projects, size):
+    return lambda: client_handler.build_project_info(projects)
+
+def bench_faq(projects, size):
+    utils.faq_data.clear()
+    utils.faq_data.update(make_faq(projects))
+    hit = "¿pregunta frecuente número 1500 sobre proyecto07?"
+    def run():
+        utils.get_faq_answer(hit, "PROYECTO07")
+        utils.get_faq_answer("¿aceptan mascotas en el proyecto?", "PROYECTO07")
+    return run
+
+def bench_daily_summary(projects, size):
+    conversation_state = make_leads(size)
+    return lambda: utils.generate_daily_summary(conversation_state)
+
+def bench_recontact_scan(projects, size):
+    conversation_state = make_leads(size)
+    fakes = Fakes()
+    return lambda: recontact_handler.trigger_recontact(conversation_state, fakes.twilio, utils, lambda *args: [])
+
+def bench_save_conversation(projects, size):
+    conversation_state = make_leads(size)
+    phone = "whatsapp:+5219900000000"
+    return lambda: utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+
+def bench_load_conversation_state(projects, size):
+    conversation_state = make_leads(size)
+    phone = "whatsapp:+5219900000000"
+    utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+    return lambda: utils.load_conversation_state(conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+
+BENCHMARKS = {
+    'typo_correction': (False, bench_typo_correction),
+    'project_detection': (False, bench_project_detection),
+    'project_info': (False, bench_project_info),
+    'faq': (False, bench_faq),
+    'daily_summary': (True, bench_daily_summary),
+    'recontact_scan': (True, bench_recontact_scan),
+    'save_conversation': (True, bench_save_conversation),
+    'load_state': (True, bench_load_conversation_state),
+}
+
+def run_benchmarks(sizes=DEFAULT_SIZES, only=None):
+    """Run the selected benchmarks and return {name: {size_label: seconds_per_call}}."""
+    projects = make_projects()
+    results = {}
+    saved_projects = dict(utils.projects_data)
+    saved_faq = dict(utils.faq_data)
+    with installed(Fakes()):
+        utils.projects_data.clear()
+        utils.projects_data.update(projects)
+        try:
+            for name, (uses_leads, setup) in BENCHMARKS.items():
+                if only and name not in only:
+                    continue
+                results[name] = {}
+                for size in (sizes if uses_leads else [None]):
+                    func = setup(projects, size)
+                    label = str(size) if size else "-"
+                    results[name][label] = measure(func)
+                    print(f"{name:<20} {label:>8}  {format_seconds(results[name][label])}", file=sys.stderr)
+        finally:
+            utils.projects_data.clear()
+            utils.projects_data.update(saved_projects)
+            utils.faq_data.clear()
+            utils.faq_data.update(saved_faq)
+    return results
+
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:9.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:9.2f} ms"
+    return f"{seconds:9.3f} s "
+
+def results_path(label):
+    return os.path.join(RESULTS_DIR, f"{label}.json")
+
+def save_results(label, results):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    record = {
+        'label': label,
+        'recorded_at': datetime.now(CST_TIMEZONE).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(results_path(label), 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def compare(results, label):
+    """Return report lines comparing results with the recorded run label."""
+    with open(results_path(label), 'r', encoding='utf-8') as f:
+        recorded = json.load(f)['results']
+    lines = [f"{'benchmark':<20} {'size':>8}  {label:>12}  {'current':>12}  change"]
+    for name, by_size in results.items():
+        for size, seconds in by_size.items():
+            before = recorded.get(name, {}).get(size)
+            change = f"{(seconds - before) / before * 100:+6.1f}%" if before else "   new"
+            lines.append(f"{name:<20} {size:>8}  {format_seconds(before) if before else '-':>12}  {format_seconds(seconds):>12}  {change}")
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Lead counts")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument('--save', metavar='LABEL', help="Record results as benchmarks/results/LABEL.json")
+    parser.add_argument('--compare', metavar='LABEL', help="Compare with benchmarks/results/LABEL.json")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)  # The handlers log every lead at DEBUG/INFO
+    started = time.perf_counter()
+    results = run_benchmarks(args.sizes, args.only)
+    print(f"Completed in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    if args.compare:
+        print("\n".join(compare(results, args.compare)))
+    else:
+        for name, by_size in results.items():
+            for size, seconds in by_size.items():
+                print(f"{name:<20} {size:>8}  {format_seconds(seconds)}")
+    if args.save:
+        save_results(args.save, results)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import os
+import json
+import hashlib
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from google.cloud import storage
+import bot_config
+import utils
+import tracing
+import project_loader
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Timings of the most recent load that swapped in a knowledge base
+last_timings = {}
+
+# Generations of the source objects behind the knowledge base currently in utils
+_loaded_generations = {}
+_load_lock = threading.Lock()
+
+_reloader_thread = None
+_stop_event = threading.Event()
+
+def classify_blob(name):
+    """Return (kind, key) for a knowledge-base object name, or (None, None) for anything else."""
+    filename = os.path.basename(name)
+    parts = name.split('/')
+    if len(parts) >= 3 and parts[-2] == bot_config.FAQ_ENTRIES_DIR:
+        return 'faq', parts[-3].lower()  # Entry object written by faq_store.add_entry
+    if filename.endswith('_faq.txt'):
+        return 'faq', filename[:-len('_faq.txt')].lower()
+    if filename.endswith('_respuestas.txt'):
+        return 'respuestas', filename[:-len('_respuestas.txt')].upper()
+    if filename.endswith(('.json', '.txt')):
+        return 'project', os.path.splitext(filename)[0].upper()
+    return None, None
+
+def parse_faq_text(content):
+    """Parse alternating 'Pregunta:' / 'Respuesta:' lines into {question: answer}."""
+    lines = content.strip().split('\n')
+    faq = {}
+    for i in range(0, len(lines) - 1, 2):
+        question = lines[i].replace('Pregunta:', '').strip().lower()
+        faq[question] = lines[i + 1].replace('Respuesta:', '').strip()
+    return faq
+
+def parse_respuestas_text(content):
+    """Return the downloadable URLs listed as 'URL:' lines."""
+    return [line.replace('URL:', '').strip() for line in content.strip().split('\n') if line.startswith('URL:')]
+
+def _parse(kind, key, name, content):
+    if kind == 'faq':
+        return parse_faq_text(content)
+    if kind == 'respuestas':
+        return parse_respuestas_text(content)
+    return project_loader.load_project(name, content, key)
+
+def _fetch(blob, kind, key):
+    """Download one object into memory and parse it; runs on a pool thread."""
+    started = time.perf_counter()
+    content = blob.download_as_bytes().decode('utf-8')
+    downloaded = time.perf_counter()
+    parsed = _parse(kind, key, blob.name, content)
+    return parsed, len(content), downloaded - started, time.perf_counter() - downloaded
+
+def list_sources(bucket, gcs_path):
+    """Return {name: (blob, kind, key)} for every knowledge-base object under gcs_path."""
+    sources = {}
+    for blob in bucket.list_blobs(prefix=gcs_path):
+        kind, key = classify_blob(blob.name)
+        if kind:
+            sources[blob.name] = (blob, kind, key)
+    return sources
+
+def source_generations(sources):
+    return {name: blob.generation for name, (blob, kind, key) in sources.items()}
+
+def _fetch_all(sources, workers, timings):
+    projects, urls, faq = {}, {}, {}
+    faq_parts = []
+    with ThreadPoolExecutor(max_workers=workers or bot_config.BOOTSTRAP_WORKERS) as pool:
+        futures = {pool.submit(_fetch, blob, kind, key): (name, kind, key) for name, (blob, kind, key) in sources.items()}
+        for future in as_completed(futures):
+            name, kind, key = futures[future]
+            try:
+                parsed, size, download_seconds, parse_seconds = future.result()
+            except Exception as e:
+                timings['failed'] += 1
+                logger.error(f"Error cargando {name} desde GCS: {str(e)}")
+                continue
+            timings['files'] += 1
+            timings['bytes'] += size
+            timings['download_cpu'] += download_seconds
+            timings['parse_cpu'] += parse_seconds
+            if kind == 'project':
+                projects[key] = parsed
+            elif kind == 'respuestas':
+                urls.setdefault(key, []).extend(parsed)
+            else:
+                faq_parts.append((f"/{bot_config.FAQ_ENTRIES_DIR}/" in name, name, key, parsed))
+    # Main FAQ files first, then entry objects in the order they were added, so later answers win
+    for is_entry, name, key, parsed in sorted(faq_parts):
+        faq.setdefault(key, {}).update(parsed)
+    return {'projects': projects, 'urls': urls, 'faq': faq}
+
+# Snapshot: a JSON header line (version, checksum, source generations) followed by the JSON payload.
+# Project matching (typo correction, mention detection) works off the project names in the payload
+# and PROJECT_KEYWORD_MAPPING, so a warm start parses nothing and there is no compiled matcher to store.
+
+def encode_snapshot(payload, generations):
+    """Serialize a parsed knowledge base with its checksum and the source generations it was built from."""
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    header = {
+        'version': bot_config.KB_SNAPSHOT_VERSION,
+        'checksum': hashlib.sha256(body).hexdigest(),
+        'sources': generations,
+    }
+    return json.dumps(header, sort_keys=True).encode('utf-8') + b"\n" + body
+
+def decode_snapshot(data, generations):
+    """Return the payload of a snapshot, or None if it is corrupt, from another version or stale."""
+    header_line, _, body = data.partition(b"\n")
+    try:
+        header = json.loads(header_line)
+    except ValueError:
+        logger.warning("Knowledge base snapshot has an unreadable header")
+        return None
+    if header.get('version') != bot_config.KB_SNAPSHOT_VERSION:
+        logger.info(f"Knowledge base snapshot version {header.get('version')} != {bot_config.KB_SNAPSHOT_VERSION}")
+        return None
+    if hashlib.sha256(body).hexdigest() != header.get('checksum'):
+        logger.warning("Knowledge base snapshot checksum mismatch")
+        return None
+    if header.get('sources') != generations:
+        logger.info("Knowledge base snapshot is stale: source files changed")
+        return None
+    return json.loads(body)
+
+def read_snapshot(bucket, generations):
+    try:
+        data = bucket.blob(bot_config.KB_SNAPSHOT_PATH).download_as_bytes()
+    except Exception as e:
+        logger.info(f"No knowledge base snapshot available: {str(e)}")
+        return None
+    return decode_snapshot(data, generations)
+
+def write_snapshot(bucket, payload, generations):
+    try:
+        bucket.blob(bot_config.KB_SNAPSHOT_PATH).upload_from_string(encode_snapshot(payload, generations), content_type='application/json')
+        logger.info(f"Knowledge base snapshot written to {bot_config.KB_SNAPSHOT_PATH}")
+    except Exception as e:
+        logger.error(f"Failed to write knowledge base snapshot: {str(e)}")
+
+def apply_knowledge_base(payload):
+    """Swap a parsed knowledge base into utils.
+
+    Each dict is replaced by rebinding rather than clearing and refilling, so a
+    request reading utils.projects_data sees either the old catalog or the new
+    one, never a half-loaded one, and nothing waits on a lock.
+    """
+    utils.projects_data = payload['projects']
+    utils.downloadable_urls = payload['urls']
+    utils.faq_data = payload['faq']
+
+def _load(bucket, sources, list_seconds, workers=None, use_snapshot=None):
+    use_snapshot = bot_config.KB_SNAPSHOT_ENABLED if use_snapshot is None else use_snapshot
+    timings = {'list': list_seconds, 'snapshot': 0.0, 'fetch': 0.0, 'apply': 0.0, 'download_cpu': 0.0, 'parse_cpu': 0.0,
+               'files': 0, 'failed': 0, 'bytes': 0, 'source': 'objects', 'applied': False}
+    started = time.perf_counter()
+    generations = source_generations(sources)
+
+    with _load_lock:
+        payload = None
+        if use_snapshot:
+            with tracing.span('bootstrap.snapshot'):
+                payload = read_snapshot(bucket, generations)
+            timings['snapshot'] = time.perf_counter() - started
+            if payload is not None:
+                timings['source'] = 'snapshot'
+
+        if payload is None:
+            stage_started = time.perf_counter()
+            with tracing.span('bootstrap.fetch'):
+                payload = _fetch_all(sources, workers, timings)
+            timings['fetch'] = time.perf_counter() - stage_started
+            if timings['failed'] and _loaded_generations:
+                logger.warning(f"Knowledge base reload skipped: {timings['failed']} objects failed; keeping the current version")
+                return timings
+            if use_snapshot and not timings['failed']:
+                write_snapshot(bucket, payload, generations)
+
+        stage_started = time.perf_counter()
+        with tracing.span('bootstrap.apply'):
+            apply_knowledge_base(payload)
+        timings['apply'] = time.perf_counter() - stage_started
+        timings['applied'] = True
+        _loaded_generations.clear()
+        if not timings['failed']:
+            _loaded_generations.update(generations)
+
+    timings['total'] = list_seconds + time.perf_counter() - started
+    last_timings.clear()
+    last_timings.update(timings)
+    logger.info(
+        f"Knowledge base loaded from {timings['source']}: {len(payload['projects'])} projects, {len(payload['faq'])} FAQ files, "
+        f"{len(payload['urls'])} URL lists in {timings['total']:.2f}s (list {timings['list']:.2f}s, "
+        f"snapshot {timings['snapshot']:.2f}s, fetch {timings['fetch']:.2f}s for {timings['files']} objects, "
+        f"{timings['failed']} failed, apply {timings['apply'] * 1000:.1f}ms)"
+    )
+    return timings
+
+def load_knowledge_base(bucket_name, gcs_path, workers=None, use_snapshot=None):
+    """Load every project, FAQ and respuestas file under gcs_path into utils.
+
+    The source listing is compared with the snapshot at KB_SNAPSHOT_PATH; when
+    the snapshot is intact and was built from the same object generations it is
+    applied with a single read. Otherwise the objects are downloaded into memory
+    and parsed concurrently, and a new snapshot is written. Returns the
+    per-stage timings in seconds.
+    """
+    started = time.perf_counter()
+    with tracing.span('bootstrap.list'):
+        bucket = storage.Client().bucket(bucket_name)
+        sources = list_sources(bucket, gcs_path)
+    return _load(bucket, sources, time.perf_counter() - started, workers, use_snapshot)
+
+# Hot reload
+
+def check_for_changes(bucket_name, gcs_path):
+    """Reload the knowledge base if a source object was added, removed or rewritten since the last load.
+
+    Returns True when a new version was swapped in.
+    """
+    started = time.perf_counter()
+    bucket = storage.Client().bucket(bucket_name)
+    sources = list_sources(bucket, gcs_path)
+    generations = source_generations(sources)
+    if generations == _loaded_generations:
+        return False
+    changed = sorted(name for name in generations.keys() | _loaded_generations.keys() if generations.get(name) != _loaded_generations.get(name))
+    logger.info(f"Knowledge base sources changed ({len(changed)}): {', '.join(changed[:5])}")
+    return _load(bucket, sources, time.perf_counter() - started)['applied']
+
+def _reload_loop(bucket_name, gcs_path):
+    logger.info("Knowledge base reloader started")
+    while not _stop_event.wait(bot_config.KB_RELOAD_INTERVAL_SECONDS):
+        try:
+            check_for_changes(bucket_name, gcs_path)
+        except Exception as e:
+            logger.error(f"Knowledge base reload check failed: {str(e)}", exc_info=True)
+    logger.info("Knowledge base reloader stopped")
+
+def start_reloader(bucket_name, gcs_path):
+    """Start the background thread that polls the knowledge-base sources for changes."""
+    global _reloader_thread
+    if _reloader_thread is not None and _reloader_thread.is_alive():
+        return
+    _stop_event.clear()
+    _reloader_thread = threading.Thread(target=_reload_loop, args=(bucket_name, gcs_path), name="giselle-kb-reloader", daemon=True)
+    _reloader_thread.start()
+
+def stop_reloader():
+    """Stop the knowledge-base reloader thread."""
+    _stop_event.set()
+    if _reloader_thread is not None:
+        _reloader_thread.join(timeout=5)
@@ -1,4 +1,7 @@
 # Bot Configuration File
+import re
+from datetime import datetime
+import timestamps
 
 # Bot Personality
 BOT_PERSONALITY = """
@@ -31,11 +34,20 @@ GERENTE_NUMBERS = ["+5218110665094"]
 
 # WhatsApp Configuration
 WHATSAPP_SENDER_NUMBER = "whatsapp:+18188732305"
+DEFAULT_COUNTRY_CODE = "52"
+NATIONAL_NUMBER_LENGTH = 10
 
 # GCS Configuration
 GCS_BUCKET_NAME = "giselle-projects"
 GCS_BASE_PATH = "PROYECTOS"
 GCS_CONVERSATIONS_PATH = "CONVERSATIONS"
+BOOTSTRAP_WORKERS = 16  # Concurrent downloads when loading projects and FAQs at startup
+KB_SNAPSHOT_ENABLED = True  # Warm start from a parsed snapshot of the knowledge base when its sources are unchanged
+KB_SNAPSHOT_PATH = "SNAPSHOTS/knowledge_base.json"  # Kept outside GCS_BASE_PATH so it is not read as a project
+KB_SNAPSHOT_VERSION = 2  # Bump when the parsed format changes to invalidate existing snapshots
+KB_RELOAD_ENABLED = True  # Poll the knowledge-base sources and swap in changes without a restart
+KB_RELOAD_INTERVAL_SECONDS = 60  # Seconds between generation checks
+PROJECT_PARSE_CACHE_SIZE = 512  # Parsed project files kept by content hash across reloads
 
 # Recontact Configuration
 RECONTACT_TEMPLATE_NAME = "follow_up_template"
@@ -44,13 +56,89 @@ RECONTACT_HOUR_CST = 18
 RECONTACT_MINUTE_CST = 5
 RECONTACT_TOLERANCE_MINUTES = 5
 
+# Reminder Configuration (WhatsApp 24-hour window)
+REMINDER_AFTER_HOURS = 20
+REMINDER_WINDOW_HOURS = 24
+
+# Scheduler Configuration
+SCHEDULER_ENABLED = True
+SCHEDULER_LOCK_PATH = "CONVERSATIONS/scheduler.lock"
+SCHEDULER_LEASE_SECONDS = 60
+
 # Report Configuration
 WEEKLY_REPORT_DAY = "Sunday"
 WEEKLY_REPORT_TIME = "18:00"
 LEADS_EXCEL_PATH = "leads_giselle.xlsx"
+ACTIVITY_RETENTION_DAYS = 35  # Daily activity counters kept in CONVERSATIONS/activity.json
+ACTIVITY_RETENTION_WEEKS = 12  # Weekly activity counters kept
 
 # FAQ Configuration
 FAQ_RESPONSE_DELAY = 30
+FAQ_ENTRIES_DIR = "faq_entries"  # Per-project folder of single-entry objects appended by gerentes
+FAQ_COMPACTION_INTERVAL_SECONDS = 60 * 60  # How often entry objects are merged into the main FAQ files
+FAQ_COMPACTION_MIN_ENTRIES = 1  # Skip projects with fewer pending entry objects
+PENDING_RESPONSE_TIMEOUT = 30 * 60  # Give up on a pending question after 30 minutes
+
+# Intent Classification Configuration
+INTENT_FAST_PATH_MIN_CONFIDENCE = 0.85  # Rule-based results below this go to the LLM
+CLASSIFICATION_CACHE_SIZE = 2048  # LRU bound on cached intention/escalation results
+INTENTION_HISTORY_SIZE = 10  # Recent intentions kept per lead; lifetime totals live in intention_counts
+
+# Prompt Token Budgets (per prompt section; longer sections are truncated)
+PROMPT_TOKEN_BUDGETS = {
+    'persona': 1200,             # BOT_PERSONALITY and RESPONSE_INSTRUCTIONS
+    'catalog': 2500,             # Summary of every project
+    'project': 800,              # Details of the project under discussion
+    'client': 200,               # Client profile fields
+    'history': 1200,             # Conversation history in the reply prompt (oldest lines dropped first)
+    'classifier_history': 400,   # Conversation history in classification prompts
+    'reply': 300,                # Bot reply evaluated for gerente escalation
+    'message': 300,              # Incoming client message
+}
+
+# Prompt layout: 'cache_friendly' sends the static persona and catalog as a stable first
+# system message (cacheable by the provider); 'legacy' interleaves them with client data
+PROMPT_LAYOUT = 'cache_friendly'
+
+# LLM Gateway Configuration
+LLM_FALLBACK_MODEL = "gpt-4.1-nano"  # Faster model used when the primary one fails or its breaker is open
+LLM_DEFAULT_DEADLINE = 10  # Seconds per call, including retries
+LLM_DEADLINES = {
+    'reply': 20,
+    'detect_intention': 6,
+    'needs_gerente_contact': 6,
+    'extract_name': 5,
+    'rephrase': 8,
+    'transcription': 30,
+}
+LLM_ATTEMPT_TIMEOUT_SHARE = 0.4  # Share of a call's deadline one attempt may use, so a hung request leaves room to retry
+LLM_FALLBACK_RESERVE_SHARE = 0.3  # Share of a call's deadline kept for LLM_FALLBACK_MODEL
+LLM_MAX_RETRIES = 2
+LLM_RETRY_BASE_DELAY = 0.5  # Seconds; doubled per attempt, with full jitter
+LLM_BREAKER_FAILURE_THRESHOLD = 5  # Consecutive failures that open a model's circuit breaker
+LLM_BREAKER_RESET_SECONDS = 30  # Time before an open breaker lets a probe call through
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 30, float('inf'))  # Histogram bucket bounds in seconds
+LLM_FALLBACK_REPLY = "Gracias por tu paciencia, {client_name}. Estoy revisando la información para darte una respuesta precisa, ¿me permites unos minutos?"
+
+# Reply Streaming Configuration
+STREAM_REPLIES = True  # Send the first sentence of AI replies while the rest is generating
+
+# Tracing Configuration
+TRACE_EXPORT_ENABLED = True  # Write each finished request trace as a JSON line to the giselle.traces logger
+TRACE_BUFFER_SIZE = 100  # Recent traces kept in memory for /traces
+TRACE_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))  # Seconds
+
+# Analytics Configuration
+ANALYTICS_EXPORT_ENABLED = True  # Write every intention and stage change as a JSON line to the giselle.analytics logger
+
+# Logging Configuration
+LOG_LEVEL = "INFO"  # Root level; the LOG_LEVEL environment variable overrides it (e.g. DEBUG)
+LOG_FILE = "giselle_activity.log"
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024  # Rotate the activity log at 10 MB
+LOG_FILE_BACKUP_COUNT = 5  # Rotated files kept
+LOG_QUEUE_SIZE = 10000  # Records buffered for the writer thread; records beyond this are dropped and counted
+LOG_DEBUG_SAMPLE_EVERY = 10  # Keep 1 of every N DEBUG records from each call site
+LOG_SUMMARY_MAX_CHARS = 300  # Upper bound on a summarized payload (state, history, request values) in a log line
 
 # Phrases indicating lack of interest
 NO_INTEREST_PHRASES = [
@@ -108,8 +196,8 @@ def handle_recontact(phone, state, current_time):
     if not schedule_next:
         return None, False
 
-    last_contact = datetime.fromisoformat(state.get('last_contact', current_time.isoformat()))
-    time_since_last_contact = (current_time - last_contact).total_seconds() / 3600  # in hours
+    last_contact = timestamps.to_epoch(state.get('last_contact')) or current_time.timestamp()
+    time_since_last_contact = (current_time.timestamp() - last_contact) / 3600  # in hours
 
     if time_since_last_contact < 48:  # Wait at least 2 days
         return None, False
@@ -0,0 +1,86 @@
+import re
+import copy
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import bot_config
+import intent_classifier
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# LRU cache of classification results: key -> result
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+# Cache hit/miss counters
+stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def fingerprint(*parts):
+    """Return a short digest of the context a classification depends on."""
+    digest = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+def last_bot_turn(conversation_history):
+    """Return the last message Giselle sent in a newline-joined history, or ''."""
+    for line in reversed((conversation_history or '').split('\n')):
+        if line.startswith("Giselle:"):
+            return line
+    return ''
+
+# Reply traits the gerente-contact decision depends on; the full reply text never repeats
+PRICE_PATTERN = re.compile(r'\$\s?\d|\d\s*(mxn|pesos|usd|dólares|mil\b|millones)', re.IGNORECASE)
+DATE_PATTERN = re.compile(
+    r'\b\d{1,2}/\d{1,2}\b|\b20\d{2}\b|\b(enero|febrero|marzo|abril|mayo|junio|julio|agosto|'
+    r'septiembre|octubre|noviembre|diciembre|lunes|martes|miércoles|jueves|viernes|sábado|domingo)\b',
+    re.IGNORECASE
+)
+HEDGE_PATTERN = re.compile(r'no (está|esta|tengo|cuento|sé)\b|confirm|verific|consult|gerente', re.IGNORECASE)
+
+def reply_traits(reply):
+    """Return a short fingerprint of a reply: whether it quotes a price, gives a date or hedges."""
+    reply = reply or ''
+    return ''.join('1' if pattern.search(reply) else '0' for pattern in (PRICE_PATTERN, DATE_PATTERN, HEDGE_PATTERN))
+
+def make_key(kind, message, *context):
+    """Build a cache key from the call kind, the normalized message and a context fingerprint."""
+    return (kind, intent_classifier.normalize_text(message or ''), fingerprint(*context))
+
+def get(key):
+    """Return a copy of the cached result for key, or None on a miss."""
+    with _lock:
+        result = _cache.get(key)
+        if result is None:
+            stats['misses'] += 1
+            return None
+        _cache.move_to_end(key)
+        stats['hits'] += 1
+    return copy.deepcopy(result)
+
+def put(key, result):
+    """Store result under key, evicting the least recently used entries beyond the limit."""
+    result = copy.deepcopy(result)
+    evicted = []
+    with _lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > bot_config.CLASSIFICATION_CACHE_SIZE:
+            evicted.append(_cache.popitem(last=False)[0])
+            stats['evictions'] += 1
+    for key in evicted:
+        logger.debug(f"Evicted classification cache entry: {key}")
+
+def clear():
+    """Drop every cached result and reset the counters."""
+    with _lock:
+        _cache.clear()
+        for counter in stats:
+            stats[counter] = 0
+
+def size():
+    """Return the number of cached results."""
+    return len(_cache)
@@ -0,0 +1,447 @@
+import gc
+import sys
+import json
+import logging
+import contextlib
+import difflib
+import threading
+import unicodedata
+from itertools import repeat
+from collections import deque
+from collections.abc import MutableMapping
+import bot_config
+import lead_events
+import timestamps
+import phone_numbers
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard json module
+    orjson = None
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Fields indexed by truthiness and fields indexed by value
+FLAG_FIELDS = ('is_gerente', 'priority', 'no_interest', 'pending_question')
+VALUE_FIELDS = ('stage', 'last_mentioned_project', 'client_name', 'last_contact', 'last_response_time')
+# Timestamp fields among VALUE_FIELDS, indexed by CST day rather than by value
+DAY_FIELDS = frozenset({'last_contact', 'last_response_time'})
+
+# VALUE_FIELDS whose index key is derived from the value by _value_key
+_KEYED_FIELDS = DAY_FIELDS | {'client_name'}
+
+# Placeholder names that must not match a name lookup
+PLACEHOLDER_NAMES = {'', 'cliente', 'desconocido'}
+
+# Every field a lead is known to have, stored in LeadState slots
+LEAD_FIELDS = (
+    'history', 'client_name', 'client_budget', 'needs', 'preferred_time', 'preferred_days', 'purchase_intent',
+    'stage', 'interest_level', 'intention_history', 'intention_counts', 'last_mentioned_project', 'project_info_shared',
+    'last_contact', 'last_incoming_time', 'last_response_time', 'first_contact', 'last_weekly_report',
+    'recontact_attempts', 'reminder_sent', 'schedule_next', 'messages_without_response',
+    'name_asked', 'introduced', 'needs_asked', 'budget_asked', 'contact_time_asked', 'purchase_intent_asked',
+    'pending_question', 'pending_response_time', 'notified_pending',
+    'zoom_proposed', 'zoom_scheduled', 'zoom_details',
+    'is_gerente', 'priority', 'no_interest', 'awaiting_menu_choice', 'tasks', 'activity_day', 'activity_week',
+)
+_FIELD_SET = frozenset(LEAD_FIELDS)
+
+# Fields drawn from a small vocabulary; their strings are interned so every lead shares one copy
+INTERNED_FIELDS = frozenset({'stage', 'needs', 'last_mentioned_project', 'purchase_intent', 'preferred_time', 'preferred_days'})
+_INTERNED_ORDER = tuple(sorted(INTERNED_FIELDS))
+
+_MISSING = object()
+
+def normalize_name(name):
+    """Lowercase a name and strip accents so 'José' and 'jose' index together."""
+    name = str(name)
+    if name.isascii():
+        return name.strip().lower()
+    decomposed = unicodedata.normalize('NFKD', name.strip().lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def _value_key(field, value):
+    if field == 'client_name':
+        key = normalize_name(value)
+        return key if key not in PLACEHOLDER_NAMES else None
+    if field in DAY_FIELDS:
+        if type(value) is float:
+            return timestamps.day_number(value)
+        try:
+            epoch = timestamps.to_epoch(value)
+        except ValueError:
+            return None
+        return timestamps.day_number(epoch) if epoch is not None else None
+    return value
+
+class LeadState(MutableMapping):
+    """State of a single conversation that keeps its store's indexes up to date.
+
+    Known fields live in slots instead of a per-lead dict; unknown keys go to a
+    small overflow dict. It behaves as a mapping, so handlers keep using
+    state['field'] and state.get('field').
+    """
+
+    __slots__ = ('_store', '_phone', '_extra') + LEAD_FIELDS
+
+    def __init__(self, store, phone, data=()):
+        self._store = store
+        self._phone = phone
+        self._extra = None
+        if type(data) is not dict:
+            data = dict(data)
+        if _FIELD_SET.issuperset(data):
+            # The common case: only known fields, so every slot is set from C
+            deque(map(setattr, repeat(self), data.keys(), data.values()), maxlen=0)
+        else:
+            for key, value in data.items():
+                self._set(key, value)
+        # Loading runs this for every lead, so the checks below are plain lookups
+        get = data.get
+        for key in _INTERNED_ORDER:
+            value = get(key)
+            if type(value) is str:
+                setattr(self, key, sys.intern(value))
+        for key in timestamps.TIMESTAMP_FIELDS:
+            value = get(key)
+            if type(value) is str:
+                try:
+                    setattr(self, key, timestamps.to_epoch(value))
+                except ValueError:
+                    logger.warning(f"Invalid {key} for {phone}: {value}")
+        intentions = get('intention_history')
+        if type(intentions) is list:
+            try:
+                intentions[:] = map(sys.intern, intentions)
+            except TypeError:
+                pass  # Not all strings; keep the items as they are
+            if len(intentions) > bot_config.INTENTION_HISTORY_SIZE:
+                lead_events.fold_history(self)
+
+    def _set(self, key, value):
+        if key in _FIELD_SET:
+            setattr(self, key, sys.intern(value) if key in INTERNED_FIELDS and type(value) is str else value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    # Unset fields are empty slots: reading one raises AttributeError, so lookups
+    # go through getattr with a default
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            value = getattr(self, key, _MISSING)
+        else:
+            value = self._extra.get(key, _MISSING) if self._extra else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra else default
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return bool(self._extra) and key in self._extra
+
+    def __setitem__(self, key, value):
+        with self._store.lock:
+            old = self.get(key, _MISSING)
+            self._set(key, value)
+            if key in self._store.indexed_fields and old is not value:
+                self._store._reindex_field(self._phone, key, old, value)
+
+    def __delitem__(self, key):
+        with self._store.lock:
+            old = self[key]
+            if key in _FIELD_SET:
+                delattr(self, key)
+            else:
+                del self._extra[key]
+            if key in self._store.indexed_fields:
+                self._store._reindex_field(self._phone, key, old, _MISSING)
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self):
+        """Return the lead as a plain dict (the serialized form)."""
+        data = {}
+        for name in LEAD_FIELDS:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                data[name] = value
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+class ConversationState(dict):
+    """Conversation state keyed by phone with secondary indexes over lead attributes.
+
+    Indexes are maintained on every mutation of the store or of a lead's
+    indexed fields, so role and attribute queries do not scan every lead.
+    Mutations hold lock, which request threads and the scheduler share; hold it
+    too around multi-step updates that must not interleave (e.g. a reload).
+    """
+
+    indexed_fields = frozenset(FLAG_FIELDS + VALUE_FIELDS)
+
+    def __init__(self, data=()):
+        super().__init__()
+        self.lock = threading.RLock()
+        self._flags = {field: {} for field in FLAG_FIELDS}
+        self._values = {field: {} for field in VALUE_FIELDS}
+        self._by_phone = {}
+        self.update(data)
+
+    # Index maintenance
+
+    def _index(self, phone, state):
+        # Runs for every lead on load, so the loops and _add_value are inlined
+        get = state.get
+        for field, index in self._flags.items():
+            if get(field):
+                index[phone] = None
+        for field, index in self._values.items():
+            value = get(field)
+            if value is None:
+                continue
+            key = _value_key(field, value) if field in _KEYED_FIELDS else value
+            if key is None:
+                continue
+            bucket = index.get(key)
+            if bucket is None:
+                index[key] = {phone: None}
+            else:
+                bucket[phone] = None
+
+    def _unindex(self, phone, state):
+        for field in FLAG_FIELDS:
+            self._flags[field].pop(phone, None)
+        for field in VALUE_FIELDS:
+            self._discard_value(field, state.get(field), phone)
+
+    def _add_value(self, field, value, phone):
+        key = _value_key(field, value)
+        if key is not None:
+            self._values[field].setdefault(key, {})[phone] = None
+
+    def _discard_value(self, field, value, phone):
+        key = _value_key(field, value) if value is not None else None
+        bucket = self._values[field].get(key)
+        if bucket is not None:
+            bucket.pop(phone, None)
+            if not bucket:
+                del self._values[field][key]
+
+    def _reindex_field(self, phone, field, old, new):
+        new = None if new is _MISSING else new
+        if field in self._flags:
+            if new:
+                self._flags[field][phone] = None
+            else:
+                self._flags[field].pop(phone, None)
+            return
+        if old is not _MISSING:
+            self._discard_value(field, old, phone)
+        if new is not None:
+            self._add_value(field, new, phone)
+
+    # Mapping interface
+
+    def __setitem__(self, phone, state):
+        source = state
+        if not isinstance(state, LeadState) or state._store is not self or state._phone != phone:
+            state = LeadState(self, phone, state)
+        with self.lock:
+            if phone in self:
+                self._unindex(phone, self[phone])
+            dict.__setitem__(self, phone, state)
+            # Index from the plain dict when there is one; its lookups are cheaper than the slots'
+            self._index(phone, source if type(source) is dict else state)
+            number = phone_numbers.normalize_phone(phone)
+            if number:
+                self._by_phone[number] = phone
+
+    def __delitem__(self, phone):
+        with self.lock:
+            self._unindex(phone, self[phone])
+            super().__delitem__(phone)
+            number = phone_numbers.normalize_phone(phone)
+            if self._by_phone.get(number) == phone:
+                del self._by_phone[number]
+
+    def pop(self, phone, *default):
+        with self.lock:
+            if phone in self:
+                state = self[phone]
+                del self[phone]
+                return state
+            return super().pop(phone, *default)
+
+    def setdefault(self, phone, default=None):
+        with self.lock:
+            if phone not in self:
+                self[phone] = default if default is not None else {}
+            return self[phone]
+
+    def update(self, *args, **kwargs):
+        data = args[0] if len(args) == 1 and not kwargs and type(args[0]) is dict else dict(*args, **kwargs)
+        with self.lock:
+            if not self:
+                self._load(data)
+                return
+            for phone, state in data.items():
+                self[phone] = state
+
+    def _load(self, data):
+        """Fill an empty store: build every lead, then each index in one pass per field."""
+        leads = {phone: LeadState(self, phone, state) for phone, state in data.items()}
+        dict.update(self, leads)
+        # Index from the plain dicts when there are some; their lookups are cheaper than the slots'
+        sources = [(phone, state if type(state) is dict else leads[phone]) for phone, state in data.items()]
+        for field, index in self._flags.items():
+            index.update(dict.fromkeys([phone for phone, state in sources if state.get(field)]))
+        for field, index in self._values.items():
+            keyed = field in _KEYED_FIELDS
+            for phone, state in sources:
+                value = state.get(field)
+                if value is None:
+                    continue
+                key = _value_key(field, value) if keyed else value
+                if key is None:
+                    continue
+                bucket = index.get(key)
+                if bucket is None:
+                    index[key] = {phone: None}
+                else:
+                    bucket[phone] = None
+        normalize_phone = phone_numbers.normalize_phone
+        self._by_phone.update((number, phone) for number, phone in zip(map(normalize_phone, leads), leads) if number)
+
+    def clear(self):
+        with self.lock:
+            super().clear()
+            for index in self._flags.values():
+                index.clear()
+            for index in self._values.values():
+                index.clear()
+            self._by_phone.clear()
+
+    def popitem(self):
+        with self.lock:
+            phone = next(reversed(self))
+            return phone, self.pop(phone)
+
+    # Queries
+
+    def gerentes(self):
+        """Return the phones of every gerente."""
+        return list(self._flags['is_gerente'])
+
+    def priority_clients(self):
+        """Return the phones of clients marked as priority."""
+        return [phone for phone in self._flags['priority'] if phone not in self._flags['is_gerente']]
+
+    def no_interest_clients(self):
+        """Return the phones of clients that declined interest."""
+        return [phone for phone in self._flags['no_interest'] if phone not in self._flags['is_gerente']]
+
+    def pending_clients(self):
+        """Return the phones of clients with a pending question."""
+        return [phone for phone in self._flags['pending_question'] if phone not in self._flags['is_gerente']]
+
+    def clients(self):
+        """Return the phones of every non-gerente conversation."""
+        gerentes = self._flags['is_gerente']
+        return [phone for phone in self if phone not in gerentes]
+
+    def interested_clients(self):
+        """Return the phones of clients that have not declined interest."""
+        excluded = self._flags['is_gerente'].keys() | self._flags['no_interest'].keys()
+        return [phone for phone in self if phone not in excluded]
+
+    def by_stage(self, stage):
+        """Return the phones of clients in the given sales stage."""
+        return list(self._values['stage'].get(stage, ()))
+
+    def by_project(self, project):
+        """Return the phones of clients whose last mentioned project is project."""
+        return list(self._values['last_mentioned_project'].get(project, ()))
+
+    def stage_counts(self):
+        """Return the number of conversations in each stage."""
+        return {stage: len(phones) for stage, phones in self._values['stage'].items()}
+
+    def by_day(self, field, day):
+        """Return the phones whose timestamp field (last_contact or last_response_time) falls on a CST day.
+
+        day is a date ordinal, as returned by timestamps.day_number().
+        """
+        return list(self._values[field].get(day, ()))
+
+    def find_by_phone(self, raw):
+        """Return the conversation key for any spelling of a phone number, or None."""
+        return self._by_phone.get(phone_numbers.normalize_phone(raw))
+
+    def find_by_name(self, name, cutoff=0.8):
+        """Return the phones of clients whose name matches name, exactly or fuzzily."""
+        names = self._values['client_name']
+        key = _value_key('client_name', name)
+        if key is None:
+            return []
+        if key in names:
+            return list(names[key])
+        matches = []
+        for close_name in difflib.get_close_matches(key, list(names.keys()), n=3, cutoff=cutoff):
+            matches.extend(names[close_name])
+        return matches
+
+# Serialization
+
+def dumps(conversation_state):
+    """Serialize conversation state to compact UTF-8 JSON (with orjson when it is installed)."""
+    with getattr(conversation_state, 'lock', contextlib.nullcontext()):
+        data = {phone: state.to_dict() if isinstance(state, LeadState) else state for phone, state in conversation_state.items()}
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            pass  # e.g. integer dict keys, which json accepts and orjson does not
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def loads(data):
+    """Parse bytes written by dumps() or by the previous json.dump format."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+@contextlib.contextmanager
+def gc_paused():
+    """Pause the cyclic garbage collector while a state is parsed and rebuilt.
+
+    Loading allocates several objects per lead field and frees none of them, so every
+    collection it triggers rescans the growing heap for nothing; that was most of the
+    load time.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
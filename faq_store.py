@@ -0,0 +1,108 @@
+import os
+import time
+import uuid
+import logging
+from google.cloud import storage
+from google.api_core import exceptions as gcs_exceptions
+import bot_config
+import utils
+import scheduler
+import bootstrap
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# FAQs of a project live in {GCS_BASE_PATH}/{PROJECT}/{project}_faq.txt plus one small
+# entry object per addition under {GCS_BASE_PATH}/{PROJECT}/{FAQ_ENTRIES_DIR}/, which
+# compaction folds back into the main file.
+
+def project_folder(project):
+    return project.upper() if project else "GENERAL"
+
+def faq_file_path(project):
+    folder = project_folder(project)
+    return os.path.join(bot_config.GCS_BASE_PATH, folder, f"{folder.lower()}_faq.txt")
+
+def entry_path(project):
+    """Name for a new entry object; names sort in the order entries were added."""
+    return os.path.join(bot_config.GCS_BASE_PATH, project_folder(project), bot_config.FAQ_ENTRIES_DIR, f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.txt")
+
+def format_entry(question, answer):
+    return f"Pregunta: {question}\nRespuesta: {answer}\n"
+
+def add_entry(project, question, answer):
+    """Record a FAQ answer as one small GCS object, then make it visible in utils.faq_data.
+
+    project=None stores a general FAQ. Raises if the entry could not be written, in
+    which case utils.faq_data is left unchanged.
+    """
+    key = project_folder(project).lower()
+    path = entry_path(project)
+    storage_client = storage.Client()
+    bucket = storage_client.bucket(bot_config.GCS_BUCKET_NAME)
+    bucket.blob(path).upload_from_string(format_entry(question, answer), content_type='text/plain', if_generation_match=0)
+    utils.faq_data.setdefault(key, {})[question.strip().lower()] = answer.strip()
+    logger.info(f"Saved FAQ entry for {key} to {path}")
+    return path
+
+def compact_project(bucket, folder, entries):
+    """Merge a project's entry objects into its main FAQ file, then delete them.
+
+    The main file is rewritten with a generation precondition so a concurrent
+    compaction cannot drop entries; entries added meanwhile are left for the
+    next run. Returns the number of entries folded in.
+    """
+    base_blob = bucket.blob(os.path.join(bot_config.GCS_BASE_PATH, folder, f"{folder.lower()}_faq.txt"))
+    try:
+        content = base_blob.download_as_bytes().decode('utf-8')
+        base_generation = base_blob.generation
+    except gcs_exceptions.NotFound:
+        content, base_generation = "", 0
+
+    faq = bootstrap.parse_faq_text(content) if content.strip() else {}
+    for entry in entries:
+        faq.update(bootstrap.parse_faq_text(entry.download_as_bytes().decode('utf-8')))
+
+    merged = "".join(format_entry(question, answer) for question, answer in faq.items())
+    base_blob.upload_from_string(merged, content_type='text/plain', if_generation_match=base_generation)
+    for entry in entries:
+        try:
+            entry.delete(if_generation_match=entry.generation)
+        except gcs_exceptions.NotFound:
+            pass
+    logger.info(f"Compacted {len(entries)} FAQ entries into {base_blob.name} ({len(faq)} questions)")
+    return len(entries)
+
+def compact_all(min_entries=None):
+    """Compact every project that has at least min_entries entry objects. Returns entries folded in."""
+    min_entries = bot_config.FAQ_COMPACTION_MIN_ENTRIES if min_entries is None else min_entries
+    storage_client = storage.Client()
+    bucket = storage_client.bucket(bot_config.GCS_BUCKET_NAME)
+    by_folder = {}
+    for blob in bucket.list_blobs(prefix=bot_config.GCS_BASE_PATH):
+        parts = blob.name.split('/')
+        if len(parts) >= 3 and parts[-2] == bot_config.FAQ_ENTRIES_DIR:
+            by_folder.setdefault(parts[-3], []).append(blob)
+
+    compacted = 0
+    for folder, entries in by_folder.items():
+        if len(entries) < min_entries:
+            continue
+        entries.sort(key=lambda blob: blob.name)
+        try:
+            compacted += compact_project(bucket, folder, entries)
+        except gcs_exceptions.PreconditionFailed:
+            logger.warning(f"FAQ file of {folder} changed during compaction; retrying next run")
+        except Exception as e:
+            logger.error(f"Failed to compact FAQ entries of {folder}: {str(e)}", exc_info=True)
+    return compacted
+
+def run_compaction_job():
+    """Scheduler job: compact FAQ entries and schedule the next run."""
+    try:
+        compact_all()
+    finally:
+        schedule_compaction()
+
+def schedule_compaction():
+    scheduler.schedule_job("faq_compaction", time.time() + bot_config.FAQ_COMPACTION_INTERVAL_SECONDS, run_compaction_job)
@@ -1,9 +1,13 @@
 import re
 import logging
-import os
 import bot_config
 import utils
-from google.cloud import storage
+import scheduler
+import pending_questions
+import phone_numbers
+import log_pipeline
+import faq_store
+import timestamps
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -19,37 +23,124 @@ def show_gerente_menu(phone, client, conversation_state):
         "6️⃣ Asignar una tarea (por ejemplo, 'Llamar a [teléfono] mañana')",
         "7️⃣ Buscar información de un cliente",
         "8️⃣ Añadir una FAQ",
+        "9️⃣ Ver preguntas pendientes",
         "Escribe el número de la opción o usa el comando directamente."
     ]
     utils.send_consecutive_messages(phone, menu, client, bot_config.WHATSAPP_SENDER_NUMBER)
     conversation_state[phone]['awaiting_menu_choice'] = True
 
 def notify_gerente_of_pending_questions(phone, conversation_state, client):
-    """Notify the gerente of any pending questions."""
-    pending_questions = []
-    for client_phone, state in conversation_state.items():
-        if not state.get('is_gerente', False) and state.get('pending_question'):
-            pending_questions.append({
-                'client_phone': client_phone,
-                'question': state['pending_question']['question']
-            })
-
-    if pending_questions:
-        for question in pending_questions:
-            messages = [msg.format(client_phone=question['client_phone'], question=question['question']) for msg in bot_config.GERENTE_REMINDER_MESSAGE]
-            utils.send_consecutive_messages(phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
-            logger.info(f"Notified gerente {phone} of pending question from {question['client_phone']}")
+    """Notify the gerente of pending questions they have not been told about yet."""
+    notified = conversation_state[phone].setdefault('notified_pending', {})
+    changed = False
+    for client_phone in list(notified.keys()):
+        if not conversation_state.get(client_phone, {}).get('pending_question'):
+            del notified[client_phone]  # Answered since the last notification
+            changed = True
+
+    for client_phone in pending_questions.pending_phones():
+        state = conversation_state.get(client_phone, {})
+        if not state.get('pending_question') or notified.get(client_phone) == state.get('pending_response_time'):
+            continue
+        messages = [msg.format(client_phone=client_phone, question=state['pending_question']['question']) for msg in bot_config.GERENTE_REMINDER_MESSAGE]
+        utils.send_consecutive_messages(phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
+        notified[client_phone] = state.get('pending_response_time')
+        changed = True
+        logger.info(f"Notified gerente {phone} of pending question from {client_phone}")
+
+    # Persist the tracking so another instance (or a restart) does not notify again
+    if changed:
+        utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+
+def send_pending_questions(phone, conversation_state, client):
+    """Send the gerente the full list of pending questions in answering order."""
+    lines = []
+    for position, client_phone in enumerate(pending_questions.pending_phones(), start=1):
+        state = conversation_state.get(client_phone, {})
+        if state.get('pending_question'):
+            marker = " (prioritario)" if state.get('priority', False) else ""
+            lines.append(f"{position}. {client_phone}{marker}: {state['pending_question']['question']}")
+    if lines:
+        messages = ["Preguntas pendientes (tu próxima respuesta se enviará a la primera):"] + lines
+    else:
+        messages = ["No hay preguntas pendientes."]
+    utils.send_consecutive_messages(phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
+
+def next_pending_question(conversation_state):
+    """Return the pending question at the head of the queue, or None."""
+    client_phone = pending_questions.peek()
+    while client_phone:
+        pending_question = conversation_state.get(client_phone, {}).get('pending_question')
+        if pending_question:
+            pending_question['client_phone'] = client_phone
+            return pending_question
+        pending_questions.remove(client_phone)
+        client_phone = pending_questions.peek()
+    return None
+
+def deliver_faq_answered_questions(conversation_state, client, rephrase_gerente_response):
+    """Answer every pending question the FAQ now covers and return the phones answered.
+
+    Runs on the instance handling the gerente's webhook: pending jobs only run on the
+    scheduler leader, so expediting them in this instance's heap would not reach it.
+    """
+    answered = []
+    for client_phone in pending_questions.pending_phones():
+        state = conversation_state.get(client_phone)
+        pending_question = (state.get('pending_question') if state else None) or {}
+        question = pending_question.get('question')
+        answer = utils.get_faq_answer(question, pending_question.get('mentioned_project')) if question else None
+        if not answer:
+            continue
+        client_name = state.get('client_name', 'Cliente') or 'Cliente'
+        messages = [rephrase_gerente_response(answer, client_name, question)]
+        utils.send_consecutive_messages(client_phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
+        state['history'].append(f"Giselle: {messages[0]}")
+        state['pending_question'] = None
+        state['pending_response_time'] = None
+        scheduler.cancel_job(f"pending:{client_phone}")
+        pending_questions.remove(client_phone)
+        # The leader reloads the saved state before running jobs, so it will not answer again
+        utils.save_conversation(client_phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+        logger.info(f"Answered pending question from {client_phone} with the new FAQ entry")
+        answered.append(client_phone)
+    return answered
+
+# Words of the gerente commands that never refer to a client's name
+COMMAND_WORDS = {
+    'marca', 'marcar', 'prioritario', 'prioritaria', 'como', 'a', 'al', 'de', 'la', 'el', 'las', 'los',
+    'busca', 'buscar', 'llamar', 'llama', 'mañana', 'cliente', 'información', 'info', 'por', 'favor', 'am', 'pm'
+}
+NAME_WORD_PATTERN = re.compile(r'[A-Za-záéíóúÁÉÍÓÚñÑüÜ]+')
+
+def find_client_phone(conversation_state, incoming_msg):
+    """Find the client a gerente command refers to, by phone number or by name."""
+    for number in phone_numbers.extract_phone_numbers(incoming_msg):
+        client_phone = conversation_state.find_by_phone(number)
+        if client_phone:
+            return client_phone
+
+    candidates = [word for word in NAME_WORD_PATTERN.findall(incoming_msg) if word.lower() not in COMMAND_WORDS]
+    for cutoff in (1.0, 0.8):
+        for word in candidates:
+            matches = [phone for phone in conversation_state.find_by_name(word, cutoff=cutoff) if phone not in conversation_state.gerentes()]
+            if len(matches) == 1:
+                return matches[0]
+            if len(matches) > 1:
+                logger.warning(f"Name '{word}' matches several clients: {matches}")
+                return None
+    return None
 
 def handle_gerente_message(phone, incoming_msg, conversation_state, client, rephrase_gerente_response, generate_detailed_report, update_leads_excel, utils):
     logger.info(f"Handling message from gerente ({phone})")
 
     incoming_msg_lower = incoming_msg.lower()
 
-    # Notify gerente of pending questions on every interaction
+    # Notify gerente of new pending questions
     notify_gerente_of_pending_questions(phone, conversation_state, client)
 
     if conversation_state[phone].get('awaiting_menu_choice', False):
-        if incoming_msg in ["1", "2", "3", "4", "5", "6", "7", "8"]:
+        if incoming_msg in ["1", "2", "3", "4", "5", "6", "7", "8", "9"]:
             menu_commands = {
                 "1": "reporte",
                 "2": "nombres",
@@ -58,14 +149,15 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
                 "5": "resumen semanal",
                 "6": "llamar a mañana",
                 "7": "busca a",
-                "8": "añade faq"
+                "8": "añade faq",
+                "9": "pendientes"
             }
             incoming_msg_lower = menu_commands[incoming_msg]
             conversation_state[phone]['awaiting_menu_choice'] = False
         else:
             utils.send_consecutive_messages(
                 phone,
-                ["Por favor, selecciona una opción válida del menú (1-8)."],
+                ["Por favor, selecciona una opción válida del menú (1-9)."],
                 client,
                 bot_config.WHATSAPP_SENDER_NUMBER
             )
@@ -76,15 +168,15 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
         show_gerente_menu(phone, client, conversation_state)
         return "Menú enviado", 200
 
-    pending_question = None
-    for client_phone, state in conversation_state.items():
-        if not state.get('is_gerente', False) and state.get('pending_question'):
-            pending_question = state['pending_question']
-            pending_question['client_phone'] = client_phone
-            break
+    if "pendientes" in incoming_msg_lower:
+        send_pending_questions(phone, conversation_state, client)
+        show_gerente_menu(phone, client, conversation_state)
+        return "Preguntas pendientes enviadas", 200
+
+    pending_question = next_pending_question(conversation_state)
 
     if pending_question:
-        logger.debug(f"Found pending question for client {pending_question['client_phone']}: {pending_question}")
+        logger.debug("Found pending question for client %s: %s", pending_question['client_phone'], log_pipeline.summarize(pending_question))
         client_phone = pending_question['client_phone']
         question = pending_question['question']
         mentioned_project = pending_question.get('mentioned_project')
@@ -109,41 +201,26 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
         conversation_state[client_phone]['history'].append(f"Giselle: {gerente_messages[0]}")
         conversation_state[client_phone]['pending_question'] = None
         conversation_state[client_phone]['pending_response_time'] = None
-        logger.debug(f"Updated client {client_phone} history: {conversation_state[client_phone]['history']}")
-
-        faq_entry = f"Pregunta: {question}\nRespuesta: {answer}\n"
-        project_folder = mentioned_project.upper() if mentioned_project else "GENERAL"
-        faq_file_name = f"{mentioned_project.lower()}_faq.txt" if mentioned_project else "general_faq.txt"
-        faq_file_path = os.path.join(bot_config.GCS_BASE_PATH, project_folder, faq_file_name)
-        logger.debug(f"Attempting to save FAQ entry to {faq_file_path}: {faq_entry}")
+        scheduler.cancel_job(f"pending:{client_phone}")
+        pending_questions.remove(client_phone)
+        logger.debug("Updated client %s history: %s", client_phone, log_pipeline.summarize(conversation_state[client_phone]['history']))
 
         try:
-            temp_faq_path = f"/tmp/{faq_file_name}"
-            try:
-                storage_client = storage.Client()
-                bucket = storage_client.bucket(bot_config.GCS_BUCKET_NAME)
-                blob = bucket.blob(faq_file_path)
-                blob.download_to_filename(temp_faq_path)
-                logger.debug(f"Downloaded existing FAQ file from GCS: {faq_file_path}")
-            except Exception as e:
-                logger.warning(f"No existing FAQ file found at {faq_file_path}, creating new file: {str(e)}")
-                with open(temp_faq_path, 'w') as f:
-                    pass
-
-            with open(temp_faq_path, 'a', encoding='utf-8') as f:
-                f.write(faq_entry)
-            logger.debug(f"Appended FAQ entry to local file: {temp_faq_path}")
-
-            blob.upload_from_filename(temp_faq_path)
-            logger.info(f"Uploaded updated FAQ file to GCS: {faq_file_path}")
-
-            os.remove(temp_faq_path)
+            faq_store.add_entry(mentioned_project, question, answer)
         except Exception as e:
-            logger.error(f"Failed to save FAQ entry to {faq_file_path}: {str(e)}")
+            logger.error(f"Failed to save FAQ entry for {mentioned_project or 'general'}: {str(e)}")
 
         utils.save_conversation(client_phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
 
         utils.send_consecutive_messages(phone, ["Respuesta enviada al cliente. ¿Necesitas algo más?"], client, bot_config.WHATSAPP_SENDER_NUMBER)
+        next_question = next_pending_question(conversation_state)
+        if next_question:
+            utils.send_consecutive_messages(
+                phone,
+                [f"Siguiente pregunta pendiente ({next_question['client_phone']}): {next_question['question']}"],
+                client,
+                bot_config.WHATSAPP_SENDER_NUMBER
+            )
         show_gerente_menu(phone, client, conversation_state)
         return "Mensaje enviado", 200
 
@@ -162,7 +239,7 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
 
         report_messages = generate_detailed_report(conversation_state, stage_filter, interest_filter)
         utils.send_consecutive_messages(phone, report_messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
-        logger.debug(f"Sent report to gerente: {report_messages}")
+        logger.debug("Sent report to gerente: %s", log_pipeline.summarize(report_messages))
         
         update_leads_excel(conversation_state)
         
@@ -173,10 +250,9 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
     if "nombres" in incoming_msg_lower or "clientes" in incoming_msg_lower:
         logger.info(f"Gerente ({phone}) requested names of interested clients")
         interested_clients = []
-        for client_phone, state in conversation_state.items():
-            if not state.get('is_gerente', False) and not state.get('no_interest', False):
-                client_name = state.get('client_name', 'Desconocido')
-                interested_clients.append(client_name)
+        for client_phone in conversation_state.interested_clients():
+            client_name = conversation_state[client_phone].get('client_name', 'Desconocido')
+            interested_clients.append(client_name)
 
         if interested_clients:
             messages = [
@@ -192,13 +268,10 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
 
     if "marca" in incoming_msg_lower and "prioritario" in incoming_msg_lower:
         logger.info(f"Gerente ({phone}) requested to mark a client as priority")
-        client_phone = None
-        for number in conversation_state.keys():
-            if number in incoming_msg:
-                client_phone = number
-                break
+        client_phone = find_client_phone(conversation_state, incoming_msg)
         if client_phone and not conversation_state[client_phone].get('is_gerente', False):
             conversation_state[client_phone]['priority'] = True
+            pending_questions.set_priority(client_phone, True)
             utils.save_conversation(client_phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
             utils.send_consecutive_messages(phone, [f"Cliente {client_phone} marcado como prioritario.", "¿Necesitas algo más?"], client, bot_config.WHATSAPP_SENDER_NUMBER)
             show_gerente_menu(phone, client, conversation_state)
@@ -218,7 +291,7 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
 
     if "resumen semanal" in incoming_msg_lower:
         logger.info(f"Gerente ({phone}) requested weekly summary")
-        report_messages = generate_detailed_report(conversation_state)
+        report_messages = utils.generate_weekly_summary(conversation_state)
         utils.send_consecutive_messages(phone, report_messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
         utils.send_consecutive_messages(phone, ["¿Necesitas algo más?"], client, bot_config.WHATSAPP_SENDER_NUMBER)
         show_gerente_menu(phone, client, conversation_state)
@@ -226,11 +299,7 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
 
     if "llamar a" in incoming_msg_lower and "mañana" in incoming_msg_lower:
         logger.info(f"Gerente ({phone}) requested to assign a task")
-        client_phone = None
-        for number in conversation_state.keys():
-            if number in incoming_msg:
-                client_phone = number
-                break
+        client_phone = find_client_phone(conversation_state, incoming_msg)
         if client_phone and not conversation_state[client_phone].get('is_gerente', False):
             time_str = "10:00 AM"
             time_match = re.search(r'a las (\d{1,2}(?::\d{2})?\s*(?:AM|PM))', incoming_msg_lower, re.IGNORECASE)
@@ -256,11 +325,7 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
 
     if "busca a" in incoming_msg_lower:
         logger.info(f"Gerente ({phone}) requested to search client information")
-        client_phone = None
-        for number in conversation_state.keys():
-            if number in incoming_msg:
-                client_phone = number
-                break
+        client_phone = find_client_phone(conversation_state, incoming_msg)
         if client_phone and not conversation_state[client_phone].get('is_gerente', False):
             state = conversation_state[client_phone]
             client_name = state.get('client_name', 'Desconocido')
@@ -268,7 +333,7 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
             budget = state.get('client_budget', 'No especificado')
             stage = state.get('stage', 'Prospección')
             interest_level = state.get('interest_level', 0)
-            last_contact = state.get('last_contact', 'N/A')
+            last_contact = timestamps.format_timestamp(state.get('last_contact'))
             last_messages = state.get('history', [])[-3:] if state.get('history') else ['Sin mensajes']
             zoom_scheduled = state.get('zoom_scheduled', False)
             zoom_details = state.get('zoom_details', {})
@@ -303,45 +368,17 @@ def handle_gerente_message(phone, incoming_msg, conversation_state, client, reph
             question = match.group(2)
             answer = match.group(3)
 
-            faq_entry = f"Pregunta: {question}\nRespuesta: {answer}\n"
-            project_folder = project.upper()
-            faq_file_name = f"{project.lower()}_faq.txt"
-            faq_file_path = os.path.join(bot_config.GCS_BASE_PATH, project_folder, faq_file_name)
-            logger.debug(f"Attempting to save FAQ entry to {faq_file_path}: {faq_entry}")
-
             try:
-                temp_faq_path = f"/tmp/{faq_file_name}"
-                try:
-                    storage_client = storage.Client()
-                    bucket = storage_client.bucket(bot_config.GCS_BUCKET_NAME)
-                    blob = bucket.blob(faq_file_path)
-                    blob.download_to_filename(temp_faq_path)
-                    logger.debug(f"Downloaded existing FAQ file from GCS: {faq_file_path}")
-                except Exception as e:
-                    logger.warning(f"No existing FAQ file found at {faq_file_path}, creating new file: {str(e)}")
-                    with open(temp_faq_path, 'w') as f:
-                        pass
-
-                with open(temp_faq_path, 'a', encoding='utf-8') as f:
-                    f.write(faq_entry)
-                logger.debug(f"Appended FAQ entry to local file: {temp_faq_path}")
-
-                blob.upload_from_filename(temp_faq_path)
-                logger.info(f"Uploaded updated FAQ file to GCS: {faq_file_path}")
-
-                os.remove(temp_faq_path)
-
-                project_key = project.lower()
-                if project_key not in utils.faq_data:
-                    utils.faq_data[project_key] = {}
-                utils.faq_data[project_key][question.lower()] = answer
-                logger.debug(f"Updated faq_data[{project_key}]")
+                faq_store.add_entry(project, question, answer)
+
             except Exception as e:
-                logger.error(f"Failed to save FAQ entry to {faq_file_path}: {str(e)}")
+                logger.error(f"Failed to save FAQ entry for {project}: {str(e)}")
                 utils.send_consecutive_messages(phone, ["Ocurrió un error al guardar la FAQ.", "¿En qué más puedo asistirte?"], client, bot_config.WHATSAPP_SENDER_NUMBER)
                 show_gerente_menu(phone, client, conversation_state)
                 return "Error al guardar FAQ", 500
 
+            # Pending questions may be answered by the new entry; answer them now
+            deliver_faq_answered_questions(conversation_state, client, rephrase_gerente_response)
             utils.send_consecutive_messages(phone, [f"FAQ añadida para {project}: {question}.", "¿Necesitas algo más?"], client, bot_config.WHATSAPP_SENDER_NUMBER)
             show_gerente_menu(phone, client, conversation_state)
             return "FAQ añadida", 200
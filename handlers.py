@@ -1,15 +1,20 @@
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
 import logging
 import time
-from datetime import datetime, timedelta
-import pytz
 import bot_config
 import utils
+import scheduler
+import pending_questions
+import name_extractor
+import llm_gateway
+import tracing
+import log_pipeline
+import lead_events
+import timestamps
+import activity
 
 logger = logging.getLogger(__name__)
 
-CST_TIMEZONE = pytz.timezone("America/Mexico_City")
-
 def rephrase_gerente_response(answer: str, client_name: str, question: str, message_handler: Any) -> str:
     """Rephrase a gerente's response for a friendlier tone.
 
@@ -32,8 +37,8 @@ def rephrase_gerente_response(answer: str, client_name: str, question: str, mess
     )
 
     try:
-        response = message_handler.openai_client.chat.completions.create(
-            model=bot_config.CHATGPT_MODEL,
+        response = llm_gateway.chat_completion(
+            'rephrase',
             messages=[
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": answer}
@@ -59,32 +64,194 @@ def determine_best_contact_time(state: Dict[str, Any]) -> Tuple[Optional[str], O
     if state.get('preferred_time'):
         return state['preferred_time'], state.get('preferred_days')
 
-    response_times = []
-    for msg in state.get('history', []):
-        if msg.startswith("Cliente:"):
-            timestamp = state.get('last_response_time', datetime.now(CST_TIMEZONE).isoformat())
-            try:
-                dt = datetime.fromisoformat(timestamp).astimezone(CST_TIMEZONE)
-                response_times.append(dt)
-            except ValueError:
-                continue
-
-    if not response_times:
+    # Only the time of the last response is stored, so it is the best estimate once the client has written
+    if not any(msg.startswith("Cliente:") for msg in state.get('history', [])):
         return "10:00 AM", None
-
-    hours = [dt.hour for dt in response_times]
-    if not hours:
+    try:
+        last_response = timestamps.to_epoch(state.get('last_response_time'))
+    except ValueError:
         return "10:00 AM", None
+    dt = timestamps.to_datetime(last_response if last_response is not None else time.time())
 
-    most_common_hour = max(set(hours), key=hours.count)
-    period = "AM" if most_common_hour < 12 else "PM"
-    adjusted_hour = most_common_hour if most_common_hour <= 12 else most_common_hour - 12
-    best_time = f"{adjusted_hour}:00 {period}"
+    period = "AM" if dt.hour < 12 else "PM"
+    adjusted_hour = dt.hour if dt.hour <= 12 else dt.hour - 12
+    return f"{adjusted_hour}:00 {period}", dt.strftime('%A')
+
+def deliver_pending_response(
+    phone: str,
+    state: Dict[str, Any],
+    client: Any,
+    message_handler: Any,
+    utils: Any,
+    final: bool = True
+) -> List[str]:
+    """Send the answer to the client's pending question.
 
-    days = [dt.strftime('%A') for dt in response_times]
-    most_common_day = max(set(days), key=days.count) if days else None
+    Args:
+        phone (str): The client's phone number.
+        state (dict): The client state dictionary.
+        client (Any): The Twilio client instance.
+        message_handler (Any): The message handler instance.
+        utils (Any): The utility functions instance.
+        final (bool): Whether to apologize and drop the question if no answer
+            is available yet, instead of leaving it pending.
 
-    return best_time, most_common_day
+    Returns:
+        list: The messages sent to the client, empty if still pending.
+    """
+    pending_question = state.get('pending_question') or {}
+    question = pending_question.get('question')
+    mentioned_project = pending_question.get('mentioned_project')
+    if not question:
+        logger.error(f"No pending question found for {phone} despite pending_response_time.")
+        state['pending_response_time'] = None
+        pending_questions.remove(phone)
+        return []
+
+    logger.debug(f"Fetching FAQ answer for question '{question}' about project '{mentioned_project}'")
+    answer = utils.get_faq_answer(question, mentioned_project)
+    if answer:
+        client_name = state.get('client_name', 'Cliente') or 'Cliente'
+        messages = [rephrase_gerente_response(answer, client_name, question, message_handler)]
+        logger.debug("Sent gerente response to client %s: %s", phone, log_pipeline.summarize(messages))
+    elif not final:
+        logger.debug(f"No answer yet for pending question '{question}' from {phone}")
+        return []
+    else:
+        logger.error(f"Could not find answer for question '{question}' in FAQ.")
+        messages = ["Lo siento, no pude encontrar una respuesta. ¿En qué más puedo ayudarte?"]
+    utils.send_consecutive_messages(phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
+    state['history'].append(f"Giselle: {messages[0]}")
+    state['pending_question'] = None
+    state['pending_response_time'] = None
+    pending_questions.remove(phone)
+    return messages
+
+def run_pending_response_job(
+    phone: str,
+    conversation_state: Dict[str, Any],
+    client: Any,
+    message_handler: Any,
+    utils: Any
+) -> None:
+    """Scheduler job: deliver a pending answer as soon as it is available.
+
+    Args:
+        phone (str): The client's phone number.
+        conversation_state (dict): The current conversation state.
+        client (Any): The Twilio client instance.
+        message_handler (Any): The message handler instance.
+        utils (Any): The utility functions instance.
+    """
+    state = conversation_state.get(phone)
+    if not state or not state.get('pending_response_time'):
+        return
+    elapsed_time = time.time() - state['pending_response_time']
+    if elapsed_time < bot_config.FAQ_RESPONSE_DELAY:
+        schedule_pending_response(phone, conversation_state, client, message_handler, utils)
+        return
+
+    final = elapsed_time >= bot_config.PENDING_RESPONSE_TIMEOUT
+    if deliver_pending_response(phone, state, client, message_handler, utils, final=final) or final:
+        utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+        return
+
+    # No answer yet: check again, but never past the timeout
+    retry_time = min(time.time() + bot_config.FAQ_RESPONSE_DELAY, state['pending_response_time'] + bot_config.PENDING_RESPONSE_TIMEOUT)
+    scheduler.schedule_job(f"pending:{phone}", retry_time, run_pending_response_job, phone, conversation_state, client, message_handler, utils)
+
+def deliver_overdue_pending_response(
+    phone: str,
+    state: Dict[str, Any],
+    client: Any,
+    message_handler: Any,
+    utils: Any
+) -> List[str]:
+    """Deliver the client's pending answer if its timer is overdue, in case the scheduler missed it.
+
+    Args:
+        phone (str): The client's phone number.
+        state (dict): The client's conversation state.
+        client (Any): The Twilio client instance.
+        message_handler (Any): The message handler instance.
+        utils (Any): The utility functions instance.
+
+    Returns:
+        List[str]: The messages sent, empty if nothing was delivered.
+    """
+    pending_since = state.get('pending_response_time')
+    if not pending_since:
+        return []
+    elapsed_time = time.time() - pending_since
+    if elapsed_time < bot_config.FAQ_RESPONSE_DELAY:
+        return []
+    final = elapsed_time >= bot_config.PENDING_RESPONSE_TIMEOUT
+    messages = deliver_pending_response(phone, state, client, message_handler, utils, final=final)
+    if messages or final:
+        scheduler.cancel_job(f"pending:{phone}")
+    return messages
+
+def schedule_pending_response(
+    phone: str,
+    conversation_state: Dict[str, Any],
+    client: Any,
+    message_handler: Any,
+    utils: Any
+) -> None:
+    """Schedule delivery of the client's pending question.
+
+    Args:
+        phone (str): The client's phone number.
+        conversation_state (dict): The current conversation state.
+        client (Any): The Twilio client instance.
+        message_handler (Any): The message handler instance.
+        utils (Any): The utility functions instance.
+    """
+    state = conversation_state.get(phone) or {}
+    if not state.get('pending_response_time'):
+        return
+    due_time = state['pending_response_time'] + bot_config.FAQ_RESPONSE_DELAY
+    scheduler.schedule_job(f"pending:{phone}", due_time, run_pending_response_job, phone, conversation_state, client, message_handler, utils)
+
+def schedule_pending_responses(
+    conversation_state: Dict[str, Any],
+    client: Any,
+    message_handler: Any,
+    utils: Any
+) -> None:
+    """Seed the scheduler with every pending question in the loaded state.
+
+    Args:
+        conversation_state (dict): The current conversation state.
+        client (Any): The Twilio client instance.
+        message_handler (Any): The message handler instance.
+        utils (Any): The utility functions instance.
+    """
+    for phone, state in list(conversation_state.items()):
+        if not state.get('is_gerente', False) and state.get('pending_response_time'):
+            schedule_pending_response(phone, conversation_state, client, message_handler, utils)
+
+def build_project_info(projects_data: Dict[str, Dict[str, Any]]) -> str:
+    """Format every project as the catalog section of the reply prompt.
+
+    Args:
+        projects_data (Dict[str, Dict[str, Any]]): Project data keyed by project name.
+
+    Returns:
+        str: One block of lines per project.
+    """
+    project_info = ""
+    for project, data in projects_data.items():
+        project_info += f"Proyecto: {project}\n"
+        project_info += f"Descripción: {data.get('description', 'No disponible')}\n"
+        project_info += f"Tipo: {data.get('type', 'No especificado')}\n"
+        project_info += f"Ubicación: {data.get('location', 'No especificada')}\n"
+        if 'prices' in data:
+            project_info += "Precios: " + ", ".join([f"{k} ${v:,} MXN" for k, v in data['prices'].items()]) + "\n"
+        if 'amenities' in data:
+            project_info += f"Amenidades: {', '.join(data['amenities'])}\n"
+        project_info += "\n"
+    return project_info
 
 def handle_client_message(
     phone: str,
@@ -119,6 +286,7 @@ def handle_client_message(
     """
     try:
         # Step 1: Load conversation history
+        tracing.step('load_history')
         logger.debug(f"Loading conversation history for {phone}")
         history = utils.load_conversation_history(phone, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
         if not isinstance(history, list):
@@ -126,37 +294,41 @@ def handle_client_message(
             history = []
 
         # Step 2: Update conversation state
+        tracing.step('update_state')
         logger.debug(f"Updating conversation state for {phone}")
         state = conversation_state.get(phone, {})
         if not state:
             raise KeyError(f"No state found for phone {phone}")
         state['history'] = history
-        state['last_contact'] = datetime.now(CST_TIMEZONE).isoformat()
-        state['last_response_time'] = datetime.now(CST_TIMEZONE).isoformat()
+        state['last_contact'] = time.time()
+        state['last_response_time'] = time.time()
 
         # Step 3: Set client name from ProfileName if available (fallback)
+        tracing.step('profile_name')
         if profile_name and not state.get('client_name'):
-            name_parts = profile_name.strip().split()
-            if name_parts:
-                state['client_name'] = name_parts[0].capitalize()
+            profile_first_name = name_extractor.name_from_profile(profile_name)
+            if profile_first_name:
+                state['client_name'] = profile_first_name
                 logger.info(f"Client name set from ProfileName: {state['client_name']}")
             else:
                 state['client_name'] = "Cliente"
 
         # Step 4: Update client stage and interest level
+        tracing.step('update_stage')
         if any(phrase in incoming_msg.lower() for phrase in ["quiero comprar", "estoy listo", "confirmo"]):
-            state['stage'] = 'Cierre'
+            lead_events.set_stage(phone, state, 'Cierre')
             state['interest_level'] = max(state.get('interest_level', 0), 8)
         elif any(phrase in incoming_msg.lower() for phrase in ["me interesa", "quiero saber más", "detalles"]):
-            state['stage'] = 'Negociación'
+            lead_events.set_stage(phone, state, 'Negociación')
             state['interest_level'] = max(state.get('interest_level', 0), 5)
         elif any(phrase in incoming_msg.lower() for phrase in ["presupuesto", "necesidades", "qué tienes"]):
-            state['stage'] = 'Calificación'
+            lead_events.set_stage(phone, state, 'Calificación')
             state['interest_level'] = max(state.get('interest_level', 0), 3)
 
         # Step 5: Notify gerente if client shows high interest
+        tracing.step('notify_gerente')
         if state.get('interest_level', 0) >= 8 or state.get('stage') == 'Cierre':
-            for gerente_phone in [p for p, s in conversation_state.items() if s.get('is_gerente', False)]:
+            for gerente_phone in conversation_state.gerentes():
                 utils.send_consecutive_messages(
                     gerente_phone,
                     [f"Alerta: Cliente {phone} ({state.get('client_name', 'Desconocido')}) muestra alto interés (Nivel: {state.get('interest_level', 0)}). Etapa: {state.get('stage')}. Último mensaje: {incoming_msg}"],
@@ -165,7 +337,7 @@ def handle_client_message(
                 )
 
         if state.get('priority', False):
-            for gerente_phone in [p for p, s in conversation_state.items() if s.get('is_gerente', False)]:
+            for gerente_phone in conversation_state.gerentes():
                 utils.send_consecutive_messages(
                     gerente_phone,
                     [f"Cliente prioritario {phone} ha enviado un mensaje: {incoming_msg}"],
@@ -173,66 +345,34 @@ def handle_client_message(
                     bot_config.WHATSAPP_SENDER_NUMBER
                 )
 
-        # Step 6: Handle pending responses from gerente
-        logger.debug(f"Checking for pending responses for {phone}")
-        if state.get('pending_response_time'):
-            current_time = time.time()
-            elapsed_time = current_time - state['pending_response_time']
-            if elapsed_time >= bot_config.FAQ_RESPONSE_DELAY:
-                question = state.get('pending_question', {}).get('question')
-                mentioned_project = state.get('pending_question', {}).get('mentioned_project')
-                if question:
-                    logger.debug(f"Fetching FAQ answer for question '{question}' about project '{mentioned_project}'")
-                    answer = utils.get_faq_answer(question, mentioned_project)
-                    if answer:
-                        client_name = state.get('client_name', 'Cliente') or 'Cliente'
-                        rephrased_answer = rephrase_gerente_response(answer, client_name, question, message_handler)
-                        messages = [rephrased_answer]
-                        utils.send_consecutive_messages(phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
-                        state['history'].append(f"Giselle: {messages[0]}")
-                        state['pending_question'] = None
-                        state['pending_response_time'] = None
-                        logger.debug(f"Sent gerente response to client {phone}: {messages}")
-                    else:
-                        logger.error(f"Could not find answer for question '{question}' in FAQ.")
-                        messages = ["Lo siento, no pude encontrar una respuesta. ¿En qué más puedo ayudarte?"]
-                        utils.send_consecutive_messages(phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
-                        state['history'].append(f"Giselle: {messages[0]}")
-                        state['pending_question'] = None
-                        state['pending_response_time'] = None
-                else:
-                    logger.error(f"No pending question found for {phone} despite pending_response_time.")
-                    state['pending_response_time'] = None
-            else:
-                logger.debug(f"Waiting for FAQ response delay to complete for {phone}. Elapsed time: {elapsed_time} seconds")
-                utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
-                return "Waiting for gerente response", 200
+        # Step 6: Deliver an overdue pending answer the scheduler has not sent yet
+        tracing.step('pending_response')
+        deliver_overdue_pending_response(phone, state, client, message_handler, utils)
 
         # Step 7: Prepare project information
+        tracing.step('project_info')
         logger.debug("Preparing project information")
-        project_info = ""
         try:
             if not hasattr(utils, 'projects_data'):
                 logger.error("utils.projects_data is not defined")
                 raise AttributeError("utils.projects_data is not defined")
-            for project, data in utils.projects_data.items():
-                project_info += f"Proyecto: {project}\n"
-                project_info += f"Descripción: {data.get('description', 'No disponible')}\n"
-                project_info += f"Tipo: {data.get('type', 'No especificado')}\n"
-                project_info += f"Ubicación: {data.get('location', 'No especificada')}\n"
-                if 'prices' in data:
-                    project_info += "Precios: " + ", ".join([f"{k} ${v:,} MXN" for k, v in data['prices'].items()]) + "\n"
-                if 'amenities' in data:
-                    project_info += f"Amenidades: {', '.join(data['amenities'])}\n"
-                project_info += "\n"
+            project_info = build_project_info(utils.projects_data)
         except Exception as project_info_e:
             logger.error(f"Error preparing project information: {str(project_info_e)}", exc_info=True)
             project_info = "Información de proyectos no disponible."
 
         # Step 8: Process the message
+        tracing.step('process_message')
         logger.debug("Building conversation history")
         conversation_history = "\n".join(state['history'])
 
+        # Messages sent while the reply is still being generated
+        sent_messages = []
+
+        def send_early(message: str) -> None:
+            utils.send_consecutive_messages(phone, [message], client, bot_config.WHATSAPP_SENDER_NUMBER)
+            sent_messages.append(message)
+
         logger.debug(f"Checking FAQ for an existing answer")
         mentioned_project = state.get('last_mentioned_project')
         faq_answer = utils.get_faq_answer(incoming_msg, mentioned_project)
@@ -243,21 +383,26 @@ def handle_client_message(
         else:
             logger.debug(f"Processing message with message_handler: {incoming_msg}")
             messages, mentioned_project, needs_gerente = message_handler.process_message(
-                incoming_msg, phone, conversation_state, project_info, conversation_history
+                incoming_msg, phone, conversation_state, project_info, conversation_history,
+                on_message=send_early
             )
-            logger.debug(f"Messages generated: {messages}")
+            logger.debug("Messages generated: %s", log_pipeline.summarize(messages))
             logger.debug(f"Mentioned project after processing: {mentioned_project}")
             logger.debug(f"Needs gerente contact: {needs_gerente}")
 
             if needs_gerente:
+                activity.record('escalations')
                 state['pending_question'] = {
                     'question': incoming_msg,
                     'mentioned_project': mentioned_project,
                     'client_phone': phone
                 }
                 state['pending_response_time'] = time.time()
-                logger.debug(f"Set pending question for {phone}: {state['pending_question']}")
-                for gerente_phone in [p for p, s in conversation_state.items() if s.get('is_gerente', False)]:
+                logger.debug("Set pending question for %s: %s", phone, log_pipeline.summarize(state['pending_question']))
+                schedule_pending_response(phone, conversation_state, client, message_handler, utils)
+                pending_questions.add(phone, state.get('priority', False))
+                for gerente_phone in conversation_state.gerentes():
+                    conversation_state[gerente_phone].setdefault('notified_pending', {})[phone] = state['pending_response_time']
                     utils.send_consecutive_messages(
                         gerente_phone,
                         [
@@ -275,31 +420,29 @@ def handle_client_message(
             state['last_mentioned_project'] = mentioned_project
             logger.debug(f"Updated last_mentioned_project to: {mentioned_project}")
 
-        # Step 9: Send a 24-hour window reminder
-        last_incoming = datetime.fromisoformat(state['last_incoming_time']).astimezone(CST_TIMEZONE)
-        time_since_last_incoming = (datetime.now(CST_TIMEZONE) - last_incoming).total_seconds() / 3600
-        if 20 <= time_since_last_incoming < 24 and not state.get('reminder_sent', False):
-            reminder = [
-                f"Hola {state.get('client_name', 'Cliente')}, ha pasado un tiempo desde nuestro último mensaje.",
-                "¿Tienes alguna pregunta o quieres más detalles?"
-            ]
-            utils.send_consecutive_messages(phone, reminder, client, bot_config.WHATSAPP_SENDER_NUMBER)
-            state['history'].extend([f"Giselle: {msg}" for msg in reminder])
-            state['reminder_sent'] = True
-
-        # Step 10: Send the generated messages
+        # Step 9: Send the generated messages
+        tracing.step('send_messages')
         utils.send_consecutive_messages(phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
 
-        for msg in messages:
+        for msg in sent_messages + messages:
             state['history'].append(f"Giselle: {msg}")
         state['history'] = state['history'][-10:]
 
-        # Step 11: Reset recontact schedule if the client responds
+        # Step 10: Reset recontact schedule if the client responds
+        tracing.step('reset_recontact')
         state['schedule_next'] = None
         state['recontact_attempts'] = 0
         state['reminder_sent'] = False
 
+        # The reply may have changed no_interest; keep today's interested count in step
+        activity.update_client(state)
+
+        # Step 11: Schedule the reminder and recontact jobs from this interaction
+        tracing.step('schedule_jobs')
+        recontact_handler.schedule_client_jobs(phone, conversation_state, client, utils)
+
         # Step 12: Save conversation state
+        tracing.step('save_conversation')
         utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
 
         logger.debug("Returning success response")
@@ -0,0 +1,181 @@
+import re
+import logging
+import unicodedata
+import bot_config
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Fast-path hit/miss counters
+stats = {'fast_path': 0, 'llm_fallback': 0}
+
+def normalize_text(text):
+    """Lowercase, strip accents and punctuation, and collapse whitespace."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(re.sub(r'[^\w$:.,]+', ' ', stripped).split())
+
+def _phrase_pattern(phrases):
+    alternatives = sorted({re.escape(normalize_text(phrase)) for phrase in phrases}, key=len, reverse=True)
+    return re.compile(r'\b(?:' + '|'.join(alternatives) + r')\b')
+
+def _repeated_phrases_pattern(phrases):
+    """Match a message made only of the given phrases, e.g. 'si, claro que si'."""
+    alternatives = '|'.join(sorted(phrases, key=len, reverse=True))
+    return re.compile(r'^(?:(?:' + alternatives + r')[.,]*\s?)+$')
+
+GREETING_PATTERN = re.compile(
+    r'^(?:hola|holi|buenas|buen dia|buenos dias|buenas tardes|buenas noches|que tal|hey|saludos)'
+    r'(?: giselle)?(?: (?:como estas|que tal))?[.,]*$'
+)
+CONFIRMATION_PATTERNS = [
+    (_repeated_phrases_pattern(['si', 'claro', 'claro que si', 'ok', 'okay', 'va', 'vale', 'perfecto', 'de acuerdo', 'por supuesto', 'sale', 'me parece bien', 'esta bien']), 'yes'),
+    (_repeated_phrases_pattern(['no', 'aun no', 'todavia no', 'por ahora no']), 'no'),
+    (_repeated_phrases_pattern(['gracias', 'muchas gracias', 'mil gracias', 'ok gracias', 'si gracias']), 'thanks'),
+]
+NO_INTEREST_PATTERN = _phrase_pattern(bot_config.NO_INTEREST_PHRASES)
+# A no-interest phrase is only trusted when it opens the message and nothing after it
+# points the other way ("no quiero esperar, me interesa", "no quiero 2 recámaras, quiero 3")
+POSITIVE_CUE_PATTERN = re.compile(r'\b(?:me interesa|me interesan|me gusta|me gustaria|quiero (?:ver|saber|comprar|invertir|informacion|info)|si quiero)\b|\d')
+# "luego" and "mañana" are too common ("desde luego", "mañana te paso mi correo") to signal a
+# contact preference unless they are the whole message
+BARE_RECONTACT_WORDS = {'luego', 'manana'}
+RECONTACT_PATTERN = _phrase_pattern([phrase for phrase in bot_config.RECONTACT_PHRASES if normalize_text(phrase) not in BARE_RECONTACT_WORDS])
+BARE_RECONTACT_PATTERN = re.compile(
+    r'^(?:(?:mejor|mas|ok|bueno|entonces|si)\s)*(?:luego|manana)'
+    r'(?:\s(?:mejor|entonces|te escribo|te contacto|te aviso|hablamos|platicamos))?[.,]*$'
+)
+TIME_PATTERN = re.compile(r'\b(?:a las|a la|tipo|como a las)?\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.|hrs|horas)?\b')
+PART_OF_DAY_PATTERN = re.compile(r'\bpor la (manana|tarde|noche)\b')
+DAY_PATTERN = re.compile(r'\b(manana|pasado manana|hoy|lunes|martes|miercoles|jueves|viernes|sabado|domingo|la proxima semana|el fin de semana)\b')
+BUDGET_PATTERN = re.compile(
+    r'(\$)?\s*(\d{1,3}(?:[.,]\d{3})+|\d+(?:[.,]\d+)?)\s*'
+    r'(millones|millon|mdp|mil|k|m)?\s*(mxn|pesos|usd|dolares)?\b'
+)
+BUDGET_CONTEXT_PATTERN = re.compile(r'\b(?:presupuesto|tengo|cuento con|hasta|alrededor de|maximo|entre|invertir|dispongo)\b')
+ZOOM_DAY_PATTERNS = [
+    (re.compile(r'\b' + normalize_text(slot['day']) + r'\b'), slot) for slot in bot_config.ZOOM_AVAILABLE_SLOTS
+]
+PART_OF_DAY_TIMES = {'manana': "10:00 AM", 'tarde': "4:00 PM", 'noche': "7:00 PM"}
+
+def _result(intention, data, confidence):
+    return {'intention': intention, 'data': data, 'confidence': confidence}
+
+def _parse_time(text):
+    """Return a time found in text as 'H:MM AM/PM', or None."""
+    for match in TIME_PATTERN.finditer(text):
+        hour = int(match.group(1))
+        minute = int(match.group(2) or 0)
+        suffix = (match.group(3) or '').replace('.', '')
+        if not match.group(2) and not suffix and 'a la' not in match.group(0):
+            continue  # A bare number is not a time
+        if hour > 23 or minute > 59:
+            continue
+        if suffix == 'pm' and hour < 12:
+            hour += 12
+        elif suffix == 'am' and hour == 12:
+            hour = 0
+        elif suffix not in ('am', 'pm') and 1 <= hour <= 7:
+            hour += 12  # "a las 5" means the afternoon in a sales conversation
+        period = "AM" if hour < 12 else "PM"
+        display_hour = hour % 12 or 12
+        return f"{display_hour}:{minute:02d} {period}"
+    part_of_day = PART_OF_DAY_PATTERN.search(text)
+    if part_of_day:
+        return PART_OF_DAY_TIMES[part_of_day.group(1)]
+    return None
+
+def _parse_budget(text):
+    """Return a normalized budget string such as '2,500,000 MXN', or None."""
+    for match in BUDGET_PATTERN.finditer(text):
+        currency_sign, number, unit, currency = match.groups()
+        if not (currency_sign or unit or currency or BUDGET_CONTEXT_PATTERN.search(text)):
+            continue
+        if re.fullmatch(r'\d{1,3}(?:[.,]\d{3})+', number):
+            amount = float(re.sub(r'[.,]', '', number))  # Thousands separators
+        else:
+            amount = float(number.replace(',', '.'))  # Decimal comma or point
+        if unit in ('millones', 'millon', 'mdp', 'm'):
+            amount *= 1_000_000
+        elif unit in ('mil', 'k'):
+            amount *= 1_000
+        if amount < 10_000:
+            continue  # Too small to be a property budget (likely a time, a unit or an area)
+        code = 'USD' if currency in ('usd', 'dolares') else 'MXN'
+        return f"{int(amount):,} {code}"
+    return None
+
+def _classify_zoom(text):
+    for pattern, slot in ZOOM_DAY_PATTERNS:
+        if pattern.search(text):
+            time = _parse_time(text)
+            if time and time in slot['times']:
+                return _result('zoom_response', {'day': slot['day'], 'time': time}, 0.95)
+            return _result('zoom_response', {'day': slot['day']}, 0.6)
+    return None
+
+def _mentions_project(text, project_names):
+    return any(re.search(r'\b' + re.escape(normalize_text(name)) + r'\b', text) for name in project_names if name)
+
+def _is_clear_no_interest(text, project_names):
+    """True when a no-interest phrase opens the message and the rest has no positive cue."""
+    match = NO_INTEREST_PATTERN.match(text)
+    if not match:
+        return False
+    return not POSITIVE_CUE_PATTERN.search(text[match.end():]) and not _mentions_project(text, project_names)
+
+def classify(incoming_msg, zoom_proposed=False, project_names=()):
+    """Classify a client message with deterministic rules.
+
+    Returns a dict shaped like the LLM result ({'intention', 'data'}) plus a
+    'confidence' score, or None when no rule applies.
+    """
+    text = normalize_text(incoming_msg or '')
+    if not text:
+        return None
+    word_count = len(text.split())
+    short = word_count <= 8
+    is_question = '?' in incoming_msg
+
+    if NO_INTEREST_PATTERN.search(text):
+        confident = short and not is_question and _is_clear_no_interest(text, project_names)
+        return _result('no_interest', {}, 0.95 if confident else 0.6)
+
+    if zoom_proposed:
+        zoom_result = _classify_zoom(text)
+        if zoom_result:
+            return zoom_result
+
+    if GREETING_PATTERN.match(text):
+        return _result('greeting', {}, 0.95)
+
+    for pattern, response in CONFIRMATION_PATTERNS:
+        if pattern.match(text):
+            return _result('offer_response', {'response': response}, 0.9)
+
+    budget = _parse_budget(text)
+    if budget:
+        return _result('budget', {'budget': budget}, 0.9 if short and not is_question else 0.6)
+
+    time = _parse_time(text)
+    day_match = DAY_PATTERN.search(text)
+    if time or RECONTACT_PATTERN.search(text) or BARE_RECONTACT_PATTERN.match(text):
+        data = {}
+        if time:
+            data['time'] = time
+        if day_match:
+            data['days'] = day_match.group(1)
+        confident = bool(data) and short and not is_question
+        return _result('contact_preference', data, 0.9 if confident else 0.6)
+
+    return None
+
+def fast_classify(incoming_msg, zoom_proposed=False, project_names=()):
+    """Return the rule-based result when it is confident enough to skip the LLM, else None."""
+    result = classify(incoming_msg, zoom_proposed=zoom_proposed, project_names=project_names)
+    if result and result['confidence'] >= bot_config.INTENT_FAST_PATH_MIN_CONFIDENCE:
+        stats['fast_path'] += 1
+        logger.debug(f"Fast-path intention for '{incoming_msg}': {result}")
+        return result
+    stats['llm_fallback'] += 1
+    return None
@@ -0,0 +1,77 @@
+import json
+import time
+import logging
+import bot_config
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Every intention and stage change is written here as one JSON object per line
+export_logger = logging.getLogger("giselle.analytics")
+
+# Intentions detect_intention can return for a client; anything else is counted as 'unknown'
+CLIENT_INTENTIONS = (
+    'question', 'external_question', 'greeting', 'budget', 'needs', 'purchase_intent', 'offer_response',
+    'contact_preference', 'no_interest', 'negotiation', 'confirm_sale', 'confirm_deposit', 'schedule_zoom',
+    'zoom_response', 'unknown',
+)
+_KNOWN_INTENTIONS = frozenset(CLIENT_INTENTIONS)
+
+# Intentions that show real interest in a project (see is_ready_for_zoom)
+MEANINGFUL_INTENTIONS = ('question', 'budget', 'needs', 'purchase_intent', 'negotiation')
+
+# A lead keeps intention_counts ({intention: total}) and intention_history, the most recent
+# INTENTION_HISTORY_SIZE intentions. Leads saved before the counters existed carry their
+# whole history instead; it is folded into counts the first time the lead is loaded.
+
+def _export(phone, event, **fields):
+    if bot_config.ANALYTICS_EXPORT_ENABLED:
+        record = {'ts': round(time.time(), 3), 'phone': phone, 'event': event}
+        record.update(fields)
+        export_logger.info(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+
+def intention_counts(state):
+    """Return the lead's {intention: total}, counting a legacy intention_history if needed."""
+    counts = state.get('intention_counts')
+    if counts is not None:
+        return counts
+    counts = {}
+    for intention in state.get('intention_history') or ():
+        counts[intention] = counts.get(intention, 0) + 1
+    return counts
+
+def meaningful_intentions(state):
+    """Number of intentions that showed real interest, read from the counters."""
+    counts = intention_counts(state)
+    return sum(counts.get(intention, 0) for intention in MEANINGFUL_INTENTIONS)
+
+def last_intention(state):
+    history = state.get('intention_history')
+    return history[-1] if history else None
+
+def fold_history(state):
+    """Turn a legacy unbounded intention_history into counters plus the recent window."""
+    history = state.get('intention_history')
+    if state.get('intention_counts') is None and history is not None:
+        state['intention_counts'] = intention_counts(state)
+        state['intention_history'] = history[-bot_config.INTENTION_HISTORY_SIZE:]
+
+def record_intention(phone, state, intention):
+    """Count a detected intention, keep it in the recent window and append it to the analytics log."""
+    if intention not in _KNOWN_INTENTIONS:
+        logger.debug(f"Counting unexpected intention '{intention}' from {phone} as unknown")
+        intention = 'unknown'
+    counts = intention_counts(state)
+    counts[intention] = counts.get(intention, 0) + 1
+    state['intention_counts'] = counts
+    history = state.get('intention_history') or []
+    history.append(intention)
+    state['intention_history'] = history[-bot_config.INTENTION_HISTORY_SIZE:]
+    _export(phone, 'intention', intention=intention)
+
+def set_stage(phone, state, stage):
+    """Move a lead to a sales stage, logging the transition when it changes."""
+    previous = state.get('stage')
+    state['stage'] = stage
+    if previous != stage:
+        _export(phone, 'stage', stage=stage, previous=previous)
@@ -0,0 +1,186 @@
+import os
+import time
+import random
+import logging
+import threading
+import openai
+from openai import OpenAI
+import bot_config
+import tracing
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying or falling back on; anything else (bad request, auth) is raised at once
+TRANSIENT_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+_client = None
+_lock = threading.Lock()
+
+# Circuit breaker state per model: model -> {'failures', 'opened_at'}
+_breakers = {}
+
+# Latency histograms per (call, model): {'buckets': [...], 'sum': seconds, 'count': n, 'errors': n}
+latency_histograms = {}
+
+class LLMUnavailableError(Exception):
+    """Raised when neither the primary nor the fallback model answered within the deadline."""
+
+def init_client(api_key=None):
+    """Create the OpenAI client; retries are handled here, so the SDK's own are disabled."""
+    global _client
+    _client = OpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'), max_retries=0, timeout=bot_config.LLM_DEFAULT_DEADLINE)
+    return _client
+
+def get_client():
+    """Return the OpenAI client, creating it on first use."""
+    with _lock:
+        if _client is None:
+            init_client()
+        return _client
+
+def reset():
+    """Close every circuit breaker and clear the latency histograms."""
+    with _lock:
+        _breakers.clear()
+        latency_histograms.clear()
+
+# Circuit breaker
+
+def _breaker_allows(model, now):
+    with _lock:
+        breaker = _breakers.get(model)
+        if not breaker or breaker['opened_at'] is None:
+            return True
+        if now - breaker['opened_at'] >= bot_config.LLM_BREAKER_RESET_SECONDS:
+            breaker['opened_at'] = now  # Half-open: let this call probe the model
+            return True
+        return False
+
+def _record_success(model):
+    with _lock:
+        _breakers[model] = {'failures': 0, 'opened_at': None}
+
+def _record_failure(model):
+    with _lock:
+        breaker = _breakers.setdefault(model, {'failures': 0, 'opened_at': None})
+        breaker['failures'] += 1
+        if breaker['failures'] >= bot_config.LLM_BREAKER_FAILURE_THRESHOLD:
+            if breaker['opened_at'] is None:
+                logger.warning(f"Circuit breaker opened for model {model} after {breaker['failures']} failures")
+            breaker['opened_at'] = time.monotonic()
+
+def breaker_state(model):
+    """Return 'closed', 'open' or 'half_open' for model."""
+    breaker = _breakers.get(model)
+    if not breaker or breaker['opened_at'] is None:
+        return 'closed'
+    if time.monotonic() - breaker['opened_at'] >= bot_config.LLM_BREAKER_RESET_SECONDS:
+        return 'half_open'
+    return 'open'
+
+# Latency histograms
+
+def _observe(call, model, seconds, error=False):
+    with _lock:
+        histogram = latency_histograms.setdefault((call, model), {
+            'buckets': [0] * len(bot_config.LLM_LATENCY_BUCKETS), 'sum': 0.0, 'count': 0, 'errors': 0
+        })
+        for index, bound in enumerate(bot_config.LLM_LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][index] += 1
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+        if error:
+            histogram['errors'] += 1
+
+def latency_percentile(call, model, percentile):
+    """Return the bucket upper bound under which percentile (0-1) of the calls completed, or None."""
+    histogram = latency_histograms.get((call, model))
+    if not histogram or not histogram['count']:
+        return None
+    target = percentile * histogram['count']
+    for bound, cumulative in zip(bot_config.LLM_LATENCY_BUCKETS, histogram['buckets']):
+        if cumulative >= target:
+            return bound
+    return float('inf')
+
+# Calls
+
+def _attempt(call, model, deadline, request, retries, attempt_timeout):
+    """Call model until it succeeds, retries run out or the deadline passes; each try gets at most attempt_timeout."""
+    last_error = None
+    for attempt in range(retries + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        started = time.monotonic()
+        try:
+            with tracing.span(f"openai.{call}", model=model, attempt=attempt + 1):
+                response = request(model, min(remaining, attempt_timeout))
+        except TRANSIENT_ERRORS as e:
+            _observe(call, model, time.monotonic() - started, error=True)
+            _record_failure(model)
+            last_error = e
+            logger.warning(f"LLM call {call} on {model} failed (attempt {attempt + 1}): {str(e)}")
+            if attempt < retries:
+                # Full jitter keeps retries from many webhooks from hitting the API together
+                backoff = random.uniform(0, bot_config.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+                time.sleep(max(0, min(backoff, deadline - time.monotonic())))
+            continue
+        _observe(call, model, time.monotonic() - started)
+        _record_success(model)
+        return response, None
+    return None, last_error or TimeoutError(f"Deadline exceeded for {call}")
+
+def _call(call, request):
+    budget = bot_config.LLM_DEADLINES.get(call, bot_config.LLM_DEFAULT_DEADLINE)
+    deadline = time.monotonic() + budget
+    attempt_timeout = budget * bot_config.LLM_ATTEMPT_TIMEOUT_SHARE
+    last_error = None
+    models = [bot_config.CHATGPT_MODEL]
+    if bot_config.LLM_FALLBACK_MODEL and bot_config.LLM_FALLBACK_MODEL != bot_config.CHATGPT_MODEL:
+        models.append(bot_config.LLM_FALLBACK_MODEL)
+    for index, model in enumerate(models):
+        if not _breaker_allows(model, time.monotonic()):
+            logger.debug(f"Circuit breaker open for {model}; skipping it for {call}")
+            continue
+        retries = bot_config.LLM_MAX_RETRIES if index == 0 else 0
+        # The primary model stops early enough to leave the fallback its reserved share of the deadline
+        model_deadline = deadline
+        if index < len(models) - 1:
+            model_deadline -= budget * bot_config.LLM_FALLBACK_RESERVE_SHARE
+        response, last_error = _attempt(call, model, model_deadline, request, retries, attempt_timeout)
+        if response is not None:
+            if index > 0:
+                logger.warning(f"LLM call {call} answered by fallback model {model}")
+            return response
+    raise LLMUnavailableError(f"No model answered {call}: {str(last_error)}")
+
+def chat_completion(call, messages, **kwargs):
+    """Create a chat completion under the deadline configured for call.
+
+    Transient errors are retried with jittered backoff on the primary model and
+    then tried once on LLM_FALLBACK_MODEL; models whose circuit breaker is open
+    are skipped. Raises LLMUnavailableError when no model answered in time.
+    Pass stream=True to get the stream back (the deadline then bounds the wait
+    for the response to start).
+    """
+    client = get_client()
+    return _call(call, lambda model, remaining: client.chat.completions.create(
+        model=model, messages=messages, timeout=remaining, **kwargs
+    ))
+
+def transcribe(audio_file, **kwargs):
+    """Transcribe an audio file under the 'transcription' deadline."""
+    client = get_client()
+    deadline = bot_config.LLM_DEADLINES.get('transcription', bot_config.LLM_DEFAULT_DEADLINE)
+    started = time.monotonic()
+    try:
+        with tracing.span("openai.transcription", model=kwargs.get('model')):
+            transcription = client.audio.transcriptions.create(file=audio_file, timeout=deadline, **kwargs)
+    except Exception:
+        _observe('transcription', kwargs.get('model'), time.monotonic() - started, error=True)
+        raise
+    _observe('transcription', kwargs.get('model'), time.monotonic() - started)
+    return transcription
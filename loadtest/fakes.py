@@ -0,0 +1,303 @@
+"""Deterministic offline stand-ins for OpenAI, Twilio and Google Cloud Storage.
+
+Each fake sleeps for a latency drawn from a seeded distribution and counts the
+calls it receives, so the webhook can be load-tested on a laptop with no
+network and no credentials.
+"""
+import math
+import json
+import time
+import random
+import itertools
+import threading
+import contextlib
+from collections import Counter
+from types import SimpleNamespace
+from unittest.mock import patch
+from google.api_core import exceptions as gcs_exceptions
+from google.cloud import storage
+import bot_config
+import llm_gateway
+import message_handler
+import prompt_builder
+import routes
+
+class LatencyModel:
+    """Log-normal latency with the given median (seconds); sigma=0 gives a fixed latency."""
+
+    def __init__(self, median=0.0, sigma=0.0, seed=None):
+        self.median = median
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        if self.median <= 0:
+            return 0.0
+        with self._lock:
+            return self.median * math.exp(self.sigma * self._random.gauss(0, 1))
+
+    def wait(self):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+        return delay
+
+class CallCounter:
+    """Thread-safe counter of API calls by name."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+# OpenAI
+
+REPLY_TEXT = (
+    "Claro, con gusto te cuento. KABAN es un desarrollo en Tulum con alberca, gimnasio y rentas vacacionales. "
+    "¿Te gustaría conocer los precios de las unidades disponibles?"
+)
+
+def _classify_prompt(messages):
+    """Name the message_handler call a prompt belongs to, from its system instructions."""
+    system = messages[0]['content'] if messages else ''
+    if 'identifica la intención' in system:
+        return 'detect_intention'
+    if 'evalúa si una respuesta' in system:
+        return 'needs_gerente_contact'
+    if 'extrae el nombre' in system:
+        return 'extract_name'
+    if 'Reformula la respuesta' in system:
+        return 'rephrase'
+    return 'reply'
+
+def _usage(messages, completion):
+    prompt_tokens = sum(prompt_builder.count_tokens(message['content']) for message in messages)
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=prompt_builder.count_tokens(completion),
+        prompt_tokens_details=SimpleNamespace(cached_tokens=0)
+    )
+
+class _FakeCompletions:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, model=None, messages=(), stream=False, **kwargs):
+        kind = _classify_prompt(messages)
+        self._fake.calls.add(f"openai.{kind}")
+        user_message = messages[-1]['content'] if messages else ''
+        if kind == 'detect_intention':
+            content = json.dumps({'intention': 'question', 'data': {}})
+        elif kind == 'needs_gerente_contact':
+            content = "False"
+        elif kind == 'extract_name':
+            words = [word for word in user_message.split() if word[:1].isupper()]
+            content = words[-1] if words else "None"
+        elif kind == 'rephrase':
+            content = f"Gracias por esperar. {user_message}"
+        else:
+            content = REPLY_TEXT
+        usage = _usage(messages, content)
+
+        self._fake.latency.wait()  # Time to first token
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+        return self._stream(content, usage)
+
+    def _stream(self, content, usage):
+        for word in content.split(' '):
+            self._fake.token_latency.wait()
+            delta = SimpleNamespace(content=word + ' ')
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+class _FakeTranscriptions:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, file=None, **kwargs):
+        self._fake.calls.add("openai.transcription")
+        self._fake.latency.wait()
+        return SimpleNamespace(text="Hola, me interesa información de KABAN")
+
+class FakeOpenAI:
+    """Answers every message_handler prompt with a canned, well-formed completion."""
+
+    def __init__(self, calls, latency, token_latency):
+        self.calls = calls
+        self.latency = latency
+        self.token_latency = token_latency
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+        self.audio = SimpleNamespace(transcriptions=_FakeTranscriptions(self))
+
+# Twilio
+
+class _FakeMessages:
+    def __init__(self, fake):
+        self._fake = fake
+        self._sids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, body=None, from_=None, to=None, **kwargs):
+        self._fake.calls.add("twilio.messages.create")
+        self._fake.latency.wait()
+        with self._lock:
+            sid = f"SM{next(self._sids):032d}"
+            self._fake.sent.append({'to': to, 'body': body})
+        return SimpleNamespace(sid=sid, status="queued")
+
+    def list(self, **kwargs):
+        self._fake.calls.add("twilio.messages.list")
+        self._fake.latency.wait()
+        return []
+
+class FakeTwilio:
+    """Records outgoing WhatsApp messages instead of sending them."""
+
+    def __init__(self, calls, latency):
+        self.calls = calls
+        self.latency = latency
+        self.sent = []
+        self.messages = _FakeMessages(self)
+
+# Google Cloud Storage
+
+class FakeBlob:
+    def __init__(self, store, bucket_name, name):
+        self._store = store
+        self._key = (bucket_name, name)
+        self.name = name
+        self.generation = None
+
+    def _read(self, if_generation_match=None):
+        self._store.calls.add("gcs.download")
+        self._store.latency.wait()
+        with self._store.lock:
+            if self._key not in self._store.objects:
+                raise gcs_exceptions.NotFound(f"No such object: {self.name}")
+            data, generation = self._store.objects[self._key]
+        if if_generation_match is not None and if_generation_match != generation:
+            raise gcs_exceptions.PreconditionFailed(f"Generation mismatch for {self.name}")
+        self.generation = generation
+        return data
+
+    def _write(self, data, if_generation_match=None):
+        self._store.calls.add("gcs.upload")
+        self._store.latency.wait()
+        with self._store.lock:
+            current = self._store.objects.get(self._key)
+            current_generation = current[1] if current else 0
+            if if_generation_match is not None and if_generation_match != current_generation:
+                raise gcs_exceptions.PreconditionFailed(f"Generation mismatch for {self.name}")
+            self.generation = next(self._store.generations)
+            self._store.objects[self._key] = (data, self.generation)
+
+    def exists(self):
+        with self._store.lock:
+            return self._key in self._store.objects
+
+    def reload(self):
+        with self._store.lock:
+            if self._key not in self._store.objects:
+                raise gcs_exceptions.NotFound(f"No such object: {self.name}")
+            self.generation = self._store.objects[self._key][1]
+
+    def download_as_bytes(self, if_generation_match=None, **kwargs):
+        return self._read(if_generation_match)
+
+    def download_as_text(self, encoding='utf-8', **kwargs):
+        return self._read(kwargs.get('if_generation_match')).decode(encoding)
+
+    def download_to_filename(self, filename, **kwargs):
+        data = self._read(kwargs.get('if_generation_match'))
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None, **kwargs):
+        self._write(data.encode('utf-8') if isinstance(data, str) else data, if_generation_match)
+
+    def upload_from_filename(self, filename, content_type=None, if_generation_match=None, **kwargs):
+        with open(filename, 'rb') as f:
+            self._write(f.read(), if_generation_match)
+
+    def delete(self, if_generation_match=None, **kwargs):
+        self._store.calls.add("gcs.delete")
+        self._store.latency.wait()
+        with self._store.lock:
+            current = self._store.objects.get(self._key)
+            if current is None:
+                raise gcs_exceptions.NotFound(f"No such object: {self.name}")
+            if if_generation_match is not None and if_generation_match != current[1]:
+                raise gcs_exceptions.PreconditionFailed(f"Generation mismatch for {self.name}")
+            del self._store.objects[self._key]
+
+class FakeBucket:
+    def __init__(self, store, name):
+        self._store = store
+        self.name = name
+
+    def blob(self, name):
+        return FakeBlob(self._store, self.name, name)
+
+    def get_blob(self, name):
+        blob = self.blob(name)
+        if not blob.exists():
+            return None
+        blob.reload()
+        return blob
+
+    def list_blobs(self, prefix='', delimiter=None, **kwargs):
+        self._store.calls.add("gcs.list")
+        self._store.latency.wait()
+        with self._store.lock:
+            names = sorted(name for bucket, name in self._store.objects if bucket == self.name and name.startswith(prefix or ''))
+        blobs = []
+        for name in names:
+            blob = self.blob(name)
+            blob.reload()
+            blobs.append(blob)
+        return blobs
+
+class FakeStorage:
+    """In-memory object store shared by every fake storage client."""
+
+    def __init__(self, calls, latency):
+        self.calls = calls
+        self.latency = latency
+        self.objects = {}
+        self.generations = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def client(self, *args, **kwargs):
+        return SimpleNamespace(bucket=lambda name: FakeBucket(self, name))
+
+    def put(self, name, data, bucket_name=bot_config.GCS_BUCKET_NAME):
+        """Seed an object without counting a call or waiting."""
+        with self.lock:
+            self.objects[(bucket_name, name)] = (data.encode('utf-8') if isinstance(data, str) else data, next(self.generations))
+
+# Installation
+
+class Fakes:
+    """The three fakes with their latency models and a shared call counter."""
+
+    def __init__(self, openai_latency=None, token_latency=None, twilio_latency=None, gcs_latency=None):
+        self.calls = CallCounter()
+        self.openai = FakeOpenAI(self.calls, openai_latency or LatencyModel(), token_latency or LatencyModel())
+        self.twilio = FakeTwilio(self.calls, twilio_latency or LatencyModel())
+        self.storage = FakeStorage(self.calls, gcs_latency or LatencyModel())
+
+@contextlib.contextmanager
+def installed(fakes):
+    """Route every OpenAI, Twilio and GCS client the bot creates to fakes while the block runs."""
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(patch.object(storage, 'Client', fakes.storage.client))
+        stack.enter_context(patch.object(llm_gateway, '_client', fakes.openai))
+        stack.enter_context(patch.object(message_handler, 'twilio_client', fakes.twilio))
+        stack.enter_context(patch.object(routes, 'Client', lambda *args, **kwargs: fakes.twilio))
+        stack.enter_context(patch.dict('os.environ', {'TWILIO_ACCOUNT_SID': 'ACfake', 'TWILIO_AUTH_TOKEN': 'fake'}))
+        yield fakes
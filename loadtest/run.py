@@ -0,0 +1,158 @@
+"""Replay synthetic WhatsApp webhook traffic against /whatsapp using offline fakes.
+
+Usage:
+    python -m loadtest.run --clients 20 --concurrency 4 --openai-latency 0.8
+
+Reports p50/p95/p99 request latency, throughput, and the OpenAI, Twilio and
+GCS calls made per message.
+"""
+import sys
+import json
+import math
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+import bot_config
+import bootstrap
+from conversation_store import ConversationState
+from routes import init_routes
+from loadtest.fakes import Fakes, LatencyModel, installed
+
+# Messages each synthetic client sends, in order
+CONVERSATION = [
+    "Hola",
+    "Me llamo {name}",
+    "Busco algo para invertir",
+    "Tengo un presupuesto de 3 millones",
+    "Por la tarde, entre semana",
+    "Lo antes posible",
+    "¿Qué amenidades tiene KABAN?",
+    "¿Cuánto cuesta un departamento en KABAN?",
+]
+CLIENT_NAMES = ["Ana", "Luis", "María", "Carlos", "Sofía", "Jorge", "Valeria", "Diego"]
+
+# Projects seeded in the fake bucket so the catalog section of the prompt is realistic
+SAMPLE_PROJECTS = {
+    "KABAN": {
+        'description': "Departamentos en Tulum con esquema de renta vacacional.",
+        'type': "Departamentos",
+        'location': "Tulum, Quintana Roo",
+        'prices': {'Estudio': 2900000, '1 Recámara': 3800000, '2 Recámaras': 5200000},
+        'amenities': ["Alberca", "Gimnasio", "Coworking", "Rooftop"],
+    },
+    "MUWAN": {
+        'description': "Residencias frente al mar con acabados de lujo.",
+        'type': "Residencias",
+        'location': "Playa del Carmen, Quintana Roo",
+        'prices': {'Residencia A': 7500000, 'Residencia B': 9800000},
+        'amenities': ["Club de playa", "Spa", "Seguridad 24/7"],
+    },
+}
+
+def percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    # Rounded first so float error (0.07 * 100 = 7.000000000000001) does not bump the rank
+    rank = max(1, math.ceil(round(fraction * len(sorted_values), 9)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def build_app(fakes):
+    """Create the Flask app with the bot's routes and a fake bucket seeded with projects."""
+    for name, data in SAMPLE_PROJECTS.items():
+        fakes.storage.put(f"{bot_config.GCS_BASE_PATH}/{name}/{name.lower()}.json", json.dumps(data))
+    bootstrap.load_knowledge_base(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH)
+    app = Flask(__name__)
+    conversation_state = ConversationState()
+    init_routes(app, conversation_state)
+    return app
+
+def run_load(fakes, clients=10, concurrency=1, messages_per_client=len(CONVERSATION)):
+    """Send every client's conversation to /whatsapp and return the report dict."""
+    with installed(fakes):
+        app = build_app(fakes)
+        baseline_calls = dict(fakes.calls.counts)
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+
+        def converse(index):
+            phone = f"whatsapp:+52199{index:08d}"
+            name = CLIENT_NAMES[index % len(CLIENT_NAMES)]
+            http = app.test_client()
+            for template in CONVERSATION[:messages_per_client]:
+                started = time.perf_counter()
+                response = http.post('/whatsapp', data={
+                    'From': phone, 'Body': template.format(name=name), 'NumMedia': '0', 'ProfileName': name
+                })
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(converse, range(clients)))
+        wall_time = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies)
+    calls = {name: count - baseline_calls.get(name, 0) for name, count in sorted(fakes.calls.counts.items())}
+    return {
+        'messages': total,
+        'concurrency': concurrency,
+        'wall_time': wall_time,
+        'throughput': total / wall_time if wall_time else 0.0,
+        'latency': {
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else 0.0,
+        },
+        'statuses': statuses,
+        'calls_per_message': {name: count / total for name, count in calls.items() if count} if total else {},
+    }
+
+def format_report(report):
+    lines = [
+        f"Messages: {report['messages']} (concurrency {report['concurrency']}) in {report['wall_time']:.2f}s",
+        f"Throughput: {report['throughput']:.1f} messages/s",
+        "Latency: " + ", ".join(f"{name} {value * 1000:.0f} ms" for name, value in report['latency'].items()),
+        "Status codes: " + ", ".join(f"{code}: {count}" for code, count in sorted(report['statuses'].items())),
+        "Calls per message:",
+    ]
+    lines.extend(f"  {name:<34} {value:.2f}" for name, value in report['calls_per_message'].items())
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=10, help="Synthetic clients, each sending one conversation")
+    parser.add_argument('--concurrency', type=int, default=1, help="Clients sending at the same time")
+    parser.add_argument('--messages', type=int, default=len(CONVERSATION), help="Messages per client")
+    parser.add_argument('--openai-latency', type=float, default=0.6, help="Median seconds to the first token")
+    parser.add_argument('--token-latency', type=float, default=0.01, help="Median seconds between streamed words")
+    parser.add_argument('--twilio-latency', type=float, default=0.15, help="Median seconds per Twilio request")
+    parser.add_argument('--gcs-latency', type=float, default=0.05, help="Median seconds per GCS request")
+    parser.add_argument('--sigma', type=float, default=0.5, help="Log-normal spread of every latency (0 = fixed)")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    parser.add_argument('--log-level', default='ERROR')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+    fakes = Fakes(
+        openai_latency=LatencyModel(args.openai_latency, args.sigma, args.seed),
+        token_latency=LatencyModel(args.token_latency, args.sigma, args.seed + 1),
+        twilio_latency=LatencyModel(args.twilio_latency, args.sigma, args.seed + 2),
+        gcs_latency=LatencyModel(args.gcs_latency, args.sigma, args.seed + 3),
+    )
+    report = run_load(fakes, clients=args.clients, concurrency=args.concurrency, messages_per_client=args.messages)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
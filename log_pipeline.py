@@ -0,0 +1,156 @@
+import queue
+import atexit
+import logging
+import itertools
+import threading
+import logging.handlers
+import bot_config
+import tracing
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Records dropped because the queue was full and debug records skipped by sampling
+stats = {'dropped': 0, 'sampled_out': 0}
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+def _truncate(text, limit):
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}… (+{len(text) - limit} chars)"
+
+def _short(value, limit):
+    """Render one item of a container: containers by size only, scalars truncated."""
+    if isinstance(value, (dict, list, tuple, set)) or hasattr(value, 'keys'):
+        return f"<{type(value).__name__} of {len(value)}>"
+    return _truncate(repr(value), limit)
+
+def _render(value, limit):
+    if isinstance(value, str):
+        return _truncate(value, limit)
+    if hasattr(value, 'keys'):
+        items = ((f"{key!r}: {_short(value[key], limit // 4)}") for key in value.keys())
+        opening, closing = '{', '}'
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = (_short(item, limit // 4) for item in value)
+        opening, closing = ('(', ')') if isinstance(value, tuple) else ('[', ']')
+    else:
+        return _truncate(repr(value), limit)
+
+    # Stop iterating as soon as the limit is reached so the cost does not grow with the container
+    parts = []
+    used = 0
+    for part in items:
+        if used + len(part) > limit and parts:
+            break
+        parts.append(part)
+        used += len(part) + 2
+    total = len(value)
+    more = f", … (+{total - len(parts)} more)" if total > len(parts) else ""
+    return f"{opening}{', '.join(parts)}{more}{closing}"
+
+class Summary:
+    """Size-bounded rendering of a log argument, built only if the record is emitted."""
+
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value, limit):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        return _render(self.value, self.limit)
+
+    __repr__ = __str__
+
+def summarize(value, limit=None):
+    """Wrap value for a %s log argument so at most about limit characters of it are formatted."""
+    return Summary(value, limit or bot_config.LOG_SUMMARY_MAX_CHARS)
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep the first and then one of every `every` DEBUG records from each call site."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, every)
+        self._counters = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.lineno)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        if next(counter) % self.every == 0:
+            return True
+        stats['sampled_out'] += 1
+        return False
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats['dropped'] += 1
+
+def configure_logging(level=None, log_file=None):
+    """Route every logger through a bounded queue to console and rotating-file writers on a background thread.
+
+    Request IDs and debug sampling are applied on the calling thread, before the
+    record is queued; the console and file handlers run on the listener thread.
+    Calling it again returns the running listener.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        formatter = logging.Formatter(LOG_FORMAT)
+
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.DEBUG)
+        console_handler.setFormatter(formatter)
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file or bot_config.LOG_FILE,
+            maxBytes=bot_config.LOG_FILE_MAX_BYTES,
+            backupCount=bot_config.LOG_FILE_BACKUP_COUNT,
+            encoding='utf-8'
+        )
+        file_handler.setLevel(logging.INFO)
+        file_handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=bot_config.LOG_QUEUE_SIZE)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _queue_handler.addFilter(DebugSamplingFilter(bot_config.LOG_DEBUG_SAMPLE_EVERY))
+        _queue_handler.addFilter(tracing.RequestIdFilter())
+
+        root = logging.getLogger()
+        root.setLevel(level or bot_config.LOG_LEVEL)
+        root.addHandler(_queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return _listener
+
+def stop_logging():
+    """Flush queued records, stop the writer thread and detach the queue handler."""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener = None
+        _queue_handler = None
@@ -1,12 +1,20 @@
 import re
+import time
 import logging
 import requests
 import json
-from openai import OpenAI
 import bot_config
 import traceback
 import os
 import utils
+import intent_classifier
+import name_extractor
+import classification_cache
+import prompt_builder
+import llm_gateway
+import log_pipeline
+import lead_events
+import activity
 from twilio.rest import Client
 from datetime import datetime, timedelta
 import twilio
@@ -15,21 +23,14 @@ import difflib
 # Configure logger
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client and global data
-openai_client = None
-projects_data = {}
-downloadable_urls = {}
-
 # Twilio client for sending messages to the gerente
 twilio_client = None
 whatsapp_sender_number = "whatsapp:+18188732305"
 gerente_phone = bot_config.GERENTE_PHONE
 
-def initialize_message_handler(openai_api_key, projects_data_ref, downloadable_urls_ref, twilio_account_sid, twilio_auth_token):
-    global openai_client, projects_data, downloadable_urls, twilio_client
-    openai_client = OpenAI(api_key=openai_api_key)
-    projects_data = projects_data_ref
-    downloadable_urls = downloadable_urls_ref
+def initialize_message_handler(openai_api_key, twilio_account_sid, twilio_auth_token):
+    global twilio_client
+    llm_gateway.init_client(openai_api_key)
     try:
         twilio_client = Client(twilio_account_sid, twilio_auth_token)
         logger.debug(f"Twilio client initialized with account SID: {twilio_account_sid}")
@@ -65,10 +66,10 @@ def handle_gerente_response(incoming_msg, phone, conversation_state, gcs_bucket_
     for client, state in conversation_state.items():
         if 'pending_question' in state and state['pending_question'] and state['pending_question'].get('client_phone') == client:
             client_phone = client
-            logger.debug(f"Found pending question for client {client}: {state['pending_question']}")
+            logger.debug("Found pending question for client %s: %s", client, log_pipeline.summarize(state['pending_question']))
             break
         else:
-            logger.debug(f"No pending question for client {client}: {state.get('pending_question', 'None')}")
+            logger.debug("No pending question for client %s: %s", client, log_pipeline.summarize(state.get('pending_question')))
 
     if not client_phone or 'pending_question' not in conversation_state.get(client_phone, {}):
         logger.error(f"No pending question found for gerente response. Client phone: {client_phone}, Conversation state for client: {conversation_state.get(client_phone, {})}")
@@ -78,7 +79,7 @@ def handle_gerente_response(incoming_msg, phone, conversation_state, gcs_bucket_
     logger.debug(f"Gerente response: {answer}")
 
     messages = [f"Gracias por esperar, aquí tienes: {answer}. ¿En qué más puedo ayudarte?"]
-    logger.debug(f"Prepared response for client {client_phone}: {messages}")
+    logger.debug("Prepared response for client %s: %s", client_phone, log_pipeline.summarize(messages))
 
     return client_phone, messages
 
@@ -92,51 +93,72 @@ def correct_typo(text, known_words):
         return corrected
     return text_lower
 
-def extract_name(incoming_msg, conversation_history):
-    """Extract the client's name from their message or history using AI."""
+def correct_project_typos(incoming_msg, project_names):
+    """Lowercase a message and replace words that look like misspelled project names."""
+    incoming_msg_corrected = incoming_msg.lower()
+    for word in incoming_msg_corrected.split():
+        corrected = correct_typo(word, project_names)
+        if corrected != word:
+            incoming_msg_corrected = incoming_msg_corrected.replace(word, corrected)
+    return incoming_msg_corrected
+
+def detect_mentioned_project(text):
+    """Return the project whose keyword appears in text, or None."""
+    normalized_text = text.lower().replace(" ", "")
+    for keyword, project in bot_config.PROJECT_KEYWORD_MAPPING.items():
+        if keyword in normalized_text:
+            return project
+    return None
+
+def detect_project_in_history(conversation_history):
+    """Return the project mentioned in the earliest history line that names one, or None."""
+    for msg in conversation_history.split('\n'):
+        project = detect_mentioned_project(msg)
+        if project:
+            return project
+    return None
+
+def extract_name(incoming_msg, conversation_history, profile_name=None):
+    """Extract the client's name from their message, using AI only when the local rules are unsure."""
     logger.debug(f"Extracting name from message: {incoming_msg}")
-    prompt = (
+    name, ambiguous = name_extractor.extract_name(incoming_msg, profile_name)
+    if name or not ambiguous:
+        logger.debug(f"Locally extracted name: {name}")
+        return name
+
+    instructions = (
         "Eres un asistente que extrae el nombre de una persona de un mensaje o historial de conversación. "
         "El mensaje puede contener frases como 'me llamo', 'mi nombre es', 'soy', o simplemente un nombre propio. "
         "Tu tarea es identificar y extraer únicamente el nombre propio (sin apellidos ni contexto adicional). "
         "Revisa también el historial para buscar nombres mencionados previamente. "
         "Si no hay un nombre claro en el mensaje o historial (por ejemplo, 'si claro me llamo rupert' debe devolver 'rupert'), retorna None. "
         "Devuelve el nombre en formato de texto plano.\n\n"
-        f"Historial de conversación:\n{conversation_history}\n\n"
-        f"Mensaje: {incoming_msg}"
     )
+    prompt = prompt_builder.build_prompt('extract_name', [
+        (None, instructions),
+        (None, "Historial de conversación:\n"), ('classifier_history', conversation_history),
+        (None, "\n\nMensaje: "), ('message', incoming_msg),
+    ])
 
     try:
-        response = openai_client.chat.completions.create(
-            model=bot_config.CHATGPT_MODEL,
+        response = llm_gateway.chat_completion(
+            'extract_name',
             messages=[
                 {"role": "system", "content": prompt},
-                {"role": "user", "content": incoming_msg}
+                {"role": "user", "content": prompt_builder.fit_section('message', incoming_msg)}
             ],
             max_tokens=20,
             temperature=0.3
         )
+        prompt_builder.record_api_usage('extract_name', response)
         name = response.choices[0].message.content.strip()
         logger.debug(f"Extracted name from OpenAI: {name}")
         if name.lower() == "none" or not name:
-            # Fallback para extraer manualmente si OpenAI falla
-            name_match = re.search(r"(?:me llamo|mi nombre es|soy)\s+([A-Za-záéíóúÁÉÍÓÚñÑ]+)", incoming_msg, re.I)
-            if name_match:
-                name = name_match.group(1).capitalize()
-                logger.debug(f"Fallback extracted name: {name}")
-            else:
-                name = None
+            return None
         return name
     except Exception as e:
         logger.error(f"Error extracting name with OpenAI: {str(e)}", exc_info=True)
-        # Fallback manual si hay error
-        name_match = re.search(r"(?:me llamo|mi nombre es|soy)\s+([A-Za-záéíóúÁÉÍÓÚñÑ]+)", incoming_msg, re.I)
-        if name_match:
-            name = name_match.group(1).capitalize()
-            logger.debug(f"Fallback extracted name after error: {name}")
-        else:
-            name = None
-        return name
+        return None
 
 def is_ready_for_zoom(phone, conversation_state):
     """Determine if the client is ready to schedule a Zoom meeting."""
@@ -148,10 +170,7 @@ def is_ready_for_zoom(phone, conversation_state):
     has_interacted_enough = messages_count >= 4  # Increased from 2 to 4 for more natural flow
     
     # Check if client has shown significant interest
-    intention_history = state.get('intention_history', [])
-    has_shown_significant_interest = (
-        sum(1 for intent in intention_history if intent in ["question", "budget", "needs", "purchase_intent", "negotiation"]) >= 2
-    )  # Require at least 2 meaningful intents
+    has_shown_significant_interest = lead_events.meaningful_intentions(state) >= 2  # Require at least 2 meaningful intents
     
     # Check if Zoom has already been proposed
     zoom_proposed = state.get('zoom_proposed', False)
@@ -182,17 +201,31 @@ def confirm_zoom_meeting(phone, client_name, day, time, conversation_state):
     
     conversation_state[phone]['zoom_scheduled'] = True
     conversation_state[phone]['zoom_details'] = {'day': day, 'time': time}
+    activity.record('zoom_bookings')
     
     notification = [msg.format(client_name=client_name, phone=phone, day=day, time=time) for msg in bot_config.ZOOM_NOTIFICATION_TO_GERENTE]
     utils.notify_gerente(notification, twilio_client, whatsapp_sender_number)
     
     return messages, True
 
-def detect_intention(incoming_msg, conversation_history, is_gerente=False):
+def detect_intention(incoming_msg, conversation_history, is_gerente=False, zoom_proposed=False):
     logger.debug(f"Detecting intention for message: {incoming_msg}")
-    
+
+    if not is_gerente:
+        fast_result = intent_classifier.fast_classify(incoming_msg, zoom_proposed=zoom_proposed, project_names=utils.projects_data.keys())
+        if fast_result:
+            return fast_result
+
+    cache_key = classification_cache.make_key(
+        'intention', incoming_msg, is_gerente, zoom_proposed, classification_cache.last_bot_turn(conversation_history)
+    )
+    cached_result = classification_cache.get(cache_key)
+    if cached_result is not None:
+        logger.debug(f"Cached intention for '{incoming_msg}': {cached_result}")
+        return cached_result
+
     role = "gerente" if is_gerente else "cliente"
-    prompt = (
+    instructions = (
         f"Eres un asistente que identifica la intención detrás de un mensaje de un {role}. "
         f"Tu tarea es clasificar la intención del mensaje en una de las siguientes categorías y extraer información relevante:\n"
         f"- Para gerente: report (solicitar reporte), client_search (buscar cliente), add_faq (añadir FAQ), priority (marcar prioritario), task (asignar tarea), daily_summary (resumen diario), response (responder a cliente), schedule_zoom (programar Zoom), unknown (desconocido).\n"
@@ -200,22 +233,27 @@ def detect_intention(incoming_msg, conversation_history, is_gerente=False):
         f"Si el mensaje incluye un día y horario (por ejemplo, 'Lunes a las 10:00 AM') y sigue a una propuesta de Zoom, clasifícalo como 'zoom_response'.\n"
         f"Si el mensaje es un nombre o carece de contexto claro, clasifícalo como 'unknown'.\n"
         f"Devuelve la intención y los datos relevantes (e.g., proyecto, número de teléfono, pregunta, respuesta, día y horario para Zoom) en formato JSON.\n\n"
-        f"Historial de conversación:\n{conversation_history}\n\n"
-        f"Mensaje: {incoming_msg}"
     )
+    prompt = prompt_builder.build_prompt('detect_intention', [
+        (None, instructions),
+        (None, "Historial de conversación:\n"), ('classifier_history', conversation_history),
+        (None, "\n\nMensaje: "), ('message', incoming_msg),
+    ])
 
     try:
-        response = openai_client.chat.completions.create(
-            model=bot_config.CHATGPT_MODEL,
+        response = llm_gateway.chat_completion(
+            'detect_intention',
             messages=[
                 {"role": "system", "content": prompt},
-                {"role": "user", "content": incoming_msg}
+                {"role": "user", "content": prompt_builder.fit_section('message', incoming_msg)}
             ],
             max_tokens=50,
             temperature=0.3
         )
+        prompt_builder.record_api_usage('detect_intention', response)
         result = json.loads(response.choices[0].message.content.strip())
         logger.debug(f"Intention detected: {result}")
+        classification_cache.put(cache_key, result)
         return result
     except Exception as e:
         logger.error(f"Error detecting intention with OpenAI: {str(e)}", exc_info=True)
@@ -227,22 +265,32 @@ def needs_gerente_contact(response, question, project_data, conversation_history
         logger.debug(f"Question '{question}' is too vague or not a question; not escalating to gerente.")
         return False
 
-    prompt = (
+    # Keyed on the question, the project and the reply's traits so rephrased replies still hit
+    cache_key = classification_cache.make_key('needs_gerente', question, project_data, classification_cache.reply_traits(response))
+    cached_result = classification_cache.get(cache_key)
+    if cached_result is not None:
+        logger.debug(f"Cached gerente-contact decision for '{question}': {cached_result}")
+        return cached_result
+
+    instructions = (
         "Eres un asistente que evalúa si una respuesta indica que el bot no tiene información suficiente y necesita consultar a un gerente. "
         "Analiza la respuesta generada por el bot, la pregunta del cliente, los datos del proyecto y el historial de conversación. "
         "Si la respuesta implica que el bot no tiene la información exacta o completa para responder la pregunta (por ejemplo, si dice que algo 'no está confirmado' o que 'necesita verificar'), retorna True. "
         "Si la pregunta es ambigua o no tiene sentido en el contexto del historial, retorna False para evitar escalar preguntas sin sentido. "
         "Si la respuesta es clara y utiliza información disponible en los datos del proyecto, retorna False. "
         "Devuelve únicamente True o False en formato de texto plano.\n\n"
-        f"Historial de conversación:\n{conversation_history}\n\n"
-        f"Pregunta del cliente: {question}\n"
-        f"Respuesta del bot: {response}\n"
-        f"Datos del proyecto: {project_data}"
     )
+    prompt = prompt_builder.build_prompt('needs_gerente_contact', [
+        (None, instructions),
+        (None, "Historial de conversación:\n"), ('classifier_history', conversation_history),
+        (None, "\n\nPregunta del cliente: "), ('message', question),
+        (None, "\nRespuesta del bot: "), ('reply', response),
+        (None, "\nDatos del proyecto: "), ('project', project_data),
+    ])
 
     try:
-        response = openai_client.chat.completions.create(
-            model=bot_config.CHATGPT_MODEL,
+        response = llm_gateway.chat_completion(
+            'needs_gerente_contact',
             messages=[
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": ""}
@@ -250,12 +298,44 @@ def needs_gerente_contact(response, question, project_data, conversation_history
             max_tokens=10,
             temperature=0.3
         )
-        result = response.choices[0].message.content.strip().lower()
-        return result == "true"
+        prompt_builder.record_api_usage('needs_gerente_contact', response)
+        result = response.choices[0].message.content.strip().lower() == "true"
+        classification_cache.put(cache_key, result)
+        return result
     except Exception as e:
         logger.error(f"Error determining if gerente contact is needed: {str(e)}", exc_info=True)
         return False
 
+# Sentence boundary in a streamed reply: end punctuation followed by whitespace
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+def stream_completion(messages, on_sentence, **kwargs):
+    """Stream a chat completion, passing its first complete sentence to on_sentence as soon as it arrives.
+
+    Returns (reply, first_sentence); first_sentence is the part of reply already
+    handed to on_sentence, or None if the stream ended before a sentence boundary.
+    """
+    started = time.monotonic()
+    stream = llm_gateway.chat_completion(
+        'reply', messages, stream=True, stream_options={"include_usage": True}, **kwargs
+    )
+    reply = ''
+    first_sentence = None
+    for chunk in stream:
+        if getattr(chunk, 'usage', None):
+            prompt_builder.record_api_usage('reply', chunk)
+        if not chunk.choices:
+            continue
+        reply += chunk.choices[0].delta.content or ''
+        if first_sentence is None:
+            match = SENTENCE_BOUNDARY.search(reply.lstrip())
+            if match:
+                first_sentence = reply.lstrip()[:match.start()].strip()
+                logger.debug(f"First sentence ready after {time.monotonic() - started:.2f}s: {first_sentence}")
+                on_sentence(first_sentence)
+    logger.debug(f"Streamed reply completed after {time.monotonic() - started:.2f}s")
+    return reply.strip(), first_sentence
+
 def ensure_question_in_response(messages, client_name):
     """Ensure the response ends with a question to keep the conversation active."""
     if not messages:
@@ -266,38 +346,30 @@ def ensure_question_in_response(messages, client_name):
         logger.warning(f"Response does not end with a question: {last_message}")
     return messages
 
-def process_message(incoming_msg, phone, conversation_state, project_info, conversation_history):
+def process_message(incoming_msg, phone, conversation_state, project_info, conversation_history, on_message=None):
+    """Generate the reply to a client message.
+
+    When on_message is given and STREAM_REPLIES is enabled, the first sentence of
+    an AI reply is passed to on_message while the rest is still generating and is
+    left out of the returned messages.
+    """
     logger.debug(f"Processing message: {incoming_msg}")
     messages = []
+    dispatched = 0
     state = conversation_state.get(phone, {})
     mentioned_project = state.get('last_mentioned_project')
+    # The catalog is swapped whole on reload; keep one version for this message
+    projects_data = utils.projects_data
 
     # Correct typographical errors in the message
-    incoming_msg_corrected = incoming_msg.lower()
-    project_names = list(projects_data.keys())
-    for word in incoming_msg_corrected.split():
-        corrected = correct_typo(word, project_names)
-        if corrected != word:
-            incoming_msg_corrected = incoming_msg_corrected.replace(word, corrected)
+    incoming_msg_corrected = correct_project_typos(incoming_msg, list(projects_data.keys()))
 
     # Detect project in the message only if profiling is complete
     if state.get('purchase_intent_asked', False) and all([state.get('client_name'), state.get('needs'), state.get('client_budget'), state.get('preferred_time') or state.get('preferred_days'), state.get('purchase_intent')]):
-        normalized_msg = incoming_msg_corrected.replace(" ", "")
-        for keyword, project in bot_config.PROJECT_KEYWORD_MAPPING.items():
-            if keyword in normalized_msg:
-                mentioned_project = project
-                break
-
+        mentioned_project = detect_mentioned_project(incoming_msg_corrected) or mentioned_project
         if not mentioned_project:
             logger.debug("No project mentioned in message; checking conversation history")
-            for msg in conversation_history.split('\n'):
-                normalized_hist_msg = msg.lower().replace(" ", "")
-                for keyword, project in bot_config.PROJECT_KEYWORD_MAPPING.items():
-                    if keyword in normalized_hist_msg:
-                        mentioned_project = project
-                        break
-                if mentioned_project:
-                    break
+            mentioned_project = detect_project_in_history(conversation_history)
 
     logger.debug(f"Determined mentioned_project: {mentioned_project}")
 
@@ -326,14 +398,12 @@ def process_message(incoming_msg, phone, conversation_state, project_info, conve
             project_data += "Amenidades: No especificadas\n"
 
     # Detect the intention of the message
-    intention_result = detect_intention(incoming_msg_corrected, conversation_history, is_gerente=False)
+    intention_result = detect_intention(incoming_msg_corrected, conversation_history, is_gerente=False, zoom_proposed=state.get('zoom_proposed', False))
     intention = intention_result.get("intention", "unknown")
     intention_data = intention_result.get("data", {})
 
     # Add the detected intention to the client's state
-    if 'intention_history' not in state:
-        state['intention_history'] = []
-    state['intention_history'].append(intention)
+    lead_events.record_intention(phone, state, intention)
 
     # Handle Zoom-related intents
     if intention == "zoom_response":
@@ -368,57 +438,88 @@ def process_message(incoming_msg, phone, conversation_state, project_info, conve
         else:
             messages = [f"Entendido, {client_name}. ¿Me avisas cuando hagas el depósito?"]
     else:
-        # Update state based on intention
-        if intention == "needs" and 'data' in intention_data and 'needs' in intention_data['data']:
-            state['needs'] = intention_data['data']['needs']
-        elif intention == "budget" and 'data' in intention_data and 'budget' in intention_data['data']:
-            state['client_budget'] = intention_data['data']['budget']
-        elif intention == "contact_preference" and 'data' in intention_data:
-            if 'time' in intention_data['data']:
-                state['preferred_time'] = intention_data['data']['time']
-            if 'days' in intention_data['data']:
-                state['preferred_days'] = intention_data['data']['days']
-        elif intention == "purchase_intent" and 'data' in intention_data and 'intent' in intention_data['data']:
-            state['purchase_intent'] = intention_data['data']['intent']
+        # Update state based on intention (the LLM sometimes nests the fields under another 'data' key)
+        intention_fields = intention_data.get('data', intention_data) if isinstance(intention_data, dict) else {}
+        if intention == "needs" and 'needs' in intention_fields:
+            state['needs'] = intention_fields['needs']
+        elif intention == "budget" and 'budget' in intention_fields:
+            state['client_budget'] = intention_fields['budget']
+        elif intention == "contact_preference":
+            if 'time' in intention_fields:
+                state['preferred_time'] = intention_fields['time']
+            if 'days' in intention_fields:
+                state['preferred_days'] = intention_fields['days']
+        elif intention == "purchase_intent" and 'intent' in intention_fields:
+            state['purchase_intent'] = intention_fields['intent']
 
         # Use AI to generate a response
         client_budget = state.get('client_budget', 'No especificado')
         client_needs = state.get('needs', 'No especificadas')
         client_purchase_intent = state.get('purchase_intent', 'No especificado')
-        prompt = (
-            f"{bot_config.BOT_PERSONALITY}\n\n"
-            f"Instrucciones para las respuestas:\n{bot_config.RESPONSE_INSTRUCTIONS}\n\n"
-            f"Información del cliente:\n"
-            f"Nombre: {client_name}\n"
-            f"Presupuesto: {client_budget}\n"
-            f"Necesidades: {client_needs}\n"
-            f"Intención de compra: {client_purchase_intent}\n\n"
-            f"Información de los proyectos disponibles:\n"
-            f"{project_info}\n\n"
-            f"Datos específicos del proyecto (si aplica):\n"
-            f"{project_data}\n\n"
-            f"Historial de conversación:\n"
-            f"{conversation_history}\n\n"
-            f"Mensaje del cliente: {incoming_msg_corrected}\n\n"
-            f"Responde de forma breve y profesional, enfocándote en el proyecto {mentioned_project if mentioned_project else 'ninguno seleccionado aún'}, y usa emoticones solo si es estrictamente necesario para empatía o entusiasmo. Si no hay datos de proyectos disponibles, advierte al usuario y sugiere consultar con un gerente."
-        )
+        persona = f"{bot_config.BOT_PERSONALITY}\n\nInstrucciones para las respuestas:\n{bot_config.RESPONSE_INSTRUCTIONS}"
+        client_profile = f"Nombre: {client_name}\nPresupuesto: {client_budget}\nNecesidades: {client_needs}\nIntención de compra: {client_purchase_intent}"
+        closing_instruction = f"Responde de forma breve y profesional, enfocándote en el proyecto {mentioned_project if mentioned_project else 'ninguno seleccionado aún'}, y usa emoticones solo si es estrictamente necesario para empatía o entusiasmo. Si no hay datos de proyectos disponibles, advierte al usuario y sugiere consultar con un gerente."
+        user_message = {"role": "user", "content": prompt_builder.fit_section('message', incoming_msg_corrected)}
+        if bot_config.PROMPT_LAYOUT == 'cache_friendly':
+            # Content shared by every client goes first, byte-identical, so the provider can cache the prefix
+            static_prompt = prompt_builder.build_prompt('reply_prefix', [
+                ('persona', persona),
+                (None, "\n\nInformación de los proyectos disponibles:\n"), ('catalog', project_info),
+            ])
+            client_prompt = prompt_builder.build_prompt('reply', [
+                (None, "Información del cliente:\n"), ('client', client_profile),
+                (None, "\n\nDatos específicos del proyecto (si aplica):\n"), ('project', project_data),
+                (None, "\n\nHistorial de conversación:\n"), ('history', conversation_history),
+                (None, "\n\nMensaje del cliente: "), ('message', incoming_msg_corrected),
+                (None, f"\n\n{closing_instruction}"),
+            ])
+            completion_messages = [
+                {"role": "system", "content": static_prompt},
+                {"role": "system", "content": client_prompt},
+                user_message
+            ]
+        else:
+            prompt = prompt_builder.build_prompt('reply', [
+                ('persona', persona),
+                (None, "\n\nInformación del cliente:\n"), ('client', client_profile),
+                (None, "\n\nInformación de los proyectos disponibles:\n"), ('catalog', project_info),
+                (None, "\n\nDatos específicos del proyecto (si aplica):\n"), ('project', project_data),
+                (None, "\n\nHistorial de conversación:\n"), ('history', conversation_history),
+                (None, "\n\nMensaje del cliente: "), ('message', incoming_msg_corrected),
+                (None, f"\n\n{closing_instruction}"),
+            ])
+            completion_messages = [
+                {"role": "system", "content": prompt},
+                user_message
+            ]
         logger.debug(f"Sending request to OpenAI for client message: '{incoming_msg_corrected}', project: {mentioned_project}")
 
         try:
-            response = openai_client.chat.completions.create(
-                model=bot_config.CHATGPT_MODEL,
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": incoming_msg_corrected}
-                ],
-                max_tokens=150,
-                temperature=0.3
-            )
-            reply = response.choices[0].message.content.strip()
+            if on_message and bot_config.STREAM_REPLIES:
+                reply, first_sentence = stream_completion(
+                    completion_messages, on_message,
+                    max_tokens=150,
+                    temperature=0.3
+                )
+            else:
+                response = llm_gateway.chat_completion(
+                    'reply',
+                    completion_messages,
+                    max_tokens=150,
+                    temperature=0.3
+                )
+                prompt_builder.record_api_usage('reply', response)
+                reply = response.choices[0].message.content.strip()
+                first_sentence = None
             logger.debug(f"Generated response from OpenAI: {reply}")
 
             # Split the response into messages, but avoid splitting mid-sentence
             messages = [reply]
+            if first_sentence:
+                # The first sentence was already sent; the rest goes as its own message
+                rest = reply[len(first_sentence):].strip()
+                messages = [first_sentence, rest] if rest else [first_sentence]
+                dispatched = 1
 
             if not messages or messages == [""]:
                 messages = [f"Entiendo, {client_name}. No tengo información disponible en este momento, ¿te parece bien que consulte con un gerente para darte más detalles?"]
@@ -429,11 +530,13 @@ def process_message(incoming_msg, phone, conversation_state, project_info, conve
             # Determine if gerente contact is needed
             if needs_gerente_contact(reply, incoming_msg_corrected, project_data, conversation_history):
                 messages.append(f"Entiendo, {client_name}. No tengo la información exacta, ¿te parece bien que consulte con un gerente para darte más detalles?")
-                return messages, mentioned_project, True
+                return messages[dispatched:], mentioned_project, True
 
         except Exception as openai_e:
+            # Answer with a holding message instead of failing the whole webhook
             logger.error(f"Fallo con OpenAI API: {str(openai_e)}", exc_info=True)
-            raise
+            messages = [bot_config.LLM_FALLBACK_REPLY.format(client_name=client_name)]
+            dispatched = 0
 
     # Propose Zoom meeting if the client is ready
     if is_ready_for_zoom(phone, conversation_state) and not state.get('zoom_scheduled', False):
@@ -445,8 +548,8 @@ def process_message(incoming_msg, phone, conversation_state, project_info, conve
     if mentioned_project:
         state['last_mentioned_project'] = mentioned_project
 
-    logger.debug(f"Final messages: {messages}")
-    return messages, mentioned_project, False
+    logger.debug("Final messages: %s", log_pipeline.summarize(messages))
+    return messages[dispatched:], mentioned_project, False
 
 def handle_audio_message(media_url, phone, twilio_account_sid, twilio_auth_token):
     logger.debug("Handling audio message")
@@ -462,9 +565,9 @@ def handle_audio_message(media_url, phone, twilio_account_sid, twilio_auth_token
 
     try:
         with open(audio_file_path, 'rb') as audio_file:
-            transcription = openai_client.audio.transcriptions.create(
+            transcription = llm_gateway.transcribe(
+                audio_file,
                 model="whisper-1",
-                file=audio_file,
                 language="es"
             )
         incoming_msg = transcription.text.strip()
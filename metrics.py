@@ -0,0 +1,73 @@
+import bot_config
+import tracing
+import llm_gateway
+import classification_cache
+import intent_classifier
+import prompt_builder
+import log_pipeline
+
+def _label_string(labels):
+    escaped = {key: str(value).replace('\\', '\\\\').replace('"', '\\"') for key, value in labels.items()}
+    return ','.join(f'{key}="{value}"' for key, value in escaped.items())
+
+def _histogram_lines(metric, labels, histogram, bounds):
+    lines = []
+    for bound, count in zip(bounds, histogram['buckets']):
+        le = "+Inf" if bound == float('inf') else repr(float(bound))
+        lines.append(f"{metric}_bucket{{{_label_string({**labels, 'le': le})}}} {count}")
+    label_string = _label_string(labels)
+    lines.append(f"{metric}_sum{{{label_string}}} {histogram['sum']:.6f}")
+    lines.append(f"{metric}_count{{{label_string}}} {histogram['count']}")
+    return lines
+
+def render_metrics():
+    """Return every latency histogram and counter in the Prometheus text exposition format."""
+    lines = [
+        "# HELP giselle_span_seconds Duration of traced requests, handler steps and API calls.",
+        "# TYPE giselle_span_seconds histogram",
+    ]
+    for name, histogram in sorted(tracing.span_histograms.items()):
+        lines.extend(_histogram_lines("giselle_span_seconds", {'span': name}, histogram, bot_config.TRACE_LATENCY_BUCKETS))
+    lines += [
+        "# HELP giselle_span_errors_total Traced spans that ended with an exception.",
+        "# TYPE giselle_span_errors_total counter",
+    ]
+    for name, histogram in sorted(tracing.span_histograms.items()):
+        lines.append(f"giselle_span_errors_total{{{_label_string({'span': name})}}} {histogram['errors']}")
+
+    lines += [
+        "# HELP giselle_llm_latency_seconds Latency of each OpenAI attempt by call and model.",
+        "# TYPE giselle_llm_latency_seconds histogram",
+    ]
+    for (call, model), histogram in sorted(llm_gateway.latency_histograms.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        lines.extend(_histogram_lines("giselle_llm_latency_seconds", {'call': call, 'model': model}, histogram, bot_config.LLM_LATENCY_BUCKETS))
+
+    lines += [
+        "# HELP giselle_classification_cache_total Classification cache lookups and evictions.",
+        "# TYPE giselle_classification_cache_total counter",
+    ]
+    for result, count in sorted(classification_cache.stats.items()):
+        lines.append(f"giselle_classification_cache_total{{{_label_string({'result': result})}}} {count}")
+
+    lines += [
+        "# HELP giselle_intent_classifications_total Intent classifications by path.",
+        "# TYPE giselle_intent_classifications_total counter",
+    ]
+    for path, count in sorted(intent_classifier.stats.items()):
+        lines.append(f"giselle_intent_classifications_total{{{_label_string({'path': path})}}} {count}")
+
+    lines += [
+        "# HELP giselle_prompt_tokens_total Prompt tokens per call, estimated locally and reported by the API.",
+        "# TYPE giselle_prompt_tokens_total counter",
+    ]
+    for call, stats in sorted(prompt_builder.usage_stats.items()):
+        for kind in ('prompt_tokens', 'api_prompt_tokens', 'api_cached_tokens', 'api_completion_tokens'):
+            lines.append(f"giselle_prompt_tokens_total{{{_label_string({'call': call, 'kind': kind})}}} {stats.get(kind, 0)}")
+
+    lines += [
+        "# HELP giselle_log_records_skipped_total Log records dropped on a full queue or skipped by debug sampling.",
+        "# TYPE giselle_log_records_skipped_total counter",
+    ]
+    for reason, count in sorted(log_pipeline.stats.items()):
+        lines.append(f"giselle_log_records_skipped_total{{{_label_string({'reason': reason})}}} {count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,107 @@
+import re
+import logging
+import unicodedata
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Common first names in Mexico and Latin America (accent-free, lowercase)
+FIRST_NAMES = frozenset("""
+    adriana adrian agustin alan alberto alejandra alejandro alfonso alfredo alicia alma alonso alvaro ana andrea
+    andres angel angela angelica antonio araceli arturo aurora axel beatriz benjamin bernardo blanca brenda bruno
+    camila carla carlos carmen carolina catalina cecilia cesar claudia cristian cristina cynthia daniel daniela
+    david diana diego dulce eduardo elena elizabeth emilio emiliano emmanuel enrique erick ernesto esteban
+    esther eugenia eva fabiola federico felipe fernanda fernando francisco gabriel gabriela gerardo german
+    gilberto gloria gonzalo graciela guadalupe guillermo gustavo hector hilda horacio hugo ignacio irene irma
+    isaac isabel israel ivan ivonne jaime janet javier jazmin jesus jimena joaquin jorge jose josefina josue
+    juan juana julia julian julio karen karina karla laura leonardo leticia liliana lorena lourdes lucia luis
+    luisa lupita manuel marcela marco marcos margarita maria mariana mario marisol marta martha martin mateo
+    mauricio maximiliano mayra melissa miguel miriam monica nancy natalia nicolas noemi norma octavio olga
+    omar oscar pablo paola patricia paula pedro pilar rafael ramon raquel raul rebeca regina ricardo roberto
+    rocio rodrigo rogelio rosa rosario ruben salvador samuel sandra santiago sara saul sebastian sergio silvia
+    sofia sonia susana tania teresa tomas ulises valentina valeria vanessa veronica vicente victor victoria
+    ximena yolanda yesenia zaira
+""".split())
+
+# Words that commonly follow "soy" or open a message but are not names
+NON_NAMES = frozenset("""
+    de del el la los las un una muy yo mi su tu que si no ok hola buenas buenos dias tardes noches gracias
+    cliente interesado interesada inversionista comprador compradora arquitecto arquitecta doctor doctora
+    ingeniero ingeniera licenciado licenciada senor senora joven nuevo nueva mexicano mexicana americano
+    canadiense extranjero extranjera agente broker asesor asesora quien busco quiero necesito tengo estoy
+    fav living info informacion precio kaban tamarindo muwan cancun tulum merida playa
+""".split())
+
+# Phrases that introduce a name, strongest first
+INTRODUCTION_PATTERN = re.compile(
+    r"\b(me llamo|mi nombre es|soy|me dicen|le escribe|te escribe|habla|aqui)\s+([a-zñ]+)"
+)
+EXPLICIT_INTRODUCTIONS = {'me llamo', 'mi nombre es', 'me dicen'}
+GREETING_PREFIX = re.compile(r"^(?:(?:hola|buenas tardes|buenas noches|buenos dias|buenas|que tal|si|claro|ok)\b[\s,.!]*)+")
+WORD_PATTERN = re.compile(r"[a-zñ]+")
+
+def _fold(text):
+    """Lowercase and strip accents (keeping ñ) so names compare regardless of spelling."""
+    text = text.lower().replace('ñ', '\0')
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).replace('\0', 'ñ')
+
+def _original_word(incoming_msg, folded_word):
+    """Return the word of incoming_msg whose folded form is folded_word, keeping its accents."""
+    for word in re.findall(r"[A-Za-zÁÉÍÓÚÜÑáéíóúüñ]+", incoming_msg):
+        if _fold(word) == folded_word:
+            return word
+    return folded_word
+
+def _format(name):
+    return name[:1].upper() + name[1:].lower()
+
+def name_from_profile(profile_name):
+    """Return the first name in a WhatsApp ProfileName, or None if it does not look like a name."""
+    if not profile_name:
+        return None
+    words = profile_name.strip().split()
+    letters = re.sub(r"[^A-Za-zÁÉÍÓÚÜÑáéíóúüñ]", '', words[0]) if words else ''
+    if len(letters) < 2 or _fold(letters) in NON_NAMES:
+        return None
+    return _format(letters)
+
+def extract_name(incoming_msg, profile_name=None):
+    """Extract a first name from a message without calling the LLM.
+
+    Returns a tuple (name, ambiguous). name is None when no name was found;
+    ambiguous is True when the message may contain a name the rules cannot
+    confirm, in which case the caller can fall back to the LLM.
+    """
+    if not incoming_msg:
+        return None, False
+    text = _fold(incoming_msg.strip())
+    profile_first = name_from_profile(profile_name)
+    profile_key = _fold(profile_first) if profile_first else None
+
+    def resolve(word):
+        original = _original_word(incoming_msg, word)
+        # Take accents from the ProfileName when the client typed the same name without them
+        if profile_key and word == profile_key and original.lower() == word:
+            return profile_first
+        return _format(original)
+
+    match = INTRODUCTION_PATTERN.search(text)
+    if match:
+        phrase, word = match.groups()
+        if word in NON_NAMES:
+            return None, phrase in EXPLICIT_INTRODUCTIONS
+        if phrase in EXPLICIT_INTRODUCTIONS or word in FIRST_NAMES or word == profile_key:
+            return resolve(word), False
+        return None, True  # "soy arquitecto", "habla Pepe"...
+
+    # A short reply to "¿me dices tu nombre?" is usually the bare name
+    words = WORD_PATTERN.findall(GREETING_PREFIX.sub('', text))
+    if not words or len(words) > 3 or '?' in text:
+        return None, False
+    first = words[0]
+    if first in FIRST_NAMES or first == profile_key:
+        return resolve(first), False
+    if first in NON_NAMES or any(word in NON_NAMES for word in words):
+        return None, False
+    return None, True
@@ -0,0 +1,90 @@
+import itertools
+import logging
+import threading
+from collections import deque
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Two FIFO queues of (seq, phone): priority clients are always served first.
+# _entries maps phone -> (seq, is_priority) for the live entry; queue items whose
+# seq no longer matches were answered or re-queued and are dropped lazily.
+_priority_queue = deque()
+_normal_queue = deque()
+_entries = {}
+_counter = itertools.count()
+_lock = threading.Lock()
+
+def add(phone, priority=False):
+    """Queue the pending question of a client (re-queues it if already present)."""
+    with _lock:
+        seq = next(_counter)
+        _entries[phone] = (seq, bool(priority))
+        (_priority_queue if priority else _normal_queue).append((seq, phone))
+    logger.debug(f"Queued pending question from {phone} (priority={bool(priority)})")
+
+def remove(phone):
+    """Drop the pending question of a client once it has been answered."""
+    with _lock:
+        if _entries.pop(phone, None) is not None:
+            logger.debug(f"Removed pending question from {phone}")
+
+def set_priority(phone, priority):
+    """Move a queued client between the priority and normal queues."""
+    with _lock:
+        entry = _entries.get(phone)
+        if entry is None or entry[1] == bool(priority):
+            return
+    add(phone, priority)
+
+def _head(queue):
+    while queue:
+        seq, phone = queue[0]
+        entry = _entries.get(phone)
+        if entry is not None and entry[0] == seq:
+            return phone
+        queue.popleft()
+    return None
+
+def peek():
+    """Return the phone of the next question the gerente should answer, or None."""
+    with _lock:
+        return _head(_priority_queue) or _head(_normal_queue)
+
+def pending_phones():
+    """Return the queued client phones in answering order."""
+    with _lock:
+        ordered = []
+        for queue in (_priority_queue, _normal_queue):
+            for seq, phone in queue:
+                entry = _entries.get(phone)
+                if entry is not None and entry[0] == seq:
+                    ordered.append(phone)
+        return ordered
+
+def count():
+    """Return the number of pending questions."""
+    with _lock:
+        return len(_entries)
+
+def rebuild(conversation_state):
+    """Rebuild the queues from a freshly loaded conversation state."""
+    pending = [
+        (conversation_state[phone].get('pending_response_time') or 0, phone, conversation_state[phone].get('priority', False))
+        for phone in conversation_state.pending_clients()
+    ]
+    pending.sort()
+    # Build the new queues first so readers never see them empty or half-filled
+    priority_queue, normal_queue, entries = deque(), deque(), {}
+    for _, phone, priority in pending:
+        seq = next(_counter)
+        entries[phone] = (seq, bool(priority))
+        (priority_queue if priority else normal_queue).append((seq, phone))
+    with _lock:
+        _priority_queue.clear()
+        _priority_queue.extend(priority_queue)
+        _normal_queue.clear()
+        _normal_queue.extend(normal_queue)
+        _entries.clear()
+        _entries.update(entries)
+    logger.debug(f"Rebuilt pending question queues ({len(entries)} questions)")
@@ -0,0 +1,37 @@
+import re
+import bot_config
+
+# Digit runs that look like phone numbers: optional whatsapp:/+ prefix, 10-15 digits
+# possibly separated by spaces, dots, dashes or parentheses.
+PHONE_PATTERN = re.compile(r'(?:whatsapp:)?\+?\(?\d[\d\s().-]{8,18}\d')
+NON_DIGITS = re.compile(r'\D')
+
+def normalize_phone(raw):
+    """Return the canonical E.164 form of a phone number (e.g. '+529981234567'), or None.
+
+    Accepts WhatsApp keys ('whatsapp:+5219981234567'), numbers with separators and
+    national numbers. Mexican mobile numbers are folded to +52 plus ten digits,
+    dropping the legacy '1' that WhatsApp still sends for many of them.
+    """
+    if not raw:
+        return None
+    # Conversation keys ('whatsapp:+' and digits) skip the regex
+    digits = raw[10:] if raw.startswith('whatsapp:+') and raw[10:].isdigit() else NON_DIGITS.sub('', raw)
+    country_code = bot_config.DEFAULT_COUNTRY_CODE
+    national_length = bot_config.NATIONAL_NUMBER_LENGTH
+    if len(digits) == national_length:
+        digits = country_code + digits
+    elif country_code == "52" and len(digits) == national_length + 3 and digits.startswith("521"):
+        digits = "52" + digits[3:]
+    if not 10 <= len(digits) <= 15:
+        return None
+    return f"+{digits}"
+
+def extract_phone_numbers(text):
+    """Return the canonical numbers of every phone-like sequence in text, in order."""
+    numbers = []
+    for match in PHONE_PATTERN.finditer(text or ''):
+        number = normalize_phone(match.group(0))
+        if number and number not in numbers:
+            numbers.append(number)
+    return numbers
@@ -0,0 +1,160 @@
+import re
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import bot_config
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# "Campo: valor" lines of a plain-text project sheet
+FIELD_PATTERN = re.compile(r'^[ \t]*([A-Za-zÁÉÍÓÚáéíóúñÑ]+)[ \t]*:[ \t]*(.*?)[ \t]*$', re.MULTILINE)
+# "Unidad A $2,900,000" or "Estudio: $2,900,000" inside a Precios line
+PRICE_PATTERN = re.compile(r'([^\s$,:;][^$,:;]*?)[ \t]*:?[ \t]*\$[ \t]*(\d[\d,]*)')
+LIST_SEPARATOR = re.compile(r'\s*[,;]\s*')
+AMOUNT_PATTERN = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+# Sheet labels (lowercase, without accents) and the project fields they fill
+TEXT_FIELDS = {
+    'nombre': 'name',
+    'descripcion': 'description',
+    'tipo': 'type',
+    'ubicacion': 'location',
+    'precios': 'prices',
+    'amenidades': 'amenities',
+}
+
+class ProjectValidationError(ValueError):
+    """A project file that cannot be turned into a Project."""
+
+@dataclass(frozen=True)
+class Project:
+    """A parsed project; projects_data holds the to_dict() form that prompts read."""
+
+    key: str
+    name: str
+    description: Optional[str] = None
+    type: Optional[str] = None
+    location: Optional[str] = None
+    prices: Dict[str, int] = field(default_factory=dict)
+    amenities: List[str] = field(default_factory=list)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = dict(self.extra)
+        data['name'] = self.name
+        for name in ('description', 'type', 'location'):
+            value = getattr(self, name)
+            if value:
+                data[name] = value
+        if self.prices:
+            data['prices'] = dict(self.prices)
+        if self.amenities:
+            data['amenities'] = list(self.amenities)
+        return data
+
+def _fold(label):
+    decomposed = unicodedata.normalize('NFKD', label.strip().lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def _text(value, key, field_name):
+    if value is None:
+        return None
+    if isinstance(value, (str, int, float)):
+        return str(value).strip() or None
+    raise ProjectValidationError(f"{key}: '{field_name}' must be text, got {type(value).__name__}")
+
+def _amount(value, key, unit):
+    if isinstance(value, bool):
+        raise ProjectValidationError(f"{key}: price of '{unit}' must be a number")
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = AMOUNT_PATTERN.search(str(value))
+    if not match:
+        raise ProjectValidationError(f"{key}: price of '{unit}' is not a number: {value!r}")
+    return int(float(match.group(0).replace(',', '')))
+
+def _prices(value, key):
+    if not value:
+        return {}
+    if isinstance(value, str):
+        return {unit.strip(): int(amount.replace(',', '')) for unit, amount in PRICE_PATTERN.findall(value)}
+    if not isinstance(value, dict):
+        raise ProjectValidationError(f"{key}: 'prices' must be an object of unit -> price")
+    return {str(unit): _amount(amount, key, unit) for unit, amount in value.items()}
+
+def _amenities(value, key):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [item for item in LIST_SEPARATOR.split(value.strip()) if item]
+    if not isinstance(value, list):
+        raise ProjectValidationError(f"{key}: 'amenities' must be a list")
+    return [str(item).strip() for item in value if str(item).strip()]
+
+def project_from_dict(data, key):
+    """Validate a project object (from JSON or a parsed sheet) and build a Project."""
+    if not isinstance(data, dict):
+        raise ProjectValidationError(f"{key}: a project must be an object, got {type(data).__name__}")
+    known = {'name', 'description', 'type', 'location', 'prices', 'amenities'}
+    return Project(
+        key=key,
+        name=_text(data.get('name'), key, 'name') or key,
+        description=_text(data.get('description'), key, 'description'),
+        type=_text(data.get('type'), key, 'type'),
+        location=_text(data.get('location'), key, 'location'),
+        prices=_prices(data.get('prices'), key),
+        amenities=_amenities(data.get('amenities'), key),
+        extra={name: value for name, value in data.items() if name not in known},
+    )
+
+def parse_project_text(content, key):
+    """Parse a plain-text project sheet (Nombre, Descripción, Tipo, Ubicación, Precios, Amenidades)."""
+    data = {}
+    for label, value in FIELD_PATTERN.findall(content):
+        field_name = TEXT_FIELDS.get(_fold(label))
+        if field_name and field_name not in data:
+            data[field_name] = value
+    return project_from_dict(data, key)
+
+def parse_project(filename, content, key):
+    """Parse a project file by extension (.json or .txt sheet)."""
+    if filename.endswith('.json'):
+        try:
+            data = json.loads(content)
+        except ValueError as e:
+            raise ProjectValidationError(f"{key}: invalid JSON: {str(e)}") from e
+        return project_from_dict(data, key)
+    return parse_project_text(content, key)
+
+# Parsed projects keyed by (content hash, extension, key); a reload only parses files that changed
+_cache = OrderedDict()
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0}
+
+def load_project(filename, content, key):
+    """Return the projects_data entry for a project file, parsing each distinct content once."""
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    cache_key = (digest, filename.endswith('.json'), key)
+    with _lock:
+        project = _cache.get(cache_key)
+        if project is not None:
+            _cache.move_to_end(cache_key)
+            stats['hits'] += 1
+            return project.to_dict()
+    project = parse_project(filename, content, key)
+    with _lock:
+        stats['misses'] += 1
+        _cache[cache_key] = project
+        while len(_cache) > bot_config.PROJECT_PARSE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return project.to_dict()
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,141 @@
+import logging
+import functools
+import bot_config
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Average characters per token for Spanish text when no tokenizer is available
+CHARS_PER_TOKEN = 3.5
+TRUNCATION_MARKER = " [...]"
+
+# Token usage per call: call -> counters
+usage_stats = {}
+
+def _call_stats(call):
+    return usage_stats.setdefault(call, {
+        'calls': 0, 'prompt_tokens': 0, 'truncations': 0,
+        'api_prompt_tokens': 0, 'api_cached_tokens': 0, 'api_completion_tokens': 0
+    })
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    """Return the tokenizer for the configured model, or None if it is not available."""
+    if tiktoken is None:
+        logger.warning(f"tiktoken is not installed; estimating token counts at {CHARS_PER_TOKEN} characters per token")
+        return None
+    try:
+        return tiktoken.encoding_for_model(bot_config.CHATGPT_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable, estimating token counts at {CHARS_PER_TOKEN} characters per token: {str(e)}")
+        return None
+
+def init_tokenizer():
+    """Load the tokenizer at startup; logs once if token counts will be estimated. Returns True if exact."""
+    return _encoding() is not None
+
+@functools.lru_cache(maxsize=512)
+def count_tokens(text):
+    """Return the number of tokens in text for the configured model (estimated without tiktoken)."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+def truncate_tokens(text, budget):
+    """Keep the beginning of text within budget tokens, cutting at a word boundary."""
+    if count_tokens(text) <= budget:
+        return text
+    encoding = _encoding()
+    marker_tokens = count_tokens(TRUNCATION_MARKER)
+    if encoding is not None:
+        kept = encoding.decode(encoding.encode(text)[:max(budget - marker_tokens, 0)])
+    else:
+        kept = text[:int(max(budget - marker_tokens, 0) * CHARS_PER_TOKEN)]
+    if ' ' in kept:
+        kept = kept.rsplit(' ', 1)[0]
+    return kept.rstrip() + TRUNCATION_MARKER
+
+def truncate_history(history, budget):
+    """Keep the most recent lines of a newline-joined history within budget tokens."""
+    if count_tokens(history) <= budget:
+        return history
+    kept = []
+    remaining = budget
+    for line in reversed(history.split('\n')):
+        tokens = count_tokens(line) + 1  # Newline
+        if tokens > remaining:
+            if not kept:
+                kept.append(truncate_tokens(line, remaining))
+            break
+        kept.append(line)
+        remaining -= tokens
+    return '\n'.join(reversed(kept))
+
+def fit_section(section, text):
+    """Truncate text to the token budget configured for section."""
+    budget = bot_config.PROMPT_TOKEN_BUDGETS[section]
+    if section.endswith('history'):
+        return truncate_history(text, budget)
+    return truncate_tokens(text, budget)
+
+def build_prompt(call, sections):
+    """Assemble a prompt from (section, text) pairs within per-section token budgets.
+
+    Sections named None are fixed instructions and are never truncated; the
+    others are cut deterministically to PROMPT_TOKEN_BUDGETS[section]. Token
+    usage per section is recorded in usage_stats under call.
+    """
+    parts = []
+    section_tokens = {}
+    truncated = []
+    for section, text in sections:
+        text = str(text)
+        if section is not None:
+            fitted = fit_section(section, text)
+            if fitted != text:
+                truncated.append(section)
+            text = fitted
+        key = section or 'instructions'
+        section_tokens[key] = section_tokens.get(key, 0) + count_tokens(text)
+        parts.append(text)
+    prompt = ''.join(parts)
+
+    stats = _call_stats(call)
+    stats['calls'] += 1
+    stats['prompt_tokens'] += sum(section_tokens.values())
+    stats['truncations'] += len(truncated)
+    logger.debug(f"Prompt for {call}: {sum(section_tokens.values())} tokens {section_tokens}, truncated: {truncated}")
+    return prompt
+
+def record_api_usage(call, response):
+    """Add the token usage reported by an OpenAI response to usage_stats under call."""
+    usage = getattr(response, 'usage', None)
+    prompt_tokens = getattr(usage, 'prompt_tokens', None)
+    completion_tokens = getattr(usage, 'completion_tokens', None)
+    if not isinstance(prompt_tokens, int):
+        return
+    stats = _call_stats(call)
+    stats['api_prompt_tokens'] += prompt_tokens
+    stats['api_completion_tokens'] += completion_tokens if isinstance(completion_tokens, int) else 0
+    # Prompt tokens served from the provider's prefix cache
+    cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+    if isinstance(cached_tokens, int):
+        stats['api_cached_tokens'] += cached_tokens
+    logger.debug(f"OpenAI usage for {call}: prompt={prompt_tokens}, cached={cached_tokens}, completion={completion_tokens}")
+
+def cached_token_ratio(call):
+    """Return the share of API prompt tokens for call that were served from the provider cache."""
+    stats = usage_stats.get(call)
+    if not stats or not stats['api_prompt_tokens']:
+        return 0.0
+    return stats['api_cached_tokens'] / stats['api_prompt_tokens']
@@ -1,9 +1,13 @@
 import logging
 import json
+import time
 from datetime import datetime, timedelta
 import pytz
 import bot_config
 import utils
+import scheduler
+import report_handler
+import timestamps
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +50,169 @@ def send_template_message(phone, client_name, project, client):
         logger.error(f"Error sending template message to {phone}: {str(e)}")
         return False
 
+def next_recontact_time(state):
+    """Return the datetime (CST) at which the client is due for recontact, or None.
+
+    Each attempt since the client's last response pushes the next one RECONTACT_MIN_DAYS
+    later, so rescheduling from the saved state never repeats a recontact.
+    """
+    if state.get('is_gerente', False) or state.get('no_interest', False):
+        return None
+
+    last_response = timestamps.to_epoch(state.get('last_response_time'))
+    if last_response is None:
+        return None
+
+    days = bot_config.RECONTACT_MIN_DAYS * (state.get('recontact_attempts', 0) + 1)
+    recontact_time = timestamps.to_datetime(last_response) + timedelta(days=days)
+    return recontact_time.replace(
+        hour=bot_config.RECONTACT_HOUR_CST, minute=bot_config.RECONTACT_MINUTE_CST, second=0, microsecond=0
+    )
+
+def recontact_client(phone, conversation_state, client, utils):
+    """Send the follow-up message to a single client and save the conversation."""
+    state = conversation_state[phone]
+    if state.get('recontact_attempts', 0) >= 3:
+        logger.debug(f"Marking {phone} as no interest: Max recontact attempts reached")
+        state['no_interest'] = True
+        utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+        return False
+
+    if check_whatsapp_window(phone, client):
+        logger.debug(f"{phone} is within 24-hour window")
+        client_name = state.get('client_name', 'Cliente')
+        last_mentioned_project = state.get('last_mentioned_project', 'uno de nuestros proyectos')
+        messages = [
+            f"Hola {client_name}, soy Giselle de FAV Living. Quería dar seguimiento a nuestra conversación sobre {last_mentioned_project}.",
+            "¿Te gustaría saber más detalles o prefieres que hagas un análisis financiero de la inversión?"
+        ]
+
+        utils.send_consecutive_messages(phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
+        for msg in messages:
+            state['history'].append(f"Giselle: {msg}")
+    else:
+        logger.debug(f"{phone} is outside 24-hour window, sending template message")
+        client_name = state.get('client_name', 'Cliente')
+        last_mentioned_project = state.get('last_mentioned_project', 'uno de nuestros proyectos')
+        if send_template_message(phone, client_name, last_mentioned_project, client):
+            state['history'].append(f"Giselle: [Template] Hola {client_name}, soy Giselle de FAV Living. Quería dar seguimiento a nuestra conversación sobre {last_mentioned_project}.")
+        else:
+            logger.error(f"Failed to send template message to {phone}")
+
+    state['recontact_attempts'] = state.get('recontact_attempts', 0) + 1
+    state['schedule_next'] = None
+
+    utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+    return True
+
+def send_weekly_report(gerente_phone, conversation_state, client, utils, generate_detailed_report, current_time):
+    """Send the weekly report to a gerente unless one was sent in the last 7 days."""
+    gerente_state = conversation_state[gerente_phone]
+    last_report = timestamps.to_epoch(gerente_state.get('last_weekly_report'))
+    if last_report is not None and current_time.timestamp() - last_report < 7 * 24 * 3600:
+        return False
+
+    report_messages = generate_detailed_report(conversation_state)
+    utils.send_consecutive_messages(gerente_phone, report_messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
+    gerente_state['last_weekly_report'] = current_time.timestamp()
+    utils.save_conversation(gerente_phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+    return True
+
+def next_weekly_report_time(current_time):
+    """Return the next WEEKLY_REPORT_DAY at WEEKLY_REPORT_TIME (CST) after current_time."""
+    hour, minute = (int(part) for part in bot_config.WEEKLY_REPORT_TIME.split(':'))
+    candidate = current_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    for _ in range(8):
+        if candidate.strftime('%A') == bot_config.WEEKLY_REPORT_DAY and candidate > current_time:
+            return candidate
+        candidate += timedelta(days=1)
+    return candidate
+
+def run_recontact_job(phone, conversation_state, client, utils):
+    """Scheduler job: recontact a single client once their follow-up is due."""
+    state = conversation_state.get(phone)
+    if not state:
+        return
+    try:
+        recontact_time = next_recontact_time(state)
+    except ValueError as e:
+        logger.error(f"Invalid last_response_time format for {phone}: {state.get('last_response_time')}, error: {str(e)}")
+        return
+    if recontact_time is None:
+        return
+    if recontact_time.timestamp() > time.time():
+        # The client wrote again since the job was scheduled
+        scheduler.schedule_job(f"recontact:{phone}", recontact_time.timestamp(), run_recontact_job, phone, conversation_state, client, utils)
+        return
+    if recontact_client(phone, conversation_state, client, utils):
+        schedule_client_jobs(phone, conversation_state, client, utils)
+
+def run_reminder_job(phone, conversation_state, client, utils):
+    """Scheduler job: send the reminder before the WhatsApp 24-hour window closes."""
+    state = conversation_state.get(phone)
+    if not state or state.get('is_gerente', False) or state.get('no_interest', False) or state.get('reminder_sent', False):
+        return
+    last_incoming = timestamps.to_epoch(state.get('last_incoming_time'))
+    if last_incoming is None:
+        return
+
+    time_since_last_incoming = (time.time() - last_incoming) / 3600
+    if time_since_last_incoming < bot_config.REMINDER_AFTER_HOURS:
+        reminder_time = last_incoming + bot_config.REMINDER_AFTER_HOURS * 3600
+        scheduler.schedule_job(f"reminder:{phone}", reminder_time, run_reminder_job, phone, conversation_state, client, utils)
+        return
+    if time_since_last_incoming >= bot_config.REMINDER_WINDOW_HOURS:
+        logger.debug(f"Skipping reminder for {phone}: 24-hour window already closed")
+        return
+
+    reminder = [
+        f"Hola {state.get('client_name', 'Cliente')}, ha pasado un tiempo desde nuestro último mensaje.",
+        "¿Tienes alguna pregunta o quieres más detalles?"
+    ]
+    utils.send_consecutive_messages(phone, reminder, client, bot_config.WHATSAPP_SENDER_NUMBER)
+    state['history'].extend([f"Giselle: {msg}" for msg in reminder])
+    state['reminder_sent'] = True
+    utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+
+def run_weekly_report_job(conversation_state, client, utils):
+    """Scheduler job: send the weekly report to every gerente and schedule the next one."""
+    current_time = datetime.now(CST_TIMEZONE)
+    try:
+        for gerente_phone in conversation_state.gerentes():
+            send_weekly_report(gerente_phone, conversation_state, client, utils, report_handler.generate_detailed_report, current_time)
+    finally:
+        scheduler.schedule_job("weekly_report", next_weekly_report_time(current_time).timestamp(), run_weekly_report_job, conversation_state, client, utils)
+
+def schedule_client_jobs(phone, conversation_state, client, utils=utils):
+    """(Re)schedule the recontact and reminder jobs of a client after new activity."""
+    state = conversation_state.get(phone)
+    if not state or state.get('is_gerente', False):
+        return
+    if state.get('no_interest', False):
+        scheduler.cancel_job(f"recontact:{phone}")
+        scheduler.cancel_job(f"reminder:{phone}")
+        return
+
+    try:
+        recontact_time = next_recontact_time(state)
+        if recontact_time is not None:
+            scheduler.schedule_job(f"recontact:{phone}", recontact_time.timestamp(), run_recontact_job, phone, conversation_state, client, utils)
+
+        last_incoming = timestamps.to_epoch(state.get('last_incoming_time'))
+        if last_incoming is not None and not state.get('reminder_sent', False):
+            reminder_time = last_incoming + bot_config.REMINDER_AFTER_HOURS * 3600
+            scheduler.schedule_job(f"reminder:{phone}", reminder_time, run_reminder_job, phone, conversation_state, client, utils)
+    except ValueError as e:
+        logger.error(f"Invalid timestamp in state for {phone}, jobs not scheduled: {str(e)}")
+
+def schedule_all_jobs(conversation_state, client, utils=utils):
+    """Seed the scheduler from the loaded conversation state."""
+    for phone in list(conversation_state.keys()):
+        schedule_client_jobs(phone, conversation_state, client, utils)
+    current_time = datetime.now(CST_TIMEZONE)
+    scheduler.schedule_job("weekly_report", next_weekly_report_time(current_time).timestamp(), run_weekly_report_job, conversation_state, client, utils)
+    logger.info(f"Scheduled recontact, reminder and weekly report jobs for {len(conversation_state)} conversations")
+
 def trigger_recontact(conversation_state, client, utils, generate_detailed_report):
     logger.info("Triggering recontact scheduling")
     current_time = datetime.now(CST_TIMEZONE)
@@ -58,86 +225,22 @@ def trigger_recontact(conversation_state, client, utils, generate_detailed_repor
         hour=bot_config.RECONTACT_HOUR_CST, minute=bot_config.RECONTACT_MINUTE_CST, second=0, microsecond=0
     ) + timedelta(minutes=bot_config.RECONTACT_TOLERANCE_MINUTES)
 
-    for phone, state in list(conversation_state.items()):
-        logger.debug(f"Processing client: {phone}")
-        if state.get('is_gerente', False):
-            logger.debug(f"Skipping {phone}: Is gerente")
-            continue
-        if state.get('no_interest', False):
-            logger.debug(f"Skipping {phone}: No interest")
-            continue
-
-        last_response_time = state.get('last_response_time')
-        logger.debug(f"Last response time for {phone}: {last_response_time}")
-        if not last_response_time:
-            logger.debug(f"Skipping {phone}: No last response time")
-            continue
-
-        try:
-            last_response = datetime.fromisoformat(last_response_time).astimezone(CST_TIMEZONE)
-        except ValueError as e:
-            logger.error(f"Invalid last_response_time format for {phone}: {last_response_time}, error: {str(e)}")
-            continue
-
-        recontact_time = last_response + timedelta(days=bot_config.RECONTACT_MIN_DAYS)
-        recontact_time = recontact_time.replace(
-            hour=bot_config.RECONTACT_HOUR_CST, minute=bot_config.RECONTACT_MINUTE_CST, second=0, microsecond=0
-        )
-        logger.debug(f"Scheduled recontact time for {phone}: {recontact_time}")
-
-        if not (recontact_window_start <= current_time <= recontact_window_end):
-            logger.debug(f"Skipping {phone}: Current time {current_time} is outside recontact window ({recontact_window_start} to {recontact_window_end})")
-            continue
-
-        if recontact_time.date() != current_time.date():
-            logger.debug(f"Skipping {phone}: Recontact date {recontact_time.date()} does not match today {current_time.date()}")
-            continue
-
-        if state.get('recontact_attempts', 0) >= 3:
-            logger.debug(f"Marking {phone} as no interest: Max recontact attempts reached")
-            state['no_interest'] = True
-            continue
-
-        if check_whatsapp_window(phone, client):
-            logger.debug(f"{phone} is within 24-hour window")
-            client_name = state.get('client_name', 'Cliente')
-            last_mentioned_project = state.get('last_mentioned_project', 'uno de nuestros proyectos')
-            messages = [
-                f"Hola {client_name}, soy Giselle de FAV Living. Quería dar seguimiento a nuestra conversación sobre {last_mentioned_project}.",
-                "¿Te gustaría saber más detalles o prefieres que hagas un análisis financiero de la inversión?"
-            ]
-
-            utils.send_consecutive_messages(phone, messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
-            for msg in messages:
-                state['history'].append(f"Giselle: {msg}")
-        else:
-            logger.debug(f"{phone} is outside 24-hour window, sending template message")
-            client_name = state.get('client_name', 'Cliente')
-            last_mentioned_project = state.get('last_mentioned_project', 'uno de nuestros proyectos')
-            if send_template_message(phone, client_name, last_mentioned_project, client):
-                state['history'].append(f"Giselle: [Template] Hola {client_name}, soy Giselle de FAV Living. Quería dar seguimiento a nuestra conversación sobre {last_mentioned_project}.")
-            else:
-                logger.error(f"Failed to send template message to {phone}")
-
-        state['recontact_attempts'] = state.get('recontact_attempts', 0) + 1
-        state['schedule_next'] = None
-
-        utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
-
-    for gerente_phone, gerente_state in list(conversation_state.items()):
-        if not gerente_state.get('is_gerente', False):
-            continue
-
-        last_report = gerente_state.get('last_weekly_report')
-        if last_report:
-            last_report_time = datetime.fromisoformat(last_report).astimezone(CST_TIMEZONE)
-            if (current_time - last_report_time).days < 7:
+    if not (recontact_window_start <= current_time <= recontact_window_end):
+        logger.debug(f"Skipping recontacts: Current time {current_time} is outside recontact window ({recontact_window_start} to {recontact_window_end})")
+    else:
+        # A client is due today when their last response was RECONTACT_MIN_DAYS days ago (CST)
+        due_day = timestamps.day_number(current_time.timestamp()) - bot_config.RECONTACT_MIN_DAYS
+        for phone in conversation_state.by_day('last_response_time', due_day):
+            state = conversation_state[phone]
+            logger.debug(f"Processing client: {phone}")
+            if state.get('is_gerente', False) or state.get('no_interest', False):
+                logger.debug(f"Skipping {phone}: Gerente or no interest")
                 continue
+            recontact_client(phone, conversation_state, client, utils)
 
+    for gerente_phone in conversation_state.gerentes():
         if current_time.strftime('%A') == bot_config.WEEKLY_REPORT_DAY and current_time.strftime('%H:%M') >= bot_config.WEEKLY_REPORT_TIME:
-            report_messages = generate_detailed_report(conversation_state)
-            utils.send_consecutive_messages(gerente_phone, report_messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
-            gerente_state['last_weekly_report'] = current_time.isoformat()
+            send_weekly_report(gerente_phone, conversation_state, client, utils, generate_detailed_report, current_time)
 
     logger.info("Recontact scheduling completed")
     return "Recontact scheduling triggered"
@@ -1,14 +1,102 @@
+import io
+import os
 import logging
 import json
 from datetime import datetime, timedelta
 import pytz
+import pandas as pd
+from google.cloud import storage
 import bot_config
 import utils
+import timestamps
 
 logger = logging.getLogger(__name__)
 
 CST_TIMEZONE = pytz.timezone("America/Mexico_City")
 
+# WhatsApp rejects bodies over 1600 characters; report lines are packed into messages below that
+REPORT_MESSAGE_MAX_CHARS = 1500
+
+def report_clients(conversation_state, stage_filter=None, interest_filter=None):
+    """Return the phones of interested clients, optionally in stage_filter and with at least interest_filter."""
+    phones = conversation_state.interested_clients()
+    if stage_filter:
+        in_stage = set(conversation_state.by_stage(stage_filter))
+        phones = [phone for phone in phones if phone in in_stage]
+    if interest_filter is not None:
+        phones = [phone for phone in phones if (conversation_state[phone].get('interest_level') or 0) >= interest_filter]
+    return phones
+
+def _pack_lines(lines):
+    messages = []
+    current = ""
+    for line in lines:
+        if current and len(current) + 1 + len(line) > REPORT_MESSAGE_MAX_CHARS:
+            messages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages
+
+def generate_detailed_report(conversation_state, stage_filter=None, interest_filter=None):
+    """Build the gerente's report of interested clients as WhatsApp messages."""
+    phones = report_clients(conversation_state, stage_filter, interest_filter)
+    filters = []
+    if stage_filter:
+        filters.append(f"etapa {stage_filter}")
+    if interest_filter is not None:
+        filters.append(f"interés mínimo {interest_filter}")
+    title = "Reporte de clientes interesados" + (f" ({', '.join(filters)})" if filters else "") + f": {len(phones)}"
+    if not phones:
+        return [title, "No hay clientes que coincidan con el reporte."]
+
+    lines = [title]
+    for phone in phones:
+        state = conversation_state[phone]
+        lines.append(
+            f"- {state.get('client_name') or 'Desconocido'} ({phone}): "
+            f"Etapa: {state.get('stage') or 'No especificada'}, "
+            f"Interés: {state.get('interest_level') or 0}/10, "
+            f"Proyecto: {state.get('last_mentioned_project') or 'Ninguno'}, "
+            f"Presupuesto: {state.get('client_budget') or 'No especificado'}, "
+            f"Último contacto: {timestamps.format_timestamp(state.get('last_contact'))}"
+        )
+    return _pack_lines(lines)
+
+def leads_dataframe(conversation_state):
+    """Return one row per client for the leads spreadsheet."""
+    rows = []
+    for phone in conversation_state.clients():
+        state = conversation_state[phone]
+        rows.append({
+            'Teléfono': phone,
+            'Nombre': state.get('client_name') or 'Desconocido',
+            'Etapa': state.get('stage') or '',
+            'Interés': state.get('interest_level') or 0,
+            'Proyecto': state.get('last_mentioned_project') or '',
+            'Presupuesto': state.get('client_budget') or '',
+            'Necesidades': state.get('needs') or '',
+            'Prioritario': bool(state.get('priority', False)),
+            'Sin interés': bool(state.get('no_interest', False)),
+            'Último contacto': timestamps.format_timestamp(state.get('last_contact'), default=''),
+        })
+    return pd.DataFrame(rows)
+
+def update_leads_excel(conversation_state):
+    """Write every client to LEADS_EXCEL_PATH in the conversations folder in GCS."""
+    try:
+        buffer = io.BytesIO()
+        leads_dataframe(conversation_state).to_excel(buffer, index=False, sheet_name='Leads')
+        storage_client = storage.Client()
+        bucket = storage_client.bucket(bot_config.GCS_BUCKET_NAME)
+        blob = bucket.blob(os.path.join(bot_config.GCS_CONVERSATIONS_PATH, bot_config.LEADS_EXCEL_PATH))
+        blob.upload_from_string(buffer.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        logger.info(f"Leads spreadsheet updated in GCS ({len(conversation_state)} conversations)")
+    except Exception as e:
+        logger.error(f"Failed to update leads spreadsheet: {str(e)}")
+
 def check_whatsapp_window(phone, client):
     if client is None:
         logger.error("Twilio client not initialized, cannot check WhatsApp window.")
@@ -74,7 +162,7 @@ def trigger_recontact(conversation_state, client, utils, generate_detailed_repor
             continue
 
         try:
-            last_response = datetime.fromisoformat(last_response_time).astimezone(CST_TIMEZONE)
+            last_response = timestamps.to_datetime(timestamps.to_epoch(last_response_time))
         except ValueError as e:
             logger.error(f"Invalid last_response_time format for {phone}: {last_response_time}, error: {str(e)}")
             continue
@@ -128,16 +216,14 @@ def trigger_recontact(conversation_state, client, utils, generate_detailed_repor
         if not gerente_state.get('is_gerente', False):
             continue
 
-        last_report = gerente_state.get('last_weekly_report')
-        if last_report:
-            last_report_time = datetime.fromisoformat(last_report).astimezone(CST_TIMEZONE)
-            if (current_time - last_report_time).days < 7:
-                continue
+        last_report = timestamps.to_epoch(gerente_state.get('last_weekly_report'))
+        if last_report is not None and current_time.timestamp() - last_report < 7 * 24 * 3600:
+            continue
 
         if current_time.strftime('%A') == bot_config.WEEKLY_REPORT_DAY and current_time.strftime('%H:%M') >= bot_config.WEEKLY_REPORT_TIME:
             report_messages = generate_detailed_report(conversation_state)
             utils.send_consecutive_messages(gerente_phone, report_messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
-            gerente_state['last_weekly_report'] = current_time.isoformat()
+            gerente_state['last_weekly_report'] = current_time.timestamp()
 
     logger.info("Recontact scheduling completed")
     return "Recontact scheduling triggered"
@@ -1,4 +1,7 @@
-from flask import request
+import os
+import logging
+import functools
+from flask import request, jsonify
 from twilio.rest import Client
 import bot_config
 import utils
@@ -7,9 +10,15 @@ import gerente_handler
 import client_handler
 import report_handler
 import recontact_handler
-import pytz
-from datetime import datetime
+import phone_numbers
+import tracing
+import log_pipeline
+import metrics
+import activity
 import re
+import time
+
+logger = logging.getLogger(__name__)
 
 def init_routes(app, conversation_state):
     """Initialize Flask routes for the application.
@@ -17,6 +26,9 @@ def init_routes(app, conversation_state):
     Args:
         app (Flask): The Flask application instance.
         conversation_state (dict): The global conversation state dictionary.
+
+    Returns:
+        Client: The Twilio client shared by the routes, or None if not configured.
     """
     client = None
     try:
@@ -29,7 +41,13 @@ def init_routes(app, conversation_state):
         logger.error(f"Failed to initialize Twilio client: {str(e)}", exc_info=True)
         client = None
 
+    gerente_numbers = {phone_numbers.normalize_phone(number) for number in bot_config.GERENTE_NUMBERS}
+
+    # gerente_handler calls rephrase_gerente_response(answer, client_name, question)
+    rephrase_gerente_response = functools.partial(client_handler.rephrase_gerente_response, message_handler=message_handler)
+
     @app.route('/whatsapp', methods=['POST'])
+    @tracing.trace_request('whatsapp', lambda: request.values.get('MessageSid'))
     def whatsapp():
         """Handle incoming WhatsApp messages.
 
@@ -42,13 +60,12 @@ def init_routes(app, conversation_state):
                 logger.error("Twilio client not initialized. Cannot process WhatsApp messages.")
                 return "Error: Twilio client not initialized", 500
 
-            logger.debug("Cargando conversation state")
-            utils.load_conversation_state(conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
-            logger.debug("Conversation state reloaded")
+            logger.debug("Comprobando conversation state")
+            if utils.refresh_conversation_state(conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH):
+                logger.debug("Conversation state reloaded")
 
-            logger.debug(f"Request headers: {dict(request.headers)}")
-            logger.debug(f"Request form data: {request.form}")
-            logger.debug(f"Request values: {dict(request.values)}")
+            logger.debug("Request headers: %s", log_pipeline.summarize(request.headers))
+            logger.debug("Request values: %s", log_pipeline.summarize(request.values))
 
             logger.debug("Extracting message content")
             phone = request.values.get('From', '').strip()
@@ -63,8 +80,8 @@ def init_routes(app, conversation_state):
 
             logger.debug(f"From phone: {phone}, Message: {incoming_msg}, NumMedia: {num_media}, MediaUrl: {media_url}, ProfileName: {profile_name}")
 
-            normalized_phone = phone.replace("whatsapp:", "").strip()
-            is_gerente = normalized_phone in bot_config.GERENTE_NUMBERS
+            normalized_phone = phone_numbers.normalize_phone(phone)
+            is_gerente = normalized_phone in gerente_numbers
             logger.debug(f"Comparando número: phone='{phone}', normalized_phone='{normalized_phone}', GERENTE_NUMBERS={bot_config.GERENTE_NUMBERS}, is_gerente={is_gerente}")
 
             if is_gerente:
@@ -73,8 +90,8 @@ def init_routes(app, conversation_state):
                     conversation_state[phone] = {
                         'history': [],
                         'is_gerente': True,
-                        'last_contact': datetime.now(pytz.timezone("America/Mexico_City")).isoformat(),
-                        'last_incoming_time': datetime.now(pytz.timezone("America/Mexico_City")).isoformat(),
+                        'last_contact': time.time(),
+                        'last_incoming_time': time.time(),
                         'tasks': [],
                         'last_weekly_report': None,
                         'awaiting_menu_choice': False
@@ -85,7 +102,7 @@ def init_routes(app, conversation_state):
                 if incoming_msg:
                     return gerente_handler.handle_gerente_message(
                         phone, incoming_msg, conversation_state, client,
-                        client_handler.rephrase_gerente_response, report_handler.generate_detailed_report,
+                        rephrase_gerente_response, report_handler.generate_detailed_report,
                         report_handler.update_leads_excel, utils
                     )
                 elif num_media > 0 and media_url:
@@ -98,7 +115,7 @@ def init_routes(app, conversation_state):
                     if transcribed_msg:
                         return gerente_handler.handle_gerente_message(
                             phone, transcribed_msg, conversation_state, client,
-                            client_handler.rephrase_gerente_response, report_handler.generate_detailed_report,
+                            rephrase_gerente_response, report_handler.generate_detailed_report,
                             report_handler.update_leads_excel, utils
                         )
                 else:
@@ -110,13 +127,14 @@ def init_routes(app, conversation_state):
                 # Load conversation history to check if it exists
                 logger.debug("Cargando historial de conversación")
                 history = utils.load_conversation_history(phone, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
-                logger.debug(f"Historial cargado: {history}")
+                logger.debug("Historial cargado: %s", log_pipeline.summarize(history))
                 if not isinstance(history, list):
                     history = []
 
-                # Initialize or reset client state if there's no history or profile is incomplete
-                if phone not in conversation_state or not history or not is_profile_complete(conversation_state.get(phone, {})):
-                    logger.info(f"Initializing or resetting state for client {phone} due to no history or incomplete profile")
+                # Initialize client state for new clients or when there is no history;
+                # an incomplete profile is completed by the profiling questions below
+                if phone not in conversation_state or not history:
+                    logger.info(f"Initializing state for client {phone} due to no history")
                     conversation_state[phone] = {
                         'history': history,
                         'name_asked': 0,
@@ -125,13 +143,13 @@ def init_routes(app, conversation_state):
                         'preferred_days': None,
                         'client_name': None,
                         'client_budget': None,
-                        'last_contact': datetime.now(pytz.timezone("America/Mexico_City")).isoformat(),
+                        'last_contact': time.time(),
                         'recontact_attempts': 0,
                         'no_interest': False,
                         'schedule_next': None,
-                        'last_incoming_time': datetime.now(pytz.timezone("America/Mexico_City")).isoformat(),
-                        'last_response_time': datetime.now(pytz.timezone("America/Mexico_City")).isoformat(),
-                        'first_contact': datetime.now(pytz.timezone("America/Mexico_City")).isoformat(),
+                        'last_incoming_time': time.time(),
+                        'last_response_time': time.time(),
+                        'first_contact': time.time(),
                         'introduced': False,
                         'project_info_shared': {},
                         'last_mentioned_project': None,
@@ -146,6 +164,7 @@ def init_routes(app, conversation_state):
                         'zoom_scheduled': False,
                         'zoom_details': {},
                         'intention_history': [],
+                        'intention_counts': {},
                         'needs_asked': False,
                         'budget_asked': False,
                         'contact_time_asked': False,
@@ -155,14 +174,15 @@ def init_routes(app, conversation_state):
                     }
 
                 state = conversation_state[phone]
-                logger.debug(f"Estado del cliente: {state}")
+                logger.debug("Estado del cliente: %s", log_pipeline.summarize(state))
 
                 # Guardar el mensaje del cliente en el historial inmediatamente
                 if incoming_msg:
                     logger.debug(f"Guardando mensaje del cliente: {incoming_msg}")
                     state['history'].append(f"Cliente: {incoming_msg}")
-                    state['history'] = state['history'][-10]  # Mantener solo los últimos 10 mensajes
-                    state['last_incoming_time'] = datetime.now(pytz.timezone("America/Mexico_City")).isoformat()
+                    state['history'] = state['history'][-10:]  # Mantener solo los últimos 10 mensajes
+                    state['last_incoming_time'] = time.time()
+                    activity.record_message(state)
                     logger.debug("Antes de guardar conversación")
                     utils.save_conversation(phone, conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
                     logger.debug("Conversación guardada")
@@ -175,7 +195,7 @@ def init_routes(app, conversation_state):
                         state['name_asked'] += 1
                         # Intentar extraer el nombre inmediatamente si hay mensaje
                         if incoming_msg:
-                            name = message_handler.extract_name(incoming_msg, "\n".join(state['history']))
+                            name = message_handler.extract_name(incoming_msg, "\n".join(state['history']), profile_name)
                             logger.debug(f"Extracted name: {name}")
                             if name:
                                 state['client_name'] = name
@@ -248,6 +268,7 @@ def init_routes(app, conversation_state):
                         utils.send_consecutive_messages(phone, error_messages, client, bot_config.WHATSAPP_SENDER_NUMBER)
                         return "Error procesando audio", 200
                     if transcribed_msg:
+                        activity.record_message(state)
                         return client_handler.handle_client_message(
                             phone, transcribed_msg, num_media=0, media_url=None, profile_name=profile_name,
                             conversation_state=conversation_state, client=client, message_handler=message_handler,
@@ -280,61 +301,66 @@ def init_routes(app, conversation_state):
                 logger.error(f"Error sending fallback message: {str(twilio_e)}")
             return "Error interno del servidor", 500
 
-    def is_profile_complete(state):
-        """Check if the client's profile is complete.
+    @app.route('/reset_state', methods=['GET'])
+    def reset_state():
+        """Reset the conversation state for all clients.
+
+        Returns:
+            tuple: A tuple of (message, status_code) indicating the result.
+        """
+        logger.info("Resetting conversation state for all clients")
+        conversation_state.clear()
+        utils.load_conversation_state(conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+        return "Conversation state reset successfully", 200
 
-        Args:
-            state (dict): The client state dictionary.
+    @app.route('/', methods=['GET'])
+    def root():
+        """Handle root GET request.
 
         Returns:
-            bool: True if the profile is complete, False otherwise.
+            str: A simple status message.
         """
-        required_fields = [
-            state.get('client_name'),
-            state.get('needs'),
-            state.get('client_budget'),
-            state.get('preferred_time') or state.get('preferred_days'),
-            state.get('purchase_intent')
-        ]
-        return all(field and field != "No especificado" for field in required_fields)
-
-@app.route('/reset_state', methods=['GET'])
-def reset_state():
-    """Reset the conversation state for all clients.
+        logger.debug("Solicitud GET recibida en /")
+        return "Servidor Flask está funcionando!"
 
-    Returns:
-        tuple: A tuple of (message, status_code) indicating the result.
-    """
-    logger.info("Resetting conversation state for all clients")
-    conversation_state.clear()
-    utils.load_conversation_state(conversation_state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
-    return "Conversation state reset successfully", 200
+    @app.route('/test', methods=['GET'])
+    def test():
+        """Handle test GET request.
 
-@app.route('/', methods=['GET'])
-def root():
-    """Handle root GET request.
+        Returns:
+            str: A simple status message.
+        """
+        logger.debug("Solicitud GET recibida en /test")
+        return "Servidor Flask está funcionando correctamente!"
 
-    Returns:
-        str: A simple status message.
-    """
-    logger.debug("Solicitud GET recibida en /")
-    return "Servidor Flask está funcionando!"
+    @app.route('/schedule_recontact', methods=['GET'])
+    def trigger_recontact():
+        """Trigger recontact scheduling manually.
 
-@app.route('/test', methods=['GET'])
-def test():
-    """Handle test GET request.
+        The in-process scheduler runs recontact and weekly reports at their due
+        times; this endpoint remains as an external fallback.
 
-    Returns:
-        str: A simple status message.
-    """
-    logger.debug("Solicitud GET recibida en /test")
-    return "Servidor Flask está funcionando correctamente!"
+        Returns:
+            str: The result of the recontact operation.
+        """
+        return recontact_handler.trigger_recontact(conversation_state, client, utils, report_handler.generate_detailed_report)
 
-@app.route('/schedule_recontact', methods=['GET'])
-def trigger_recontact():
-    """Trigger recontact scheduling.
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Expose latency histograms and counters for Prometheus.
 
-    Returns:
-        str: The result of the recontact operation.
-    """
-    return recontact_handler.trigger_recontact(conversation_state, client, utils, report_handler.generate_detailed_report)
+        Returns:
+            tuple: The metrics in the Prometheus text format, the status code and headers.
+        """
+        return metrics.render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    @app.route('/traces', methods=['GET'])
+    def traces():
+        """Return the most recent request traces as JSON.
+
+        Returns:
+            Response: A JSON list of traces, newest last.
+        """
+        return jsonify(list(tracing.recent_traces))
+
+    return client
@@ -0,0 +1,221 @@
+import json
+import heapq
+import itertools
+import logging
+import socket
+import threading
+import time
+import uuid
+from google.cloud import storage
+from google.api_core import exceptions as gcs_exceptions
+import bot_config
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Heap of (run_at, seq, key); _job_index holds the live entry for each key so
+# rescheduling a key simply pushes a new entry and the stale one is skipped.
+# Stale entries are dropped by rebuilding the heap once they outnumber the live ones.
+_jobs = []
+_job_index = {}
+_counter = itertools.count()
+_condition = threading.Condition()
+
+_thread = None
+_stop_event = threading.Event()
+
+# Only the lease holder runs jobs. Per-lead jobs are derived from the shared conversation
+# state, so the leader rebuilds them with the sync callback instead of relying on the
+# jobs other instances scheduled in their own heaps.
+_sync = None
+
+# Leader election state
+_instance_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+_lease = {'generation': None, 'expires': 0.0, 'renew_at': 0.0}
+
+def set_sync(func):
+    """Register func(acquired), called by the leader before running due jobs on every cycle.
+
+    It should reschedule jobs from shared state when that state changed, and in any
+    case when acquired is True (this instance just took the lease over).
+    """
+    global _sync
+    _sync = func
+
+def schedule_job(key, run_at, func, *args):
+    """Schedule func(*args) at run_at (epoch seconds), replacing any job with the same key."""
+    with _condition:
+        entry = _job_index.get(key)
+        if entry is not None and entry[0] == run_at:
+            # Same time (the usual case when the leader resyncs): keep the heap entry
+            _job_index[key] = (run_at, entry[1], func, args)
+            return
+        seq = next(_counter)
+        _job_index[key] = (run_at, seq, func, args)
+        heapq.heappush(_jobs, (run_at, seq, key))
+        _compact_if_stale()
+        _condition.notify()
+    logger.debug(f"Scheduled job {key} at {run_at}")
+
+def _compact_if_stale():
+    # Callers hold _condition
+    if len(_jobs) > 2 * len(_job_index) + 64:
+        _jobs[:] = [(run_at, seq, key) for key, (run_at, seq, func, args) in _job_index.items()]
+        heapq.heapify(_jobs)
+
+def cancel_job(key):
+    """Cancel the job registered under key, if any."""
+    with _condition:
+        if _job_index.pop(key, None) is not None:
+            _compact_if_stale()
+            logger.debug(f"Cancelled job {key}")
+
+def get_job_time(key):
+    """Return the run time of the job registered under key, or None."""
+    with _condition:
+        entry = _job_index.get(key)
+        return entry[0] if entry else None
+
+def _pop_due_jobs(now):
+    due = []
+    with _condition:
+        while _jobs and _jobs[0][0] <= now:
+            run_at, seq, key = heapq.heappop(_jobs)
+            entry = _job_index.get(key)
+            if entry is None or entry[1] != seq:
+                continue  # Cancelled or rescheduled
+            del _job_index[key]
+            due.append((key, entry[2], entry[3]))
+    return due
+
+def run_due_jobs(now=None):
+    """Run every job whose time has come. Returns the number of jobs executed."""
+    now = time.time() if now is None else now
+    due = _pop_due_jobs(now)
+    for key, func, args in due:
+        try:
+            logger.debug(f"Running scheduled job {key}")
+            func(*args)
+        except Exception as e:
+            logger.error(f"Scheduled job {key} failed: {str(e)}", exc_info=True)
+    return len(due)
+
+def _next_run_time():
+    with _condition:
+        while _jobs:
+            run_at, seq, key = _jobs[0]
+            entry = _job_index.get(key)
+            if entry is not None and entry[1] == seq:
+                return run_at
+            heapq.heappop(_jobs)
+    return None
+
+def _write_lease(blob, generation_match):
+    now = time.time()
+    payload = json.dumps({'holder': _instance_id, 'expires': now + bot_config.SCHEDULER_LEASE_SECONDS})
+    blob.upload_from_string(payload, content_type='application/json', if_generation_match=generation_match)
+    _lease['generation'] = blob.generation
+    _lease['expires'] = now + bot_config.SCHEDULER_LEASE_SECONDS
+    _lease['renew_at'] = now + bot_config.SCHEDULER_LEASE_SECONDS / 3
+
+def ensure_leadership():
+    """Acquire or renew the GCS lock object so that a single instance runs the jobs."""
+    now = time.time()
+    if _lease['generation'] is not None and now < _lease['renew_at']:
+        return True
+
+    try:
+        storage_client = storage.Client()
+        bucket = storage_client.bucket(bot_config.GCS_BUCKET_NAME)
+        blob = bucket.blob(bot_config.SCHEDULER_LOCK_PATH)
+
+        if _lease['generation'] is not None:
+            try:
+                _write_lease(blob, _lease['generation'])
+                return True
+            except gcs_exceptions.PreconditionFailed:
+                logger.warning("Scheduler lease was taken over by another instance")
+                _lease['generation'] = None
+
+        try:
+            _write_lease(blob, 0)
+            logger.info(f"Scheduler leadership acquired by {_instance_id}")
+            return True
+        except gcs_exceptions.PreconditionFailed:
+            pass
+
+        blob.reload()
+        holder = json.loads(blob.download_as_bytes(if_generation_match=blob.generation))
+        if holder.get('expires', 0) < now:
+            _write_lease(blob, blob.generation)
+            logger.info(f"Scheduler leadership taken over from expired holder {holder.get('holder')}")
+            return True
+        return False
+    except (gcs_exceptions.PreconditionFailed, gcs_exceptions.NotFound):
+        # Someone else won the race; try again on the next cycle
+        _lease['generation'] = None
+        return False
+    except Exception as e:
+        logger.error(f"Error acquiring scheduler leadership: {str(e)}", exc_info=True)
+        # Keep running on an unexpired lease if GCS is briefly unreachable
+        return _lease['generation'] is not None and now < _lease['expires']
+
+def release_leadership():
+    """Delete the lock object if this instance holds it."""
+    if _lease['generation'] is None:
+        return
+    try:
+        storage_client = storage.Client()
+        bucket = storage_client.bucket(bot_config.GCS_BUCKET_NAME)
+        bucket.blob(bot_config.SCHEDULER_LOCK_PATH).delete(if_generation_match=_lease['generation'])
+        logger.info("Scheduler leadership released")
+    except Exception as e:
+        logger.warning(f"Could not release scheduler lease: {str(e)}")
+    finally:
+        _lease['generation'] = None
+
+def _run_cycle(was_leader):
+    """Renew the lease and, as leader, sync jobs from shared state and run the due ones."""
+    is_leader = ensure_leadership()
+    if not is_leader:
+        return False
+    if _sync is not None:
+        try:
+            _sync(not was_leader)
+        except Exception as e:
+            logger.error(f"Scheduler sync failed: {str(e)}", exc_info=True)
+    run_due_jobs()
+    return True
+
+def _run_loop():
+    logger.info(f"Scheduler thread started ({_instance_id})")
+    is_leader = False
+    while not _stop_event.is_set():
+        is_leader = _run_cycle(is_leader)
+
+        now = time.time()
+        next_run = _next_run_time()
+        wake_at = now + bot_config.SCHEDULER_LEASE_SECONDS / 3
+        if is_leader and next_run is not None:
+            wake_at = min(wake_at, next_run)
+        with _condition:
+            _condition.wait(timeout=max(0.0, wake_at - now))
+    release_leadership()
+    logger.info("Scheduler thread stopped")
+
+def start_scheduler():
+    """Start the background scheduler thread."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop_event.clear()
+    _thread = threading.Thread(target=_run_loop, name="giselle-scheduler", daemon=True)
+    _thread.start()
+
+def stop_scheduler():
+    """Stop the background scheduler thread."""
+    _stop_event.set()
+    with _condition:
+        _condition.notify_all()
+    if _thread is not None:
+        _thread.join(timeout=5)
@@ -0,0 +1,55 @@
+import time
+import unittest
+import bot_config
+import activity
+import utils
+from conversation_store import ConversationState
+from loadtest.fakes import Fakes, installed
+
+DAY = 24 * 3600
+
+class TestActivity(unittest.TestCase):
+    def setUp(self):
+        activity.clear()
+        self.addCleanup(activity.clear)
+        self.state = ConversationState({
+            "whatsapp:+1": {'history': []},
+            "whatsapp:+2": {'history': []},
+        })
+
+    def test_counters_follow_messages_and_interest(self):
+        one, two = self.state["whatsapp:+1"], self.state["whatsapp:+2"]
+        for _ in range(12):
+            activity.record_message(one)
+        activity.record_message(two)
+        activity.record('escalations')
+        self.assertEqual(activity.day_counts(), {'messages': 13, 'interested_clients': 2, 'escalations': 1, 'zoom_bookings': 0})
+
+        two['no_interest'] = True
+        activity.update_client(two)
+        self.assertEqual(activity.day_counts()['interested_clients'], 1)
+        self.assertEqual(activity.week_counts()['interested_clients'], 1)
+        self.assertEqual(utils.generate_daily_summary(self.state)[1:3], ["Mensajes recibidos hoy: 13", "Clientes interesados contactados hoy: 1"])
+
+        tomorrow = time.time() + DAY
+        activity.record_message(one, now=tomorrow)
+        self.assertEqual(activity.day_counts(now=tomorrow)['messages'], 1)
+        self.assertEqual(activity.day_counts(now=tomorrow)['interested_clients'], 1)
+
+    def test_counters_persist_and_old_days_are_dropped(self):
+        old = time.time() - (bot_config.ACTIVITY_RETENTION_DAYS + 1) * DAY
+        activity.record('zoom_bookings', now=old)
+        activity.record_message(self.state["whatsapp:+1"])
+        self.assertEqual(activity.day_counts(now=old)['zoom_bookings'], 0)
+
+        fakes = Fakes()
+        with installed(fakes):
+            utils.save_conversation("whatsapp:+1", self.state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+            self.assertFalse(activity.is_dirty())
+            activity.clear()
+            utils.load_conversation_state(self.state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+        self.assertEqual(activity.day_counts()['messages'], 1)
+        self.assertEqual(utils.generate_weekly_summary(self.state)[1], "Mensajes recibidos esta semana: 1")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,16 @@
+import unittest
+from benchmarks import hot_path
+
+class TestHotPathBenchmarks(unittest.TestCase):
+    def test_benchmarks_run_on_small_inputs(self):
+        results = hot_path.run_benchmarks(sizes=[10], only=['project_info', 'recontact_scan'])
+        self.assertEqual(set(results), {'project_info', 'recontact_scan'})
+        self.assertGreater(results['recontact_scan']['10'], 0)
+
+    def test_leads_fixture(self):
+        conversation_state = hot_path.make_leads(50)
+        self.assertEqual(len(conversation_state.clients()), 50)
+        self.assertEqual(len(conversation_state.gerentes()), 2)
+
+if __name__ == '__main__':
+    unittest.main()
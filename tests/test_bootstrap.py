@@ -0,0 +1,95 @@
+import json
+import time
+import unittest
+import bot_config
+import utils
+import bootstrap
+import project_loader
+from loadtest.fakes import Fakes, LatencyModel, installed
+
+def seed_bucket(fakes):
+    base = bot_config.GCS_BASE_PATH
+    fakes.storage.put(f"{base}/KABAN/kaban.json", json.dumps({'location': "Holbox", 'prices': {'Estudio': 2900000}}))
+    fakes.storage.put(f"{base}/MUWAN/muwan.txt", "Nombre: MUWAN\nUbicación: Tulum\nPrecios: A $7,500,000 B $9,800,000\nAmenidades: Spa, Alberca\n")
+    fakes.storage.put(f"{base}/KABAN/kaban_faq.txt", "Pregunta: ¿Aceptan mascotas?\nRespuesta: Sí, con restricciones.\n")
+    fakes.storage.put(f"{base}/KABAN/kaban_respuestas.txt", "Brochure\nURL: https://example.com/kaban.pdf\n")
+    fakes.storage.put(f"{base}/KABAN/render.png", b"\x89PNG")
+
+class TestBootstrap(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.projects_data, utils.downloadable_urls, utils.faq_data)
+        bootstrap._loaded_generations.clear()
+
+    def tearDown(self):
+        utils.projects_data, utils.downloadable_urls, utils.faq_data = self.saved
+        bootstrap._loaded_generations.clear()
+
+    def test_loads_every_kind_of_file_in_one_pass(self):
+        fakes = Fakes()
+        seed_bucket(fakes)
+        with installed(fakes):
+            timings = bootstrap.load_knowledge_base(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH, use_snapshot=False)
+        self.assertEqual(utils.projects_data['KABAN']['location'], "Holbox")
+        self.assertEqual(utils.projects_data['MUWAN']['prices'], {'A': 7500000, 'B': 9800000})
+        self.assertEqual(utils.projects_data['MUWAN']['amenities'], ["Spa", "Alberca"])
+        self.assertEqual(utils.faq_data['kaban'], {'¿aceptan mascotas?': "Sí, con restricciones."})
+        self.assertEqual(utils.downloadable_urls['KABAN'], ["https://example.com/kaban.pdf"])
+        self.assertEqual(timings['files'], 4)
+        self.assertEqual(fakes.calls.counts['gcs.download'], 4)
+        for stage in ('list', 'fetch', 'apply', 'total'):
+            self.assertIn(stage, timings)
+
+    def test_downloads_run_concurrently(self):
+        fakes = Fakes(gcs_latency=LatencyModel(0.05))
+        for index in range(16):
+            fakes.storage.put(f"{bot_config.GCS_BASE_PATH}/P{index}/p{index}.json", json.dumps({'location': "Tulum"}))
+        with installed(fakes):
+            started = time.perf_counter()
+            bootstrap.load_knowledge_base(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH, workers=16, use_snapshot=False)
+            elapsed = time.perf_counter() - started
+        self.assertEqual(len(utils.projects_data), 16)
+        self.assertLess(elapsed, 16 * 0.05 / 2)
+
+    def test_warm_start_reads_only_the_snapshot_until_a_source_changes(self):
+        fakes = Fakes()
+        seed_bucket(fakes)
+        load = lambda: bootstrap.load_knowledge_base(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH, use_snapshot=True)
+        with installed(fakes):
+            self.assertEqual(load()['source'], 'objects')
+            cold = dict(utils.projects_data)
+            before = fakes.calls.counts['gcs.download']
+            project_loader.clear_cache()
+            misses = project_loader.stats['misses']
+            self.assertEqual(load()['source'], 'snapshot')
+            self.assertEqual(fakes.calls.counts['gcs.download'] - before, 1)
+            self.assertEqual(project_loader.stats['misses'], misses)  # Nothing parsed on a warm start
+            self.assertEqual(utils.projects_data, cold)
+
+            fakes.storage.put(f"{bot_config.GCS_BASE_PATH}/KABAN/kaban_faq.txt", "Pregunta: ¿Hay alberca?\nRespuesta: Sí.\n")
+            self.assertEqual(load()['source'], 'objects')
+            self.assertEqual(utils.faq_data['kaban'], {'¿hay alberca?': "Sí."})
+
+            data, generation = fakes.storage.objects[(bot_config.GCS_BUCKET_NAME, bot_config.KB_SNAPSHOT_PATH)]
+            fakes.storage.objects[(bot_config.GCS_BUCKET_NAME, bot_config.KB_SNAPSHOT_PATH)] = (data.replace(b"Holbox", b"Tulum"), generation)
+            self.assertEqual(load()['source'], 'objects')
+            self.assertEqual(utils.projects_data['KABAN']['location'], "Holbox")
+
+    def test_changed_sources_are_swapped_in_without_touching_the_old_catalog(self):
+        fakes = Fakes()
+        seed_bucket(fakes)
+        with installed(fakes):
+            bootstrap.load_knowledge_base(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH)
+            self.assertFalse(bootstrap.check_for_changes(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH))
+
+            old_faq = utils.faq_data
+            fakes.storage.put(f"{bot_config.GCS_BASE_PATH}/KABAN/kaban_faq.txt", "Pregunta: ¿Hay alberca?\nRespuesta: Sí.\n")
+            self.assertTrue(bootstrap.check_for_changes(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH))
+            self.assertEqual(utils.get_faq_answer("¿Hay alberca?", "KABAN"), "Sí.")
+            self.assertEqual(old_faq['kaban'], {'¿aceptan mascotas?': "Sí, con restricciones."})
+
+            fakes.storage.put(f"{bot_config.GCS_BASE_PATH}/KABAN/kaban.json", "{not json")
+            self.assertFalse(bootstrap.check_for_changes(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH))
+            self.assertEqual(utils.projects_data['KABAN']['location'], "Holbox")
+
+if __name__ == '__main__':
+    unittest.main()
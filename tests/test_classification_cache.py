@@ -0,0 +1,81 @@
+import threading
+import unittest
+from unittest.mock import Mock, patch
+import classification_cache
+import message_handler
+import llm_gateway
+
+def completion(content):
+    return Mock(choices=[Mock(message=Mock(content=content))])
+
+class TestClassificationCache(unittest.TestCase):
+    def setUp(self):
+        classification_cache.clear()
+        self.openai_client = Mock()
+        patcher = patch.object(llm_gateway, '_client', self.openai_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_messages_skip_the_llm(self):
+        self.openai_client.chat.completions.create.return_value = completion('{"intention": "question", "data": {}}')
+        history = "Cliente: hola\nGiselle: ¿Qué proyecto te interesa?"
+        first = message_handler.detect_intention("¿Cuánto cuesta KABAN?", history)
+        second = message_handler.detect_intention("cuanto cuesta  kaban", history + "\nCliente: ¿Cuánto cuesta KABAN?")
+        self.assertEqual(first, second)
+        self.assertEqual(self.openai_client.chat.completions.create.call_count, 1)
+        self.assertEqual(classification_cache.stats['hits'], 1)
+
+        # A different last bot turn is a different context
+        message_handler.detect_intention("¿Cuánto cuesta KABAN?", history + "\nGiselle: ¿Te interesa invertir?")
+        self.assertEqual(self.openai_client.chat.completions.create.call_count, 2)
+
+    def test_gerente_contact_decisions_are_cached_and_failures_are_not(self):
+        self.openai_client.chat.completions.create.side_effect = [Exception("timeout"), completion("True")]
+        args = ("No está confirmado, lo verifico", "¿aceptan mascotas?", "Proyecto: KABAN", "")
+        self.assertFalse(message_handler.needs_gerente_contact(*args))
+        self.assertTrue(message_handler.needs_gerente_contact(*args))
+        self.assertTrue(message_handler.needs_gerente_contact(*args))
+        self.assertEqual(self.openai_client.chat.completions.create.call_count, 2)
+
+    def test_gerente_contact_key_uses_reply_traits(self):
+        self.openai_client.chat.completions.create.side_effect = [completion("True"), completion("False")]
+        question, project = "¿Aceptan mascotas?", "Proyecto: KABAN"
+        self.assertTrue(message_handler.needs_gerente_contact("No está confirmado, lo verifico.", question, project, "Cliente: hola"))
+        self.assertTrue(message_handler.needs_gerente_contact("Eso no lo tengo, lo consulto.", "aceptan mascotas", project, "Giselle: ¿Algo más?"))
+        self.assertFalse(message_handler.needs_gerente_contact("Sí, se aceptan mascotas.", question, project, ""))
+        self.assertEqual(self.openai_client.chat.completions.create.call_count, 2)
+        self.assertEqual(classification_cache.reply_traits("Desde $2,500,000 MXN, entrega en marzo 2026"), "110")
+
+    @patch('bot_config.CLASSIFICATION_CACHE_SIZE', 2)
+    def test_least_recently_used_entries_are_evicted(self):
+        for message in ["a", "b"]:
+            classification_cache.put(classification_cache.make_key('intention', message), message)
+        classification_cache.get(classification_cache.make_key('intention', "a"))
+        classification_cache.put(classification_cache.make_key('intention', "c"), "c")
+        self.assertIsNone(classification_cache.get(classification_cache.make_key('intention', "b")))
+        self.assertEqual(classification_cache.get(classification_cache.make_key('intention', "a")), "a")
+        self.assertEqual(classification_cache.stats['evictions'], 1)
+
+    @patch('bot_config.CLASSIFICATION_CACHE_SIZE', 4)
+    def test_concurrent_access_is_safe(self):
+        errors = []
+
+        def worker(offset):
+            try:
+                for i in range(2000):
+                    key = classification_cache.make_key('intention', str((i + offset) % 8))
+                    if classification_cache.get(key) is None:
+                        classification_cache.put(key, {'intention': 'greeting'})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(classification_cache.size(), 4)
+
+if __name__ == '__main__':
+    unittest.main()
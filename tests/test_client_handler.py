@@ -1,11 +1,14 @@
 import unittest
 from unittest.mock import Mock, patch
-from handlers import handle_client_message
+import time
+import scheduler
+from conversation_store import ConversationState
+from handlers import handle_client_message, run_pending_response_job
 
 class TestClientHandler(unittest.TestCase):
     def setUp(self):
         self.phone = "whatsapp:+5219988103956"
-        self.conversation_state = {self.phone: {'history': [], 'client_name': None, 'name_asked': 0}}
+        self.conversation_state = ConversationState({self.phone: {'history': [], 'client_name': None, 'name_asked': 0}})
         self.client = Mock()
         self.message_handler = Mock()
         self.utils = Mock()
@@ -30,5 +33,39 @@ class TestClientHandler(unittest.TestCase):
         self.assertEqual(result, ("Error in conversation state", 500))
         mock_logger.error.assert_called()
 
+    @patch('handlers.rephrase_gerente_response', return_value="Respuesta del gerente")
+    def test_pending_response_job_waits_for_answer(self, mock_rephrase):
+        state = self.conversation_state[self.phone]
+        state['pending_question'] = {'question': '¿hay alberca?', 'mentioned_project': 'KABAN'}
+        state['pending_response_time'] = time.time() - 60
+        self.utils.get_faq_answer.return_value = None
+
+        run_pending_response_job(self.phone, self.conversation_state, self.client, self.message_handler, self.utils)
+        self.utils.send_consecutive_messages.assert_not_called()
+        self.assertIsNotNone(scheduler.get_job_time(f"pending:{self.phone}"))
+
+        self.utils.get_faq_answer.return_value = "Sí, en la azotea"
+        run_pending_response_job(self.phone, self.conversation_state, self.client, self.message_handler, self.utils)
+        self.utils.send_consecutive_messages.assert_called_once()
+        self.assertIsNone(state['pending_question'])
+        scheduler.cancel_job(f"pending:{self.phone}")
+
+    @patch('handlers.rephrase_gerente_response', return_value="Respuesta del gerente")
+    def test_overdue_pending_response_is_delivered_on_next_message(self, mock_rephrase):
+        state = self.conversation_state[self.phone]
+        state['pending_question'] = {'question': '¿hay alberca?', 'mentioned_project': 'KABAN'}
+        state['pending_response_time'] = time.time() - 60
+        scheduler.schedule_job(f"pending:{self.phone}", time.time() + 3600, Mock())
+        self.utils.get_faq_answer.return_value = "Sí, en la azotea"
+
+        result = handle_client_message(
+            self.phone, "hola", 0, None, None, self.conversation_state,
+            self.client, self.message_handler, self.utils, self.recontact_handler
+        )
+        self.assertEqual(result, ("Mensaje enviado", 200))
+        self.assertEqual(self.utils.send_consecutive_messages.call_args_list[0].args[:2], (self.phone, ["Respuesta del gerente"]))
+        self.assertIsNone(state['pending_response_time'])
+        self.assertIsNone(scheduler.get_job_time(f"pending:{self.phone}"))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,153 @@
+import gc
+import os
+import time
+import threading
+import unittest
+import bot_config
+import utils
+import conversation_store
+import pending_questions
+import timestamps
+from gerente_handler import find_client_phone
+from conversation_store import ConversationState
+from loadtest.fakes import Fakes, installed
+
+class TestConversationState(unittest.TestCase):
+    def setUp(self):
+        self.state = ConversationState({
+            "whatsapp:+5218110665094": {'history': [], 'is_gerente': True},
+            "whatsapp:+5219981111111": {'history': [], 'stage': 'Prospección', 'no_interest': False},
+            "whatsapp:+5219982222222": {'history': [], 'stage': 'Prospección', 'no_interest': True},
+        })
+
+    def test_indexes_follow_mutations(self):
+        client = self.state["whatsapp:+5219981111111"]
+        client['stage'] = 'Cierre'
+        client['priority'] = True
+        client['last_mentioned_project'] = 'KABAN'
+        self.assertEqual(self.state.gerentes(), ["whatsapp:+5218110665094"])
+        self.assertEqual(self.state.by_stage('Cierre'), ["whatsapp:+5219981111111"])
+        self.assertEqual(self.state.by_stage('Prospección'), ["whatsapp:+5219982222222"])
+        self.assertEqual(self.state.priority_clients(), ["whatsapp:+5219981111111"])
+        self.assertEqual(self.state.by_project('KABAN'), ["whatsapp:+5219981111111"])
+        self.assertEqual(self.state.interested_clients(), ["whatsapp:+5219981111111"])
+
+        del self.state["whatsapp:+5219981111111"]
+        self.assertEqual(self.state.by_stage('Cierre'), [])
+        self.assertEqual(self.state.priority_clients(), [])
+
+    def test_reload_replaces_indexes_and_serializes_as_json(self):
+        data = conversation_store.loads(conversation_store.dumps(self.state))
+        data["whatsapp:+5219982222222"]['pending_question'] = {'question': '¿precio?'}
+        self.state.clear()
+        self.state.update(data)
+        self.assertEqual(self.state.pending_clients(), ["whatsapp:+5219982222222"])
+        self.assertEqual(self.state.no_interest_clients(), ["whatsapp:+5219982222222"])
+
+    def test_find_client_by_phone_or_name(self):
+        self.state["whatsapp:+5219981111111"]['client_name'] = 'José'
+        self.assertEqual(self.state.find_by_phone("998 111 1111"), "whatsapp:+5219981111111")
+        self.assertEqual(self.state.find_by_phone("+52 1 998-111-1111"), "whatsapp:+5219981111111")
+        self.assertEqual(find_client_phone(self.state, "Marca prioritario a 9981111111"), "whatsapp:+5219981111111")
+        self.assertEqual(find_client_phone(self.state, "busca a jose"), "whatsapp:+5219981111111")
+        self.assertEqual(find_client_phone(self.state, "llamar a Josué mañana a las 5 PM"), "whatsapp:+5219981111111")
+        self.assertIsNone(find_client_phone(self.state, "busca a Mariana"))
+
+    def test_lead_fields_round_trip_through_slots(self):
+        client = self.state["whatsapp:+5219981111111"]
+        client['client_budget'] = None
+        client['legacy_flag'] = 1
+        self.assertIn('client_budget', client)
+        self.assertNotIn('needs', client)
+        self.assertEqual(client.get('needs', 'n/a'), 'n/a')
+        with self.assertRaises(KeyError):
+            client['needs']
+        expected = {'history': [], 'stage': 'Prospección', 'no_interest': False, 'client_budget': None, 'legacy_flag': 1}
+        self.assertEqual(dict(client), expected)
+
+        reloaded = ConversationState(conversation_store.loads(conversation_store.dumps(self.state)))
+        self.assertEqual(dict(reloaded["whatsapp:+5219981111111"]), expected)
+        del reloaded["whatsapp:+5219981111111"]['stage']
+        self.assertEqual(reloaded.by_stage('Prospección'), ["whatsapp:+5219982222222"])
+
+    def test_timestamps_are_epoch_and_indexed_by_day(self):
+        now = time.time()
+        today = timestamps.day_number(now)
+        legacy = timestamps.to_datetime(now - 3 * 24 * 3600).isoformat()
+        state = ConversationState({
+            "whatsapp:+1": {'history': ["Cliente: hola", "Cliente: precio"], 'last_contact': now},
+            "whatsapp:+2": {'history': ["Cliente: hola"], 'last_contact': legacy, 'last_response_time': legacy},
+            "whatsapp:+3": {'history': [], 'last_contact': now, 'is_gerente': True},
+        })
+        self.assertAlmostEqual(state["whatsapp:+2"]['last_contact'], now - 3 * 24 * 3600, places=3)
+        self.assertEqual(state.by_day('last_response_time', today - 3), ["whatsapp:+2"])
+        self.assertEqual(sorted(state.by_day('last_contact', today)), ["whatsapp:+1", "whatsapp:+3"])
+
+        state["whatsapp:+2"]['last_contact'] = now
+        self.assertEqual(sorted(state.by_day('last_contact', today)), ["whatsapp:+1", "whatsapp:+2", "whatsapp:+3"])
+        self.assertEqual(state.by_day('last_contact', today - 3), [])
+
+class TestStateReload(unittest.TestCase):
+    def test_gc_is_paused_only_while_loading(self):
+        with conversation_store.gc_paused():
+            self.assertFalse(gc.isenabled())
+            state = ConversationState(conversation_store.loads(b'{"whatsapp:+5219981111111": {"history": [], "stage": "Cierre"}}'))
+        self.assertTrue(gc.isenabled())
+        self.assertEqual(state.by_stage('Cierre'), ["whatsapp:+5219981111111"])
+        self.assertEqual(state.find_by_phone("998 111 1111"), "whatsapp:+5219981111111")
+
+
+    def test_state_is_reloaded_only_when_another_instance_saved_it(self):
+        state = ConversationState({"whatsapp:+1": {'history': ["Cliente: hola"], 'stage': 'Prospección'}})
+        path = os.path.join(bot_config.GCS_CONVERSATIONS_PATH, "conversation_state.json")
+        fakes = Fakes()
+        with installed(fakes):
+            utils.save_conversation("whatsapp:+1", state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH)
+            self.assertFalse(utils.refresh_conversation_state(state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH))
+            self.assertEqual(fakes.calls.counts['gcs.download'], 0)
+
+            other = ConversationState({"whatsapp:+2": {'history': [], 'stage': 'Cierre'}})
+            fakes.storage.put(path, conversation_store.dumps(other))
+            self.assertTrue(utils.refresh_conversation_state(state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH))
+            downloads = fakes.calls.counts['gcs.download']
+            self.assertFalse(utils.refresh_conversation_state(state, bot_config.GCS_BUCKET_NAME, bot_config.GCS_CONVERSATIONS_PATH))
+            self.assertEqual(fakes.calls.counts['gcs.download'], downloads)
+        self.assertEqual(list(state), ["whatsapp:+2"])
+        self.assertEqual(state.by_stage('Cierre'), ["whatsapp:+2"])
+
+class TestPendingQuestions(unittest.TestCase):
+    def test_priority_clients_are_answered_first(self):
+        state = ConversationState({
+            "whatsapp:+1": {'pending_question': {'question': 'a'}, 'pending_response_time': 1},
+            "whatsapp:+2": {'pending_question': {'question': 'b'}, 'pending_response_time': 2},
+            "whatsapp:+3": {'pending_question': {'question': 'c'}, 'pending_response_time': 3, 'priority': True},
+        })
+        pending_questions.rebuild(state)
+        self.assertEqual(pending_questions.pending_phones(), ["whatsapp:+3", "whatsapp:+1", "whatsapp:+2"])
+
+        pending_questions.remove("whatsapp:+3")
+        pending_questions.set_priority("whatsapp:+2", True)
+        self.assertEqual(pending_questions.peek(), "whatsapp:+2")
+        self.assertEqual(pending_questions.count(), 2)
+
+    def test_rebuild_never_exposes_empty_queues(self):
+        state = ConversationState({f"whatsapp:+{n}": {'pending_question': {'question': 'q'}, 'pending_response_time': n} for n in range(200)})
+        pending_questions.rebuild(state)
+        self.addCleanup(pending_questions.rebuild, ConversationState())
+        counts = set()
+        done = threading.Event()
+
+        def reader():
+            while not done.is_set():
+                counts.add(pending_questions.count())
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        for _ in range(50):
+            pending_questions.rebuild(state)
+        done.set()
+        thread.join()
+        self.assertEqual(counts, {200})
+
+if __name__ == '__main__':
+    unittest.main()
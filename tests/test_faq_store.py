@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch
+from google.api_core import exceptions as gcs_exceptions
+import bot_config
+import utils
+import bootstrap
+import faq_store
+from loadtest.fakes import Fakes, FakeBlob, installed
+
+class TestFaqStore(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.projects_data, utils.downloadable_urls, utils.faq_data)
+        bootstrap._loaded_generations.clear()
+
+    def tearDown(self):
+        utils.projects_data, utils.downloadable_urls, utils.faq_data = self.saved
+        bootstrap._loaded_generations.clear()
+
+    def test_entries_are_visible_at_once_and_survive_reload_and_compaction(self):
+        fakes = Fakes()
+        base_path = faq_store.faq_file_path("KABAN")
+        fakes.storage.put(base_path, "Pregunta: ¿Aceptan mascotas?\nRespuesta: No.\n")
+        load = lambda: bootstrap.load_knowledge_base(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH, use_snapshot=False)
+        with installed(fakes):
+            load()
+            faq_store.add_entry("KABAN", "¿Aceptan mascotas?", "Sí, con restricciones.")
+            faq_store.add_entry("KABAN", "¿Hay alberca?", "Sí, en el rooftop.")
+            faq_store.add_entry(None, "¿Dan factura?", "Sí.")
+            self.assertEqual(utils.get_faq_answer("¿Aceptan mascotas?", "KABAN"), "Sí, con restricciones.")
+            self.assertEqual(utils.get_faq_answer("¿Dan factura?", "KABAN"), "Sí.")
+            self.assertEqual(fakes.calls.counts['gcs.download'], 1)
+            in_memory = {key: dict(value) for key, value in utils.faq_data.items()}
+
+            load()
+            self.assertEqual(utils.faq_data, in_memory)
+
+            self.assertEqual(faq_store.compact_all(), 3)
+            objects = [name for bucket, name in fakes.storage.objects]
+            self.assertFalse(any(f"/{bot_config.FAQ_ENTRIES_DIR}/" in name for name in objects))
+            load()
+            self.assertEqual(utils.faq_data, in_memory)
+            merged = fakes.storage.objects[(bot_config.GCS_BUCKET_NAME, base_path)][0].decode('utf-8')
+            self.assertEqual(merged.count("¿aceptan mascotas?"), 1)
+
+    def test_failed_write_leaves_faq_data_unchanged(self):
+        fakes = Fakes()
+        with installed(fakes):
+            bootstrap.load_knowledge_base(bot_config.GCS_BUCKET_NAME, bot_config.GCS_BASE_PATH, use_snapshot=False)
+            before = {key: dict(value) for key, value in utils.faq_data.items()}
+            with patch.object(FakeBlob, 'upload_from_string', side_effect=gcs_exceptions.ServiceUnavailable("down")):
+                with self.assertRaises(gcs_exceptions.ServiceUnavailable):
+                    faq_store.add_entry("KABAN", "¿Hay alberca?", "Sí.")
+            self.assertEqual(utils.faq_data, before)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import Mock, patch
+import pending_questions
+import gerente_handler
+from conversation_store import ConversationState
+
+GERENTE = "whatsapp:+5218110665094"
+CLIENT = "whatsapp:+5219981111111"
+
+class TestPendingNotifications(unittest.TestCase):
+    def setUp(self):
+        self.state = ConversationState({
+            GERENTE: {'history': [], 'is_gerente': True},
+            CLIENT: {'history': [], 'pending_question': {'question': '¿Aceptan mascotas?'}, 'pending_response_time': 100},
+        })
+        pending_questions.rebuild(self.state)
+        self.addCleanup(pending_questions.rebuild, ConversationState())
+
+    @patch('gerente_handler.utils')
+    def test_notifications_are_tracked_and_saved(self, mock_utils):
+        gerente_handler.notify_gerente_of_pending_questions(GERENTE, self.state, Mock())
+        self.assertEqual(mock_utils.send_consecutive_messages.call_count, 1)
+        self.assertEqual(self.state[GERENTE]['notified_pending'], {CLIENT: 100})
+        mock_utils.save_conversation.assert_called_once()
+
+        gerente_handler.notify_gerente_of_pending_questions(GERENTE, self.state, Mock())
+        self.assertEqual(mock_utils.send_consecutive_messages.call_count, 1)
+        mock_utils.save_conversation.assert_called_once()
+
+        self.state[CLIENT]['pending_question'] = None
+        gerente_handler.notify_gerente_of_pending_questions(GERENTE, self.state, Mock())
+        self.assertEqual(self.state[GERENTE]['notified_pending'], {})
+        self.assertEqual(mock_utils.save_conversation.call_count, 2)
+
+    @patch('gerente_handler.utils')
+    def test_new_faq_entry_answers_pending_questions_on_this_instance(self, mock_utils):
+        mock_utils.get_faq_answer.side_effect = lambda question, project: "Sí." if question == '¿Aceptan mascotas?' else None
+        rephrase = Mock(return_value="¡Sí, aceptamos mascotas!")
+        with patch('gerente_handler.scheduler') as mock_scheduler:
+            self.assertEqual(gerente_handler.deliver_faq_answered_questions(self.state, Mock(), rephrase), [CLIENT])
+        mock_scheduler.cancel_job.assert_called_once_with(f"pending:{CLIENT}")
+        self.assertIsNone(self.state[CLIENT]['pending_question'])
+        self.assertEqual(self.state[CLIENT]['history'], ["Giselle: ¡Sí, aceptamos mascotas!"])
+        self.assertEqual(pending_questions.count(), 0)
+        mock_utils.save_conversation.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import intent_classifier
+
+class TestIntentClassifier(unittest.TestCase):
+    def assertIntent(self, message, intention, data=None, zoom_proposed=False):
+        result = intent_classifier.fast_classify(message, zoom_proposed=zoom_proposed)
+        self.assertIsNotNone(result, message)
+        self.assertEqual(result['intention'], intention, message)
+        if data is not None:
+            self.assertEqual(result['data'], data, message)
+
+    def test_short_messages_skip_the_llm(self):
+        self.assertIntent("Hola!", "greeting")
+        self.assertIntent("Sí, claro que sí", "offer_response", {'response': 'yes'})
+        self.assertIntent("No me interesa, gracias", "no_interest")
+        self.assertIntent("mañana a las 5", "contact_preference", {'time': "5:00 PM", 'days': "manana"})
+        self.assertIntent("Tengo un presupuesto de 2.5 millones", "budget", {'budget': "2,500,000 MXN"})
+        self.assertIntent("$3,000,000", "budget", {'budget': "3,000,000 MXN"})
+
+    def test_zoom_slots_only_after_proposal(self):
+        self.assertIntent("El martes a las 2pm", "zoom_response", {'day': "Martes", 'time': "2:00 PM"}, zoom_proposed=True)
+        self.assertIntent("Miércoles 10:00 AM", "zoom_response", {'day': "Miércoles", 'time': "10:00 AM"}, zoom_proposed=True)
+        self.assertIsNone(intent_classifier.fast_classify("Martes", zoom_proposed=True))
+
+    def test_ambiguous_messages_fall_back_to_llm(self):
+        for message in [
+            "¿Cuánto cuesta KABAN?", "tengo 3 hijos", "hasta luego", "no me interesa KABAN pero ¿qué otros proyectos tienen?",
+            "Me interesa, no quiero perder la oportunidad", "no quiero esperar mucho, me interesa", "No quiero 2 recámaras, quiero 3",
+        ]:
+            self.assertIsNone(intent_classifier.fast_classify(message), message)
+        self.assertIsNone(intent_classifier.fast_classify("No quiero en MUWAN", project_names=["MUWAN"]))
+
+    def test_common_words_are_not_contact_preferences(self):
+        for message in ["desde luego", "luego te paso mi correo", "mañana te paso mi correo"]:
+            self.assertIsNone(intent_classifier.classify(message), message)
+        self.assertIntent("Mañana", "contact_preference", {'days': "manana"})
+        self.assertIntent("No gracias", "no_interest")
+
+if __name__ == '__main__':
+    unittest.main()
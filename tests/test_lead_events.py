@@ -0,0 +1,49 @@
+import json
+import unittest
+import bot_config
+import lead_events
+import message_handler
+import conversation_store
+from conversation_store import ConversationState
+
+PHONE = "whatsapp:+5219981111111"
+
+class TestLeadEvents(unittest.TestCase):
+    def setUp(self):
+        self.state = ConversationState({PHONE: {'history': ["Cliente: hola"] * 4, 'client_name': 'Ana', 'intention_history': []}})
+
+    def test_intentions_are_counted_and_the_window_is_bounded(self):
+        lead = self.state[PHONE]
+        with self.assertLogs("giselle.analytics", level='INFO') as logs:
+            for _ in range(bot_config.INTENTION_HISTORY_SIZE + 5):
+                lead_events.record_intention(PHONE, lead, 'greeting')
+            lead_events.record_intention(PHONE, lead, 'made_up')
+        self.assertEqual(len(lead['intention_history']), bot_config.INTENTION_HISTORY_SIZE)
+        self.assertEqual(lead['intention_counts'], {'greeting': bot_config.INTENTION_HISTORY_SIZE + 5, 'unknown': 1})
+        self.assertEqual(lead_events.last_intention(lead), 'unknown')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['event'], 'intention')
+        self.assertFalse(message_handler.is_ready_for_zoom(PHONE, self.state))
+
+        lead_events.record_intention(PHONE, lead, 'budget')
+        lead_events.record_intention(PHONE, lead, 'question')
+        self.assertTrue(message_handler.is_ready_for_zoom(PHONE, self.state))
+
+    def test_legacy_history_is_folded_into_counts_on_load(self):
+        legacy = ['question'] * 30 + ['budget']
+        data = conversation_store.dumps({PHONE: {'history': [], 'intention_history': legacy}})
+        lead = ConversationState(conversation_store.loads(data))[PHONE]
+        self.assertEqual(lead['intention_counts'], {'question': 30, 'budget': 1})
+        self.assertEqual(lead['intention_history'], legacy[-bot_config.INTENTION_HISTORY_SIZE:])
+        self.assertEqual(lead_events.meaningful_intentions(lead), 31)
+
+    def test_stage_changes_are_logged_once(self):
+        lead = self.state[PHONE]
+        with self.assertLogs("giselle.analytics", level='INFO') as logs:
+            lead_events.set_stage(PHONE, lead, 'Negociación')
+            lead_events.set_stage(PHONE, lead, 'Negociación')
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['stage'], 'Negociación')
+        self.assertEqual(self.state.by_stage('Negociación'), [PHONE])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import Mock, patch
+import httpx
+import openai
+import bot_config
+import llm_gateway
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+@patch('bot_config.LLM_RETRY_BASE_DELAY', 0)
+class TestLLMGateway(unittest.TestCase):
+    def setUp(self):
+        llm_gateway.reset()
+        self.client = Mock()
+        patcher = patch.object(llm_gateway, '_client', self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(llm_gateway.reset)
+
+    def models_called(self):
+        return [call.kwargs['model'] for call in self.client.chat.completions.create.call_args_list]
+
+    def test_transient_errors_are_retried_then_fall_back(self):
+        self.client.chat.completions.create.side_effect = [connection_error(), "primary"]
+        self.assertEqual(llm_gateway.chat_completion('reply', []), "primary")
+
+        self.client.chat.completions.create.reset_mock()
+        self.client.chat.completions.create.side_effect = [connection_error()] * 3 + ["fallback"]
+        self.assertEqual(llm_gateway.chat_completion('reply', []), "fallback")
+        self.assertEqual(self.models_called(), [bot_config.CHATGPT_MODEL] * 3 + [bot_config.LLM_FALLBACK_MODEL])
+        self.assertLessEqual(self.client.chat.completions.create.call_args.kwargs['timeout'], bot_config.LLM_DEADLINES['reply'])
+
+    def test_other_errors_are_raised_at_once(self):
+        self.client.chat.completions.create.side_effect = ValueError("bad request")
+        with self.assertRaises(ValueError):
+            llm_gateway.chat_completion('reply', [])
+        self.assertEqual(self.client.chat.completions.create.call_count, 1)
+
+    @patch('bot_config.LLM_BREAKER_FAILURE_THRESHOLD', 2)
+    def test_open_breaker_skips_the_primary_model(self):
+        self.client.chat.completions.create.side_effect = [connection_error()] * 4
+        with self.assertRaises(llm_gateway.LLMUnavailableError):
+            llm_gateway.chat_completion('reply', [])
+        self.assertEqual(llm_gateway.breaker_state(bot_config.CHATGPT_MODEL), 'open')
+
+        self.client.chat.completions.create.reset_mock()
+        self.client.chat.completions.create.side_effect = ["fallback"]
+        self.assertEqual(llm_gateway.chat_completion('reply', []), "fallback")
+        self.assertEqual(self.models_called(), [bot_config.LLM_FALLBACK_MODEL])
+
+    def test_hung_primary_leaves_time_for_the_fallback(self):
+        clock = [1000.0]
+
+        def create(model, timeout, **kwargs):
+            if model == bot_config.LLM_FALLBACK_MODEL:
+                return "fallback"
+            clock[0] += timeout  # The primary hangs until its timeout fires
+            raise openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+        self.client.chat.completions.create.side_effect = create
+        with patch('llm_gateway.time.monotonic', lambda: clock[0]):
+            self.assertEqual(llm_gateway.chat_completion('reply', []), "fallback")
+
+        budget = bot_config.LLM_DEADLINES['reply']
+        timeouts = [call.kwargs['timeout'] for call in self.client.chat.completions.create.call_args_list]
+        self.assertEqual(self.models_called()[-1], bot_config.LLM_FALLBACK_MODEL)
+        self.assertGreater(self.models_called().count(bot_config.CHATGPT_MODEL), 1)
+        self.assertTrue(all(timeout <= budget * bot_config.LLM_ATTEMPT_TIMEOUT_SHARE for timeout in timeouts))
+        self.assertGreaterEqual(timeouts[-1], budget * bot_config.LLM_FALLBACK_RESERVE_SHARE)
+
+    def test_latency_histogram(self):
+        self.client.chat.completions.create.return_value = "ok"
+        for _ in range(4):
+            llm_gateway.chat_completion('detect_intention', [])
+        histogram = llm_gateway.latency_histograms[('detect_intention', bot_config.CHATGPT_MODEL)]
+        self.assertEqual(histogram['count'], 4)
+        self.assertEqual(histogram['buckets'][-1], 4)
+        self.assertEqual(llm_gateway.latency_percentile('detect_intention', bot_config.CHATGPT_MODEL, 0.99), bot_config.LLM_LATENCY_BUCKETS[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from loadtest.fakes import Fakes, LatencyModel
+from loadtest.run import CONVERSATION, percentile, run_load
+
+class TestLoadHarness(unittest.TestCase):
+    def test_conversations_run_offline(self):
+        fakes = Fakes()
+        report = run_load(fakes, clients=2)
+        self.assertEqual(report['messages'], 2 * len(CONVERSATION))
+        self.assertEqual(report['statuses'], {200: 2 * len(CONVERSATION)})
+        self.assertGreater(report['calls_per_message']['twilio.messages.create'], 1)
+        self.assertIn('openai.reply', report['calls_per_message'])
+        self.assertTrue(all(message['to'].startswith("whatsapp:+52199") for message in fakes.twilio.sent))
+
+    def test_latency_model_is_deterministic(self):
+        first = [LatencyModel(0.5, 0.5, seed=3).sample() for _ in range(3)]
+        second = [LatencyModel(0.5, 0.5, seed=3).sample() for _ in range(3)]
+        self.assertEqual(first, second)
+        self.assertEqual(LatencyModel(0.2).sample(), 0.2)
+
+    def test_percentile_is_nearest_rank(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.99), 4)
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 0.07), 7)
+
+if __name__ == '__main__':
+    unittest.main()
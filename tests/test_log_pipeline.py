@@ -0,0 +1,61 @@
+import os
+import logging
+import tempfile
+import unittest
+from unittest.mock import patch
+import bot_config
+import log_pipeline
+from benchmarks.hot_path import make_leads
+
+class TestSummarize(unittest.TestCase):
+    def test_summary_is_bounded_by_limit_not_state_size(self):
+        small = str(log_pipeline.summarize(make_leads(10), limit=200))
+        large = str(log_pipeline.summarize(make_leads(5000), limit=200))
+        self.assertLess(len(large), 300)
+        self.assertIn("(+", large)
+        self.assertIn("<LeadState of", large)
+        self.assertLess(abs(len(large) - len(small)), 20)
+
+    def test_short_values_are_rendered_whole(self):
+        self.assertEqual(str(log_pipeline.summarize(["Hola", "¿Cómo estás?"])), "['Hola', '¿Cómo estás?']")
+        self.assertEqual(str(log_pipeline.summarize("x" * 10, limit=4)), "xxxx… (+6 chars)")
+
+class TestDebugSampling(unittest.TestCase):
+    def test_keeps_one_debug_record_per_call_site_in_every_n(self):
+        sampler = log_pipeline.DebugSamplingFilter(every=5)
+        def record(level, lineno):
+            return logging.LogRecord('routes', level, 'routes.py', lineno, "message", None, None)
+        kept = [sampler.filter(record(logging.DEBUG, 10)) for _ in range(10)]
+        self.assertEqual(kept.count(True), 2)
+        self.assertTrue(kept[0])
+        self.assertTrue(sampler.filter(record(logging.DEBUG, 11)))
+        self.assertTrue(all(sampler.filter(record(logging.INFO, 10)) for _ in range(10)))
+
+class TestPipeline(unittest.TestCase):
+    def test_records_reach_the_rotating_file_through_the_queue(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "activity.log")
+            root = logging.getLogger()
+            saved_level = root.level
+            log_pipeline.configure_logging(level="INFO", log_file=path)
+            try:
+                logging.getLogger("utils").info("Conversation state saved to GCS (%d conversations)", 3)
+                logging.getLogger("routes").debug("not emitted at INFO")
+            finally:
+                log_pipeline.stop_logging()
+                root.setLevel(saved_level)
+            with open(path, encoding='utf-8') as f:
+                content = f.read()
+        self.assertIn("utils - INFO - [-] Conversation state saved to GCS (3 conversations)", content)
+        self.assertNotIn("not emitted", content)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = log_pipeline.DroppingQueueHandler(log_pipeline.queue.Queue(maxsize=1))
+        record = logging.LogRecord('utils', logging.INFO, 'utils.py', 1, "message", None, None)
+        with patch.dict(log_pipeline.stats, {'dropped': 0}):
+            handler.handle(record)
+            handler.handle(record)
+            self.assertEqual(log_pipeline.stats['dropped'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
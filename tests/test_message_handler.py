@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import Mock, patch
+import classification_cache
+import message_handler
+import llm_gateway
+import prompt_builder
+from conversation_store import ConversationState
+
+def chunk(text):
+    return Mock(choices=[Mock(delta=Mock(content=text))])
+
+class TestStreamingReplies(unittest.TestCase):
+    def setUp(self):
+        classification_cache.clear()
+        self.phone = "whatsapp:+5219988103956"
+        self.conversation_state = ConversationState({self.phone: {'history': [], 'client_name': 'Ana'}})
+        self.sent = []
+
+        def create(**kwargs):
+            if kwargs.get('stream'):
+                # The first sentence must be dispatched before the stream is exhausted
+                pieces = ["Claro, Ana", ". KABAN tiene", " alberca y gimnasio.", " ¿Te gustaría", " ver planos?"]
+                def stream():
+                    for index, text in enumerate(pieces):
+                        if index >= 2:
+                            self.assertEqual(self.sent, ["Claro, Ana."])
+                        yield chunk(text)
+                return stream()
+            if kwargs['max_tokens'] == 10:
+                return Mock(choices=[Mock(message=Mock(content="False"))])
+            return Mock(choices=[Mock(message=Mock(content='{"intention": "question", "data": {}}'))])
+
+        patcher = patch.object(llm_gateway, '_client', Mock(**{'chat.completions.create.side_effect': create}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_sentence_is_dispatched_early(self):
+        messages, _, needs_gerente = message_handler.process_message(
+            "¿Qué amenidades tiene KABAN?", self.phone, self.conversation_state, "", "", on_message=self.sent.append
+        )
+        self.assertEqual(self.sent, ["Claro, Ana."])
+        self.assertEqual(messages, ["KABAN tiene alberca y gimnasio. ¿Te gustaría ver planos?"])
+        self.assertFalse(needs_gerente)
+
+    def test_without_callback_the_reply_is_returned_whole(self):
+        llm_gateway._client.chat.completions.create.side_effect = [
+            Mock(choices=[Mock(message=Mock(content='{"intention": "question", "data": {}}'))]),
+            Mock(choices=[Mock(message=Mock(content="Claro, Ana. ¿Te gustaría ver planos?"))]),
+            Mock(choices=[Mock(message=Mock(content="False"))]),
+        ]
+        messages, _, _ = message_handler.process_message(
+            "¿Qué amenidades tiene KABAN?", self.phone, self.conversation_state, "", ""
+        )
+        self.assertEqual(messages, ["Claro, Ana. ¿Te gustaría ver planos?"])
+
+class TestPromptLayout(unittest.TestCase):
+    def setUp(self):
+        classification_cache.clear()
+        prompt_builder.usage_stats.clear()
+        self.openai_client = Mock()
+        patcher = patch.object(llm_gateway, '_client', self.openai_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_static_prefix_is_shared_across_clients(self):
+        usage = Mock(prompt_tokens=1500, completion_tokens=30, prompt_tokens_details=Mock(cached_tokens=1280))
+        self.openai_client.chat.completions.create.side_effect = lambda **kwargs: Mock(
+            choices=[Mock(message=Mock(content="False" if kwargs['max_tokens'] == 10 else "¿Te interesa KABAN?"))],
+            usage=usage
+        )
+        conversation_state = ConversationState({
+            "whatsapp:+1": {'history': [], 'client_name': 'Ana', 'client_budget': '2,000,000 MXN'},
+            "whatsapp:+2": {'history': [], 'client_name': 'Luis'},
+        })
+        with patch.object(message_handler, 'detect_intention', return_value={'intention': 'question', 'data': {}}):
+            for phone, history in [("whatsapp:+1", "Cliente: hola"), ("whatsapp:+2", "Cliente: buenas")]:
+                message_handler.process_message("¿Qué proyectos tienen?", phone, conversation_state, "Proyecto: KABAN\n", history)
+
+        reply_calls = [call.kwargs['messages'] for call in self.openai_client.chat.completions.create.call_args_list if call.kwargs['max_tokens'] == 150]
+        self.assertEqual(reply_calls[0][0], reply_calls[1][0])
+        self.assertNotIn("Ana", reply_calls[0][0]['content'])
+        self.assertIn("Ana", reply_calls[0][1]['content'])
+        self.assertEqual(prompt_builder.usage_stats['reply']['api_cached_tokens'], 2560)
+        self.assertAlmostEqual(prompt_builder.cached_token_ratio('reply'), 1280 / 1500)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+import name_extractor
+
+class TestNameExtractor(unittest.TestCase):
+    def test_introductions_and_bare_names(self):
+        self.assertEqual(name_extractor.extract_name("si claro me llamo rupert"), ("Rupert", False))
+        self.assertEqual(name_extractor.extract_name("Hola, soy José"), ("José", False))
+        self.assertEqual(name_extractor.extract_name("mariana"), ("Mariana", False))
+        self.assertEqual(name_extractor.extract_name("Hola buenas tardes, Carlos Pérez"), ("Carlos", False))
+
+    def test_profile_name_reconciliation(self):
+        self.assertEqual(name_extractor.extract_name("jose", "José Luis 🏖"), ("José", False))
+        self.assertEqual(name_extractor.extract_name("soy Xóchitl", "Xóchitl R."), ("Xóchitl", False))
+        self.assertEqual(name_extractor.name_from_profile("‎fav"), None)
+        self.assertEqual(name_extractor.name_from_profile("ana maria"), "Ana")
+
+    def test_non_names_and_ambiguous_input(self):
+        self.assertEqual(name_extractor.extract_name("soy arquitecto"), (None, False))
+        self.assertEqual(name_extractor.extract_name("Quiero info de KABAN"), (None, False))
+        self.assertEqual(name_extractor.extract_name("¿Cuánto cuesta?"), (None, False))
+        self.assertEqual(name_extractor.extract_name("Pepe"), (None, True))
+        self.assertEqual(name_extractor.extract_name("soy Xóchitl"), (None, True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import project_loader
+from project_loader import ProjectValidationError
+
+SHEET = """Nombre: Muwan Residences
+Descripción: Residencias frente al mar
+Tipo: Residencias
+Ubicacion: Tulum, Quintana Roo
+Precios: Residencia A $7,500,000, Residencia B: $9,800,000
+Amenidades: Spa, Alberca; Club de playa
+"""
+
+class TestProjectLoader(unittest.TestCase):
+    def setUp(self):
+        project_loader.clear_cache()
+
+    def test_text_sheet_fields(self):
+        data = project_loader.load_project("muwan.txt", SHEET, "MUWAN")
+        self.assertEqual(data['name'], "Muwan Residences")
+        self.assertEqual(data['location'], "Tulum, Quintana Roo")
+        self.assertEqual(data['type'], "Residencias")
+        self.assertEqual(data['prices'], {'Residencia A': 7500000, 'Residencia B': 9800000})
+        self.assertEqual(data['amenities'], ["Spa", "Alberca", "Club de playa"])
+
+    def test_json_is_validated_and_coerced(self):
+        data = project_loader.load_project("kaban.json", '{"prices": {"Estudio": "$2,900,000 MXN"}, "amenities": "Alberca, Gimnasio", "brochure": "x.pdf"}', "KABAN")
+        self.assertEqual(data, {'name': "KABAN", 'prices': {'Estudio': 2900000}, 'amenities': ["Alberca", "Gimnasio"], 'brochure': "x.pdf"})
+        with self.assertRaises(ProjectValidationError):
+            project_loader.load_project("kaban.json", '["not", "an", "object"]', "KABAN")
+        with self.assertRaises(ProjectValidationError):
+            project_loader.load_project("kaban.json", '{"prices": {"Estudio": "a consultar"}}', "KABAN")
+
+    def test_each_distinct_content_is_parsed_once(self):
+        misses = project_loader.stats['misses']
+        first = project_loader.load_project("muwan.txt", SHEET, "MUWAN")
+        first['location'] = "changed by a caller"
+        second = project_loader.load_project("muwan.txt", SHEET, "MUWAN")
+        self.assertEqual(second['location'], "Tulum, Quintana Roo")
+        self.assertEqual(project_loader.stats['misses'] - misses, 1)
+        project_loader.load_project("muwan.txt", SHEET + "Tipo: Otro\n", "MUWAN")
+        self.assertEqual(len(project_loader._cache), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from unittest.mock import patch
+import prompt_builder
+
+class TestPromptBuilder(unittest.TestCase):
+    def setUp(self):
+        prompt_builder.usage_stats.clear()
+
+    @patch('bot_config.PROMPT_TOKEN_BUDGETS', {'history': 20, 'message': 10})
+    def test_sections_are_truncated_to_their_budgets(self):
+        history = "\n".join(f"Cliente: mensaje número {i} sobre el proyecto" for i in range(50))
+        message = "palabra " * 200
+        prompt = prompt_builder.build_prompt('test', [
+            (None, "Historial:\n"), ('history', history), (None, "\nMensaje: "), ('message', message),
+        ])
+        kept_history = prompt.split("\nMensaje: ")[0][len("Historial:\n"):]
+        self.assertTrue(history.endswith(kept_history))
+        self.assertIn("mensaje número 49", kept_history)
+        self.assertLessEqual(prompt_builder.count_tokens(kept_history), 20)
+        self.assertTrue(prompt.endswith(prompt_builder.TRUNCATION_MARKER))
+        self.assertEqual(prompt, prompt_builder.build_prompt('test', [
+            (None, "Historial:\n"), ('history', history), (None, "\nMensaje: "), ('message', message),
+        ]))
+        self.assertEqual(prompt_builder.usage_stats['test']['calls'], 2)
+        self.assertEqual(prompt_builder.usage_stats['test']['truncations'], 4)
+
+    @patch('prompt_builder.tiktoken', None)
+    def test_estimate_is_logged_once(self):
+        prompt_builder._encoding.cache_clear()
+        self.addCleanup(prompt_builder._encoding.cache_clear)
+        with self.assertLogs('prompt_builder', level='WARNING') as logs:
+            self.assertFalse(prompt_builder.init_tokenizer())
+            self.assertEqual(prompt_builder.count_tokens("hola " * 7), 10)
+            prompt_builder.init_tokenizer()
+        self.assertEqual(len(logs.records), 1)
+
+    @patch('bot_config.PROMPT_TOKEN_BUDGETS', {'message': 10})
+    def test_short_sections_are_untouched(self):
+        prompt = prompt_builder.build_prompt('test', [(None, "Mensaje: "), ('message', "hola")])
+        self.assertEqual(prompt, "Mensaje: hola")
+        self.assertEqual(prompt_builder.usage_stats['test']['truncations'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import Mock
+import recontact_handler
+from conversation_store import ConversationState
+
+GERENTE = "whatsapp:+5218110665094"
+CLIENT = "whatsapp:+5219981111111"
+
+class TestRecontactHandler(unittest.TestCase):
+    def setUp(self):
+        self.utils = Mock()
+        self.state = ConversationState({
+            GERENTE: {'history': [], 'is_gerente': True},
+            CLIENT: {'history': [], 'last_response_time': time.time(), 'recontact_attempts': 3},
+        })
+
+    def test_max_attempts_marks_no_interest_and_saves(self):
+        self.assertFalse(recontact_handler.recontact_client(CLIENT, self.state, Mock(), self.utils))
+        self.assertTrue(self.state[CLIENT]['no_interest'])
+        self.assertEqual(self.utils.save_conversation.call_args.args[0], CLIENT)
+
+    def test_weekly_report_is_saved_once_a_week(self):
+        now = datetime.now(recontact_handler.CST_TIMEZONE)
+        report = Mock(return_value=["Reporte"])
+        self.assertTrue(recontact_handler.send_weekly_report(GERENTE, self.state, Mock(), self.utils, report, now))
+        self.assertEqual(self.state[GERENTE]['last_weekly_report'], now.timestamp())
+        self.assertEqual(self.utils.save_conversation.call_args.args[0], GERENTE)
+
+        self.assertFalse(recontact_handler.send_weekly_report(GERENTE, self.state, Mock(), self.utils, report, now))
+        self.utils.save_conversation.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
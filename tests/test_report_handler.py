@@ -0,0 +1,35 @@
+import unittest
+import report_handler
+from conversation_store import ConversationState
+
+class TestDetailedReport(unittest.TestCase):
+    def setUp(self):
+        self.state = ConversationState({
+            "whatsapp:+1": {'history': [], 'is_gerente': True},
+            "whatsapp:+2": {'history': [], 'client_name': 'Ana', 'stage': 'Cierre', 'interest_level': 8},
+            "whatsapp:+3": {'history': [], 'client_name': 'Luis', 'stage': 'Prospección', 'interest_level': 2},
+            "whatsapp:+4": {'history': [], 'stage': 'Cierre', 'no_interest': True},
+        })
+
+    def test_report_lists_interested_clients_with_filters(self):
+        report = report_handler.generate_detailed_report(self.state)
+        self.assertEqual(len(report), 1)
+        self.assertIn("Ana (whatsapp:+2)", report[0])
+        self.assertIn("Luis (whatsapp:+3)", report[0])
+        self.assertNotIn("whatsapp:+4", report[0])
+
+        report = report_handler.generate_detailed_report(self.state, 'Cierre', 5)
+        self.assertTrue(report[0].startswith("Reporte de clientes interesados (etapa Cierre, interés mínimo 5): 1"))
+        self.assertEqual(report_handler.report_clients(self.state, interest_filter=9), [])
+        self.assertEqual(report_handler.generate_detailed_report(self.state, 'Calificación')[1], "No hay clientes que coincidan con el reporte.")
+
+    def test_long_reports_are_split_into_messages(self):
+        for number in range(100):
+            self.state[f"whatsapp:+52{number}"] = {'history': [], 'client_name': f"Cliente {number}"}
+        report = report_handler.generate_detailed_report(self.state)
+        self.assertGreater(len(report), 1)
+        self.assertTrue(all(len(message) <= report_handler.REPORT_MESSAGE_MAX_CHARS for message in report))
+        self.assertEqual(sum(message.count("\n- ") + message.startswith("- ") for message in report), 102)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import time
+import unittest
+from unittest.mock import Mock, patch
+import recontact_handler
+import scheduler
+from conversation_store import ConversationState
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        scheduler._jobs.clear()
+        scheduler._job_index.clear()
+
+    def test_run_due_jobs_in_time_order(self):
+        calls = []
+        scheduler.schedule_job("b", 200, calls.append, "b")
+        scheduler.schedule_job("a", 100, calls.append, "a")
+        scheduler.schedule_job("c", 300, calls.append, "c")
+        self.assertEqual(scheduler.run_due_jobs(now=250), 2)
+        self.assertEqual(calls, ["a", "b"])
+        self.assertEqual(scheduler.get_job_time("c"), 300)
+
+    def test_reschedule_and_cancel(self):
+        job = Mock()
+        scheduler.schedule_job("recontact:1", 100, job, 1)
+        scheduler.schedule_job("recontact:1", 500, job, 2)
+        scheduler.schedule_job("reminder:1", 100, job, 3)
+        scheduler.cancel_job("reminder:1")
+        self.assertEqual(scheduler.run_due_jobs(now=200), 0)
+        self.assertEqual(scheduler.run_due_jobs(now=600), 1)
+        job.assert_called_once_with(2)
+
+    def test_rescheduling_keeps_the_heap_bounded(self):
+        job = Mock()
+        for round_number in range(50):
+            for lead in range(100):
+                scheduler.schedule_job(f"recontact:{lead}", 1000 + round_number, job, lead)
+        self.assertEqual(len(scheduler._job_index), 100)
+        self.assertLessEqual(len(scheduler._jobs), 2 * 100 + 64)
+        self.assertEqual(scheduler.run_due_jobs(now=2000), 100)
+        self.assertEqual([call.args for call in job.call_args_list], [(lead,) for lead in range(100)])
+
+    def test_repeated_syncs_do_not_grow_the_heap(self):
+        now = time.time()
+        conversation_state = ConversationState({
+            f"whatsapp:+52{lead}": {'history': ["Cliente: hola"], 'last_response_time': now, 'last_incoming_time': now}
+            for lead in range(200)
+        })
+        recontact_handler.schedule_all_jobs(conversation_state, Mock(), Mock())
+        heap_size = len(scheduler._jobs)
+        self.assertEqual(heap_size, len(scheduler._job_index))
+        for _ in range(20):
+            recontact_handler.schedule_all_jobs(conversation_state, Mock(), Mock())
+        self.assertEqual(len(scheduler._jobs), heap_size)
+
+    def test_failing_job_does_not_stop_others(self):
+        ok = Mock()
+        scheduler.schedule_job("bad", 1, Mock(side_effect=RuntimeError("boom")))
+        scheduler.schedule_job("good", 2, ok)
+        self.assertEqual(scheduler.run_due_jobs(now=10), 2)
+        ok.assert_called_once()
+
+    def test_only_the_leader_syncs_and_runs_jobs(self):
+        job, sync = Mock(), Mock()
+        scheduler.set_sync(sync)
+        self.addCleanup(scheduler.set_sync, None)
+        scheduler.schedule_job("recontact:1", 0, job)
+        with patch.object(scheduler, 'ensure_leadership', return_value=False):
+            self.assertFalse(scheduler._run_cycle(False))
+        job.assert_not_called()
+        sync.assert_not_called()
+
+        with patch.object(scheduler, 'ensure_leadership', return_value=True):
+            self.assertTrue(scheduler._run_cycle(False))
+            self.assertTrue(scheduler._run_cycle(True))
+        job.assert_called_once()
+        self.assertEqual([call.args for call in sync.call_args_list], [(True,), (False,)])
+
+if __name__ == '__main__':
+    unittest.main()
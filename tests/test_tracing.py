@@ -0,0 +1,45 @@
+import json
+import unittest
+import tracing
+from loadtest.fakes import Fakes, installed
+from loadtest.run import CONVERSATION, build_app
+
+class TestTracing(unittest.TestCase):
+    def test_spans_nest_under_steps(self):
+        with tracing.start_trace('job', request_id='abc') as trace:
+            self.assertEqual(tracing.current_request_id(), 'abc')
+            tracing.step('first')
+            with tracing.span('openai.reply', model='m'):
+                pass
+            tracing.step('second')
+        self.assertIsNone(tracing.current_request_id())
+        spans = {span['name']: span for span in trace['spans']}
+        self.assertEqual(spans['openai.reply']['parent'], 'first')
+        self.assertIsNone(spans['second']['parent'])
+        self.assertEqual(json.loads(tracing.export_json(trace))['request_id'], 'abc')
+
+    def test_webhook_requests_are_traced_and_exported(self):
+        fakes = Fakes()
+        with installed(fakes):
+            app = build_app(fakes)
+            http = app.test_client()
+            for index, message in enumerate(CONVERSATION):
+                response = http.post('/whatsapp', data={
+                    'From': "whatsapp:+5219900000001", 'Body': message.format(name="Ana"),
+                    'NumMedia': '0', 'MessageSid': f"SM{index}"
+                })
+                self.assertEqual(response.status_code, 200)
+            last_trace = http.get('/traces').get_json()[-1]
+            metrics = http.get('/metrics').get_data(as_text=True)
+
+        self.assertEqual(last_trace['request_id'], f"SM{len(CONVERSATION) - 1}")
+        self.assertEqual(last_trace['http_status'], 200)
+        span_parents = {span['name']: span['parent'] for span in last_trace['spans']}
+        self.assertEqual(span_parents['openai.reply'], 'process_message')
+        self.assertEqual(span_parents['gcs.save_conversation'], 'save_conversation')
+        self.assertIn('send_messages', span_parents)
+        self.assertIn('giselle_span_seconds_count{span="whatsapp"}', metrics)
+        self.assertIn('giselle_llm_latency_seconds_bucket{call="reply"', metrics)
+
+if __name__ == '__main__':
+    unittest.main()
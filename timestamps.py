@@ -0,0 +1,49 @@
+import functools
+from datetime import datetime
+import pytz
+
+CST_TIMEZONE = pytz.timezone("America/Mexico_City")
+
+# Lead timestamps are stored as epoch seconds (like pending_response_time). States saved
+# before that hold ISO strings; they are converted once, when the lead is loaded.
+TIMESTAMP_FIELDS = ('last_contact', 'last_incoming_time', 'last_response_time', 'first_contact', 'last_weekly_report')
+
+def to_epoch(value):
+    """Return epoch seconds for an epoch number, an ISO string or a datetime; None for empty values.
+
+    Raises ValueError for a string that is not an ISO timestamp.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        raise ValueError(f"Not a timestamp: {value!r}")
+    if value.tzinfo is None:
+        value = CST_TIMEZONE.localize(value)
+    return value.timestamp()
+
+def to_datetime(epoch):
+    """Return an epoch timestamp as an aware datetime in CST."""
+    return datetime.fromtimestamp(epoch, CST_TIMEZONE)
+
+@functools.lru_cache(maxsize=4096)
+def _day_of_hour(hour):
+    return datetime.fromtimestamp(hour * 3600, CST_TIMEZONE).toordinal()
+
+def day_number(epoch):
+    """Return the CST calendar day of an epoch timestamp as a date ordinal.
+
+    UTC offsets change on hour boundaries, so the day is cached per hour.
+    """
+    return _day_of_hour(int(epoch // 3600))
+
+def format_timestamp(value, default='N/A'):
+    """Format a stored timestamp for messages to gerentes (e.g. '2025-03-14 10:05')."""
+    try:
+        epoch = to_epoch(value)
+    except ValueError:
+        return str(value)
+    return to_datetime(epoch).strftime('%Y-%m-%d %H:%M') if epoch is not None else default
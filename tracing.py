@@ -0,0 +1,166 @@
+import json
+import time
+import uuid
+import logging
+import functools
+import threading
+import contextlib
+import contextvars
+from collections import deque
+import bot_config
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Finished traces are written here as one JSON object per line
+export_logger = logging.getLogger("giselle.traces")
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+_lock = threading.Lock()
+
+# Latency histograms per span name: {'buckets': [...], 'sum': seconds, 'count': n, 'errors': n}
+span_histograms = {}
+
+# Most recent finished traces, newest last
+recent_traces = deque(maxlen=bot_config.TRACE_BUFFER_SIZE)
+
+def _observe(name, seconds, error=False):
+    with _lock:
+        histogram = span_histograms.setdefault(name, {
+            'buckets': [0] * len(bot_config.TRACE_LATENCY_BUCKETS), 'sum': 0.0, 'count': 0, 'errors': 0
+        })
+        for index, bound in enumerate(bot_config.TRACE_LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][index] += 1
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+        if error:
+            histogram['errors'] += 1
+
+def current_request_id():
+    """Return the ID of the request being traced in this context, or None."""
+    trace = _current_trace.get()
+    return trace['request_id'] if trace else None
+
+def _open_span(trace, name, attributes):
+    parent = _current_span.get()
+    record = {
+        'name': name,
+        'parent': parent['name'] if parent else None,
+        'start_ms': round((time.perf_counter() - trace['_started']) * 1000, 2) if trace else 0.0,
+        'status': 'ok',
+    }
+    if attributes:
+        record['attributes'] = attributes
+    record['_started'] = time.perf_counter()
+    return record
+
+def _close_span(trace, record, error=None):
+    duration = time.perf_counter() - record.pop('_started')
+    record['duration_ms'] = round(duration * 1000, 2)
+    if error is not None:
+        record['status'] = 'error'
+        record['error'] = type(error).__name__
+    if trace is not None:
+        trace['spans'].append(record)
+    _observe(record['name'], duration, error is not None)
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time a block as a span of the current trace (or only in the histograms outside a request)."""
+    trace = _current_trace.get()
+    record = _open_span(trace, name, attributes)
+    token = _current_span.set(record)
+    try:
+        yield record
+    except Exception as e:
+        _current_span.reset(token)
+        _close_span(trace, record, e)
+        raise
+    _current_span.reset(token)
+    _close_span(trace, record)
+
+def traced(name):
+    """Decorator that runs a function inside span(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def step(name):
+    """End the current step of the traced request and start the step called name.
+
+    Steps are sequential spans for handlers written as numbered steps; calls made
+    during a step (OpenAI, Twilio, GCS) are recorded as its children.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    _end_step(trace)
+    record = _open_span(trace, name, None)
+    trace['_step'] = (record, _current_span.set(record))
+
+def _end_step(trace, error=None):
+    open_step = trace.pop('_step', None)
+    if open_step:
+        record, token = open_step
+        _current_span.reset(token)
+        _close_span(trace, record, error)
+
+@contextlib.contextmanager
+def start_trace(name, request_id=None):
+    """Trace one request: every span opened in this context is collected and exported at the end."""
+    trace = {
+        'trace': name,
+        'request_id': request_id or uuid.uuid4().hex[:16],
+        'spans': [],
+        '_started': time.perf_counter(),
+    }
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    error = None
+    try:
+        yield trace
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _end_step(trace, error)
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        duration = time.perf_counter() - trace.pop('_started')
+        trace['duration_ms'] = round(duration * 1000, 2)
+        trace['status'] = 'error' if error is not None else 'ok'
+        _observe(name, duration, error is not None)
+        recent_traces.append(trace)
+        if bot_config.TRACE_EXPORT_ENABLED:
+            export_logger.info(export_json(trace))
+
+def trace_request(name, request_id_getter=None):
+    """Decorator that runs a request handler inside start_trace(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            request_id = request_id_getter() if request_id_getter else None
+            with start_trace(name, request_id) as trace:
+                result = func(*args, **kwargs)
+                if isinstance(result, tuple) and len(result) > 1:
+                    trace['http_status'] = result[1]
+                return result
+        return wrapper
+    return decorator
+
+def export_json(trace):
+    """Serialize a finished trace as a single JSON line."""
+    return json.dumps(trace, ensure_ascii=False, separators=(',', ':'), default=str)
+
+class RequestIdFilter(logging.Filter):
+    """Add the traced request ID (or '-') to every log record as record.request_id."""
+
+    def filter(self, record):
+        record.request_id = current_request_id() or '-'
+        return True
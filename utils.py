@@ -1,11 +1,13 @@
 import os
 import logging
-import json
-import re
 import gcsfs
-from datetime import datetime
 import pandas as pd
 from google.cloud import storage
+import pending_questions
+import conversation_store
+import activity
+import timestamps
+import tracing
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -15,33 +17,67 @@ projects_data = {}
 downloadable_urls = {}
 faq_data = {}
 
+# Generation of conversation_state.json this instance last loaded or saved
+_state_generation = None
+
+@tracing.traced('gcs.load_state')
 def load_conversation_state(conversation_state, bucket_name, gcs_path):
+    global _state_generation
     try:
         storage_client = storage.Client()
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(os.path.join(gcs_path, "conversation_state.json"))
-        temp_state_path = "/tmp/conversation_state.json"
-        blob.download_to_filename(temp_state_path)
-        with open(temp_state_path, 'r') as f:
-            data = json.load(f)
-            conversation_state.clear()
-            conversation_state.update(data)
+        payload = blob.download_as_bytes()
+        with conversation_store.gc_paused():
+            data = conversation_store.loads(payload)
+            with conversation_state.lock:
+                conversation_state.clear()
+                conversation_state.update(data)
+                pending_questions.rebuild(conversation_state)
+                _state_generation = blob.generation
         logger.info("Conversation state loaded from GCS")
-        os.remove(temp_state_path)
+        load_activity(bucket, gcs_path)
     except Exception as e:
         logger.warning(f"No existing conversation state found in GCS, initializing empty state: {str(e)}")
 
+@tracing.traced('gcs.refresh_state')
+def refresh_conversation_state(conversation_state, bucket_name, gcs_path):
+    """Reload conversation state only if another instance saved it since this one last loaded or saved it.
+
+    Costs one metadata request when nothing changed. Returns True if the state was reloaded.
+    """
+    try:
+        bucket = storage.Client().bucket(bucket_name)
+        blob = bucket.get_blob(os.path.join(gcs_path, "conversation_state.json"))
+    except Exception as e:
+        logger.warning(f"Could not check conversation state in GCS: {str(e)}")
+        return False
+    if blob is None or blob.generation == _state_generation:
+        return False
+    load_conversation_state(conversation_state, bucket_name, gcs_path)
+    return True
+
+def load_activity(bucket, gcs_path):
+    """Load the daily and weekly activity counters, unless this instance has counts not saved yet."""
+    if activity.is_dirty():
+        return
+    try:
+        activity.loads(bucket.blob(os.path.join(gcs_path, "activity.json")).download_as_bytes())
+    except Exception as e:
+        logger.info(f"No activity counters loaded from GCS: {str(e)}")
+
+@tracing.traced('gcs.save_conversation')
 def save_conversation(phone, conversation_state, bucket_name, gcs_path):
+    global _state_generation
     try:
-        temp_state_path = "/tmp/conversation_state.json"
-        with open(temp_state_path, 'w') as f:
-            json.dump(conversation_state, f)
         storage_client = storage.Client()
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(os.path.join(gcs_path, "conversation_state.json"))
-        blob.upload_from_filename(temp_state_path)
-        logger.info(f"Conversation state saved to GCS: {conversation_state}")
-        os.remove(temp_state_path)
+        blob.upload_from_string(conversation_store.dumps(conversation_state), content_type='application/json')
+        _state_generation = blob.generation
+        logger.info("Conversation state saved to GCS (%d conversations)", len(conversation_state))
+        if activity.is_dirty():
+            bucket.blob(os.path.join(gcs_path, "activity.json")).upload_from_string(activity.dumps(), content_type='application/json')
 
         temp_conv_path = f"/tmp/{phone.replace(':', '_')}_conversation.txt"
         with open(temp_conv_path, 'w', encoding='utf-8') as f:
@@ -58,7 +94,7 @@ def save_conversation(phone, conversation_state, bucket_name, gcs_path):
             f"Presupuesto: {conversation_state[phone].get('client_budget', 'No especificado')}",
             f"Necesidades: {conversation_state[phone].get('needs', 'No especificadas')}",
             f"Última intención: {conversation_state[phone].get('intention_history', ['No especificada'])[-1] if conversation_state[phone].get('intention_history') else 'No especificada'}",
-            f"Último contacto: {conversation_state[phone].get('last_contact', 'N/A')}"
+            f"Último contacto: {timestamps.format_timestamp(conversation_state[phone].get('last_contact'))}"
         ]
         with open(temp_info_path, 'w', encoding='utf-8') as f:
             f.write('\n'.join(client_info))
@@ -71,6 +107,7 @@ def save_conversation(phone, conversation_state, bucket_name, gcs_path):
     except Exception as e:
         logger.error(f"Failed to save conversation state to GCS: {str(e)}")
 
+@tracing.traced('gcs.load_history')
 def load_conversation_history(phone, bucket_name, gcs_path):
     try:
         storage_client = storage.Client()
@@ -87,123 +124,6 @@ def load_conversation_history(phone, bucket_name, gcs_path):
         logger.warning(f"No existing conversation history found for {phone} in GCS: {str(e)}")
         return []
 
-def download_projects_from_storage(bucket_name, gcs_path):
-    global projects_data
-    try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
-        blobs = bucket.list_blobs(prefix=gcs_path, delimiter=None)  # Recorre recursivamente
-        for blob in blobs:
-            if blob.name.endswith(('.json', '.txt')) and not blob.name.endswith(('_faq.txt', '_respuestas.txt')):
-                # Extraer el nombre del proyecto desde el nombre del archivo (última parte)
-                project_name = os.path.basename(blob.name).replace('.json', '').replace('.txt', '').upper()
-                temp_file_path = f"/tmp/{os.path.basename(blob.name)}"
-                blob.download_to_filename(temp_file_path)
-                logger.info(f"Descargado archivo: {blob.name} a {temp_file_path}")
-                if blob.name.endswith('.json'):
-                    with open(temp_file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        projects_data[project_name] = data
-                elif blob.name.endswith('.txt'):
-                    with open(temp_file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        data = {}
-                        name_match = re.search(r'Nombre:\s*(\w+)', content, re.IGNORECASE)
-                        data['name'] = name_match.group(1) if name_match else project_name
-                        location_match = re.search(r'Ubicación:\s*([\w\s,]+)', content, re.IGNORECASE)
-                        data['location'] = location_match.group(1) if location_match else 'No especificada'
-                        prices_match = re.search(r'Precios:\s*([^$]+)', content, re.IGNORECASE)
-                        if prices_match:
-                            prices_text = prices_match.group(1)
-                            prices = {}
-                            for price in re.findall(r'(\w+)\s*\$([\d,]+)', prices_text):
-                                prices[price[0]] = int(price[1].replace(',', ''))
-                            data['prices'] = prices
-                        amenities_match = re.search(r'Amenidades:\s*([\w\s,]+)', content, re.IGNORECASE)
-                        data['amenities'] = [a.strip() for a in amenities_match.group(1).split(',')] if amenities_match else ['No especificadas']
-                        projects_data[project_name] = data
-                os.remove(temp_file_path)  # Limpiar archivo temporal
-    except Exception as e:
-        logger.error(f"Error descargando proyectos desde GCS: {str(e)}", exc_info=True)
-
-def load_projects_from_folder(gcs_path):
-    global projects_data, downloadable_urls
-    projects_data.clear()
-    downloadable_urls.clear()
-    try:
-        local_path = '/tmp'
-        if os.path.exists(local_path):
-            for filename in os.listdir(local_path):
-                if filename.endswith(('.json', '.txt')) and not filename.startswith(('general_faq', 'anemona_faq', 'calidris_faq', 'kaban_faq', 'muwan_faq')):
-                    file_path = os.path.join(local_path, filename)
-                    logger.debug(f"Cargando archivo local: {file_path}")
-                    if filename.endswith('.json'):
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            project_name = os.path.splitext(filename)[0].upper()
-                            projects_data[project_name] = data
-                    elif filename.endswith('.txt'):
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            project_name = os.path.splitext(filename)[0].upper()
-                            data = {}
-                            name_match = re.search(r'Nombre:\s*(\w+)', content, re.IGNORECASE)
-                            data['name'] = name_match.group(1) if name_match else project_name
-                            location_match = re.search(r'Ubicación:\s*([\w\s,]+)', content, re.IGNORECASE)
-                            data['location'] = location_match.group(1) if location_match else 'No especificada'
-                            prices_match = re.search(r'Precios:\s*([^$]+)', content, re.IGNORECASE)
-                            if prices_match:
-                                prices_text = prices_match.group(1)
-                                prices = {}
-                                for price in re.findall(r'(\w+)\s*\$([\d,]+)', prices_text):
-                                    prices[price[0]] = int(price[1].replace(',', ''))
-                                data['prices'] = prices
-                            amenities_match = re.search(r'Amenidades:\s*([\w\s,]+)', content, re.IGNORECASE)
-                            data['amenities'] = [a.strip() for a in amenities_match.group(1).split(',')] if amenities_match else ['No especificadas']
-                            projects_data[project_name] = data
-                    logger.info(f"Loaded project data for {project_name}: {projects_data[project_name]}")
-                    os.remove(file_path)  # Limpiar archivo temporal
-        else:
-            logger.warning(f"Carpeta no encontrada: {local_path}")
-    except Exception as e:
-        logger.error(f"Error cargando proyectos desde carpeta: {str(e)}", exc_info=True)
-
-def load_gerente_respuestas(gcs_path):
-    try:
-        for project_file in os.listdir('/tmp'):
-            if project_file.endswith('_respuestas.txt'):
-                with open(os.path.join('/tmp', project_file), 'r', encoding='utf-8') as f:
-                    content = f.read().strip().split('\n')
-                    for line in content:
-                        if line.startswith('URL:'):
-                            url = line.replace('URL:', '').strip()
-                            project_name = project_file.replace('_respuestas.txt', '').upper()
-                            if project_name not in downloadable_urls:
-                                downloadable_urls[project_name] = []
-                            downloadable_urls[project_name].append(url)
-                            logger.info(f"Loaded downloadable URL for {project_name}: {url}")
-    except Exception as e:
-        logger.error(f"Failed to load gerente respuestas: {str(e)}")
-
-def load_faq_files(gcs_path):
-    global faq_data
-    faq_data.clear()
-    try:
-        for project_file in os.listdir('/tmp'):
-            if project_file.endswith('_faq.txt'):
-                project_key = project_file.replace('_faq.txt', '').lower()
-                faq_data[project_key] = {}
-                with open(os.path.join('/tmp', project_file), 'r', encoding='utf-8') as f:
-                    content = f.read().strip().split('\n')
-                    for i in range(0, len(content), 2):
-                        if i + 1 < len(content):
-                            question = content[i].replace('Pregunta:', '').strip().lower()
-                            answer = content[i + 1].replace('Respuesta:', '').strip()
-                            faq_data[project_key][question] = answer
-                            logger.info(f"Loaded FAQ for {project_key}: {question} -> {answer}")
-    except Exception as e:
-        logger.error(f"Failed to load FAQ files: {str(e)}")
-
 def get_faq_answer(question, project):
     question_lower = question.lower()
     project_key = project.lower() if project else None
@@ -220,41 +140,32 @@ def notify_gerente(messages, client, whatsapp_sender_number):
 def send_consecutive_messages(phone, messages, client, whatsapp_sender_number):
     for message in messages:
         try:
-            msg = client.messages.create(
-                body=message,
-                from_=whatsapp_sender_number,
-                to=phone
-            )
+            with tracing.span('twilio.send'):
+                msg = client.messages.create(
+                    body=message,
+                    from_=whatsapp_sender_number,
+                    to=phone
+                )
             logger.info(f"Mensaje enviado a través de Twilio: SID {msg.sid}, Estado: {msg.status}")
         except Exception as e:
             logger.error(f"Error enviando mensaje a {phone}: {str(e)}")
 
 def generate_daily_summary(conversation_state):
-    summary = ["Resumen Diario de Actividad:"]
-    today = datetime.now().date()
-    total_messages = 0
-    interested_clients = 0
-
-    for phone, state in conversation_state.items():
-        if state.get('is_gerente', False):
-            continue
-
-        last_contact = state.get('last_contact')
-        if not last_contact:
-            continue
-
-        try:
-            last_contact_date = datetime.fromisoformat(last_contact).date()
-        except ValueError:
-            continue
-
-        if last_contact_date != today:
-            continue
-
-        total_messages += sum(1 for msg in state.get('history', []) if msg.startswith("Cliente:"))
-        if not state.get('no_interest', False):
-            interested_clients += 1
-
-    summary.append(f"Mensajes recibidos hoy: {total_messages}")
-    summary.append(f"Clientes interesados contactados hoy: {interested_clients}")
-    return summary
+    counts = activity.day_counts()
+    return [
+        "Resumen Diario de Actividad:",
+        f"Mensajes recibidos hoy: {counts['messages']}",
+        f"Clientes interesados contactados hoy: {counts['interested_clients']}",
+        f"Preguntas escaladas al gerente hoy: {counts['escalations']}",
+        f"Reuniones Zoom agendadas hoy: {counts['zoom_bookings']}",
+    ]
+
+def generate_weekly_summary(conversation_state):
+    counts = activity.week_counts()
+    return [
+        "Resumen Semanal de Actividad:",
+        f"Mensajes recibidos esta semana: {counts['messages']}",
+        f"Clientes interesados contactados esta semana: {counts['interested_clients']}",
+        f"Preguntas escaladas al gerente esta semana: {counts['escalations']}",
+        f"Reuniones Zoom agendadas esta semana: {counts['zoom_bookings']}",
+    ]